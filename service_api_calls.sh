@@ -55,10 +55,18 @@ curl http://localhost:5001/experiments/1
 print_end
 
 
+print_operation "Get the dataset profile of experiment with ID = 1"
+curl http://localhost:5001/experiments/1/profile
+print_end
+
 print_operation "Get details for all experiments in database"
 curl http://localhost:5001/experiments
 print_end
 
+print_operation "List classification experiments 10 at a time without results"
+curl "http://localhost:5001/experiments?type=classification&limit=10&fields=name,type,start_date"
+print_end
+
 print_operation "Update Experiment with ID = 2"
 curl -X PUT -H "Content-Type=multipart/form-data"\
  http://localhost:5001/experiments/2\
@@ -83,15 +91,30 @@ print_operation "Train Experiment with ID = 1"
 curl -X POST http://localhost:5001/experiments/train/1
 print_end
 
+print_operation "View Training Job with ID = 1"
+curl http://localhost:5001/experiments/jobs/1
+print_end
+
 print_operation "Test Experiment with ID = 1"
 curl -X POST http://localhost:5001/experiments/test/1
 print_end
 
+print_operation "View Testing Job with ID = 2"
+curl http://localhost:5001/experiments/jobs/2
+print_end
+
 print_operation "View Train and Test results for Experiment with ID = 1"
-curl http://localhost:5001/experiments/1
+curl http://localhost:5001/experiments/1/results
 print_end
 
 
+print_operation "Tune the Experiment with ID = 1 with a Cross-Validated Grid Search"
+curl --header "Content-Type: application/json" \
+  --request POST \
+  --data '{"search": "grid", "space": {"C": [0.01, 0.1, 1.0, 10.0]}, "folds": 5, "early_stopping_margin": 0.05}' \
+  http://localhost:5001/experiments/tune/1
+print_end
+
 print_operation "Predict for a Data Sample with Experiment 1 Model"
 curl --header "Content-Type: application/json" \
   --request POST \
@@ -99,3 +122,37 @@ curl --header "Content-Type: application/json" \
   http://localhost:5001/experiments/predict/1
 print_end
 
+print_operation "View predict micro-batching counters"
+curl http://localhost:5001/experiments/micro_batcher
+print_end
+
+print_operation "Scrape Prometheus metrics"
+curl http://localhost:5001/metrics
+print_end
+
+print_operation "Add a sweep of three experiments sharing one upload of the data files"
+curl -F 'experiments=[{"name": "LR_sweep_1", "type": "classification", "hyperparams": {"C": 0.1}, "train_data_file": "train", "test_data_file": "test"}, {"name": "LR_sweep_2", "type": "classification", "hyperparams": {"C": 1.0}, "train_data_file": "train", "test_data_file": "test"}, {"name": "LR_sweep_3", "type": "classification", "hyperparams": {"C": 10.0}, "train_data_file": "train", "test_data_file": "test"}]' \
+  -F "train=@$train_dataset_1" \
+  -F "test=@$test_dataset_1" \
+  http://localhost:5001/experiments/bulk
+print_end
+
+print_operation "Train the sweep"
+curl --header "Content-Type: application/json" \
+  --request POST \
+  --data '{"ids": [3, 4, 5]}' \
+  http://localhost:5001/experiments/bulk/train
+print_end
+
+print_operation "Score a file, predictions stream back as NDJSON"
+curl -N -F "data=@$test_dataset_1" \
+  "http://localhost:5001/experiments/score/1?chunk_size=10000"
+print_end
+
+print_operation "Score a stored dataset as CSV"
+curl -N --header "Content-Type: application/json" \
+  --header "Accept: text/csv" \
+  --request POST \
+  --data "{\"sha256\": \"$(sha256sum $test_dataset_1 | cut -d ' ' -f 1)\"}" \
+  http://localhost:5001/experiments/score/1
+print_end
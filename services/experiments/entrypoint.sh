@@ -8,4 +8,8 @@ done
 
 echo "PostgreSQL started"
 
-python manage.py run -h 0.0.0.0
\ No newline at end of file
+if [ "$SERVER_MODE" = "production" ]; then
+  python manage.py serve
+else
+  python manage.py run -h 0.0.0.0
+fi
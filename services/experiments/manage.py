@@ -1,9 +1,20 @@
 # services/users/manage.py
+import json
+import os
 import unittest
 
+import click
 from flask.cli import FlaskGroup
 
 from project import create_app, db
+from project.api.models import Experiment
+from project.bench import Benchmark
+from project.ml.conduct_experiment import ConductExperiment
+from project.ml.environment import Locator
+from project.ml.model_store import ModelStore
+from project.ml.registry import ModelRegistry
+from project.reaper import find_orphans, reaper, remove_tree
+from project.serving import serve as serve_app, warm_up
 
 app = create_app()
 cli = FlaskGroup(create_app=create_app)
@@ -16,6 +27,88 @@ def recreate_db():
     db.session.commit()
 
 
+@cli.command()
+def convert_models():
+    """Converts every legacy model.pkl to the npy weights and manifest format.
+
+    Also records the saved model of experiments trained before the model
+    columns existed, serving only reads the experiment row.
+    """
+    for experiment in Experiment.query.order_by(Experiment.id).all():
+        exp_locator = Locator.for_experiment(experiment)
+        try:
+            features = ModelRegistry.resolve(experiment).dataset_maker_class.features
+            manifest_path = ModelStore.convert(exp_locator.get_model_dir(), features=features)
+        except Exception as e:
+            print(f'Experiment id {experiment.id} conversion failed: {e}')
+            continue
+        if manifest_path:
+            print(f'Experiment id {experiment.id} converted to {manifest_path}')
+        model_file_path = exp_locator.get_model_file_path()
+        if manifest_path or (experiment.model_path is None and os.path.exists(model_file_path)):
+            ConductExperiment.record_model(experiment, model_file_path)
+            db.session.commit()
+            print(f'Experiment id {experiment.id} model recorded')
+
+
+@cli.command()
+@click.option('--workers', type=int, help='Number of pre-forked workers, WSGI_WORKERS by default')
+@click.option('--threads', type=int, help='Threads per worker, WSGI_THREADS by default')
+@click.option('--warm-up', 'warm_up_models', type=int,
+              help='Models of the N most recently trained experiments to load, WARM_UP_MODELS by default')
+def serve(workers, threads, warm_up_models):
+    """Runs the production server, gunicorn workers forked from a preloaded app"""
+    serve_app(app, workers=workers, threads=threads, warm_up_models=warm_up_models)
+
+
+@cli.command()
+@click.argument('n', type=int)
+def warm_up_models(n):
+    """Loads the models of the N most recently trained experiments"""
+    print(f'Loaded models of experiments {warm_up(app, n)}')
+
+
+@cli.command()
+@click.option('--sizes', default='1000,100000,1000000', help='Comma separated training set sizes in rows')
+@click.option('--runs', default=3, help='Repetitions of create, train and test per size')
+@click.option('--requests', default=200, help='Repetitions of list, get and predict per size')
+@click.option('--batch-size', default=100, help='Samples per batch predict request')
+@click.option('--listing-size', default=1000, help='Experiments in the large GET /experiments page')
+@click.option('--output', type=click.Path(dir_okay=False), help='Write the JSON report here instead of stdout')
+def bench(sizes, runs, requests, batch_size, listing_size, output):
+    """Benchmarks the experiments API against a scratch database"""
+    os.environ['APP_SETTINGS'] = 'project.config.BenchmarkConfig'
+    bench_app = create_app()
+    benchmark = Benchmark(bench_app, runs=runs, requests=requests, predict_batch_size=batch_size,
+                          listing_size=listing_size)
+    report = benchmark.run([int(size) for size in sizes.split(',')])
+    if output:
+        with open(output, 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+@cli.command()
+@click.option('--min-age', type=int, help='Seconds an orphan must be untouched, GC_MIN_AGE_SECONDS by default')
+@click.option('--dry-run', is_flag=True, help='List what would be removed without removing it')
+def gc(min_age, dry_run):
+    """Reaps deleted experiments and removes folders no database row references"""
+    min_age = app.config['GC_MIN_AGE_SECONDS'] if min_age is None else min_age
+    if not dry_run:
+        while True:
+            reaped = reaper.reap()
+            if not reaped:
+                break
+            print(f'Reaped deleted experiments {reaped}')
+    for path in find_orphans(min_age):
+        if dry_run:
+            print(f'Would remove {path}')
+            continue
+        remove_tree(path, app.config['GC_MAX_DELETES_PER_SECOND'])
+        print(f'Removed {path}')
+
+
 @cli.command()
 def test():
     """ Runs the tests without code coverage"""
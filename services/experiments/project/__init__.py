@@ -19,10 +19,32 @@ def create_app(script_info=None):
     # set up extensions
     db.init_app(app)
 
+    from project.serialization import json_serializer
+    json_serializer.init_app(app)
+
+    from project.ml.model_store import ModelStore
+    ModelStore.init_app(app)
+    from project.ml.model_cache import model_cache
+    model_cache.init_app(app)
+    from project.ml.micro_batcher import micro_batcher
+    micro_batcher.init_app(app)
+
+    from project.metrics import metrics
+    metrics.init_app(app)
+    # Registered after metrics so the request latency includes compressing the response
+    from project.compression import response_compressor
+    response_compressor.init_app(app)
+
+    from project.reaper import reaper
+    reaper.init_app(app)
+
     # register blueprints
     from project.api.experiments import experiments_blueprint
     app.register_blueprint(experiments_blueprint)
 
+    from project.profiling import request_profiler
+    request_profiler.init_app(app)
+
     # shell context for flask cli
     @app.shell_context_processor
     def ctx():
@@ -1,18 +1,40 @@
 import os
+import shutil
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
 
-from flask import Flask, Blueprint, jsonify, request, json
+import numpy as np
+import pandas as pd
+from flask import Flask, Blueprint, Response, jsonify, request, json, current_app, stream_with_context
+from sqlalchemy.orm import load_only
 from werkzeug.utils import secure_filename
 
 from datetime import datetime
-from project.api.models import Experiment
+from project.api.models import Dataset, Experiment, Job, Result, Tombstone
+from project.datasets import DatasetStore
 from project.ml.environment import Locator
 from project.ml.conduct_experiment import ConductExperiment
+from project.ml.dataset_maker import InvalidSamples
+from project.ml.dataset_profiler import DatasetProfiler, check_schema
+from project.ml.micro_batcher import micro_batcher
+from project.ml.model_cache import model_cache
+from project.ml.registry import ModelRegistry
+from project.ml.tuning import HyperparameterSearch
+from project.jobs import job_queue
+from project.metrics import metrics
+from project.uploads import (ChunkedUploads, UploadError, UploadNotFound, UploadTooLarge,
+                             UploadOffsetMismatch, save_stream)
 from project import db
 
 
 experiments_blueprint = Blueprint('experiments', __name__)
 
 ALLOWED_EXTENSIONS = set(['csv', 'txt', 'zip'])
+TRAINING_MODES = set(['batch', 'streaming'])
+DATA_FILES = ['train_data', 'test_data']
+DATE_FORMATS = ['%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S',
+                '%Y-%m-%d']
 
 
 def allowed_file(filename):
@@ -38,7 +60,22 @@ def add_experiment_form_valid(request):
 
     name = request.form['name']
 
+    training_mode = request.form.get('training_mode', 'batch')
+    if training_mode not in TRAINING_MODES:
+        response_object = {'status': 'fail',
+                           'message': f'Experiment {name} Invalid! \n Invalid training mode {training_mode}'}
+        return jsonify(response_object), 400
+
+    try:
+        parse_model_fields(request.form, name=name, type=request.form['type'], training_mode=training_mode)
+    except ValueError as e:
+        response_object = {'status': 'fail',
+                           'message': f'Experiment {name} Invalid! \n {e}'}
+        return jsonify(response_object), 400
+
     for data_file in ['train_data', 'test_data']:
+        if request.form.get(f'{data_file}_upload_id'):
+            continue
         if data_file not in request.files:
             response_object = {'status': 'fail',
                                'message': f'Experiment {name} Invalid! \n Please upload {data_file}'}
@@ -52,6 +89,345 @@ def add_experiment_form_valid(request):
 
     return "form_valid", 1
 
+
+def parse_model_fields(form, name, type, training_mode, model=None, hyperparams=None):
+    """Parse the optional model and hyperparams form fields.
+
+    Hyperparams are sent as a JSON object and checked against the ones the
+    resolved backend declares. Raises ValueError on invalid input.
+    """
+    model = form.get('model', model) or None
+    hyperparams = form.get('hyperparams', hyperparams) or None
+    if isinstance(hyperparams, str):
+        try:
+            hyperparams = json.loads(hyperparams)
+        except ValueError:
+            raise ValueError('Hyperparams must be a JSON object')
+    if hyperparams is not None and not isinstance(hyperparams, dict):
+        raise ValueError('Hyperparams must be a JSON object')
+
+    if model or hyperparams:
+        experiment = Experiment(name=name, type=type, training_mode=training_mode, model=model)
+        backend = ModelRegistry.resolve(experiment)
+        backend.model_class.make_hyperparams(hyperparams)
+    return model, hyperparams
+
+
+def parse_date(value):
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format)
+        except ValueError:
+            pass
+    raise ValueError(f'Invalid date {value}')
+
+
+def parse_list_args(args):
+    """Parse the GET /experiments query string. Raises ValueError on invalid input."""
+    try:
+        limit = int(args.get('limit', current_app.config['EXPERIMENTS_PAGE_SIZE']))
+        after_id = int(args['after_id']) if args.get('after_id') else None
+    except ValueError:
+        raise ValueError('limit and after_id must be integers')
+    max_limit = current_app.config['EXPERIMENTS_MAX_PAGE_SIZE']
+    if not 1 <= limit <= max_limit:
+        raise ValueError(f'limit must be between 1 and {max_limit}')
+
+    fields = None
+    if args.get('fields'):
+        fields = set(field.strip() for field in args['fields'].split(',') if field.strip())
+        unknown = sorted(fields - set(Experiment.json_fields) - {'results'})
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        fields.add('id')
+
+    return {
+        'limit': limit,
+        'after_id': after_id,
+        'type': args.get('type'),
+        'name_prefix': args.get('name_prefix'),
+        'start_date_from': parse_date(args['start_date_from']) if args.get('start_date_from') else None,
+        'start_date_to': parse_date(args['start_date_to']) if args.get('start_date_to') else None,
+        'fields': fields
+    }
+
+
+def list_experiments(limit, after_id=None, type=None, name_prefix=None, start_date_from=None,
+                     start_date_to=None, fields=None):
+    """Return one page of experiments ordered by id, seeking past after_id.
+
+    With ``fields`` only those columns are loaded, so a listing that skips
+    ``result`` never reads the result blobs from the database.
+    """
+    query = Experiment.query
+    if fields is not None:
+        query = query.options(load_only(*(fields - {'results'})))
+    if after_id is not None:
+        query = query.filter(Experiment.id > after_id)
+    if type:
+        query = query.filter(Experiment.type == type)
+    if name_prefix:
+        escaped = name_prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        query = query.filter(Experiment.name.like(f'{escaped}%', escape='\\'))
+    if start_date_from:
+        query = query.filter(Experiment.start_date >= start_date_from)
+    if start_date_to:
+        query = query.filter(Experiment.start_date <= start_date_to)
+    return query.order_by(Experiment.id).limit(limit).all()
+
+
+def chunked_uploads():
+    return ChunkedUploads.from_config(current_app.config)
+
+
+def get_data_file(request, data_file):
+    """Resolve a data file to its filename and source.
+
+    The source is either the uploaded FileStorage or the id of a completed
+    chunked upload passed as ``<data_file>_upload_id``.
+    """
+    upload_id = request.form.get(f'{data_file}_upload_id')
+    if upload_id:
+        upload = chunked_uploads().status(upload_id)
+        if not upload['completed']:
+            raise UploadError(f'Upload {upload_id} is not completed')
+        return secure_filename(upload['filename']), upload_id
+
+    data_file_storage = request.files[data_file]
+    return secure_filename(data_file_storage.filename), data_file_storage
+
+
+def save_data_file(source, file_path):
+    """Store a data file by content and link it into the Locator directories, returning its size and sha256"""
+    with metrics.stage('file_save'):
+        staged_file_path, size, sha256, profile = stage_request_data_file(source)
+        DatasetStore.add(staged_file_path, size, sha256, file_path, profile=profile)
+        return size, sha256
+
+
+def stage_request_data_file(source):
+    """Stage a data file sent with this request, returning the staged file path, size, sha256 and profile"""
+    uploads = chunked_uploads()
+    profile_upload = isinstance(source, str) and not DatasetStore.has_profile(uploads.status(source)['sha256'])
+    return stage_data_file(source, uploads, current_app.config, profile_upload=profile_upload)
+
+
+def stage_data_file(source, uploads, config, profile_upload=True):
+    """Write a data file to the dataset staging dir, profiling it on the way.
+
+    Uploads streamed in the request are profiled while they are written. A
+    chunked upload arrived over several requests, so with ``profile_upload``
+    it is profiled from the staged file; callers turn that off when the same
+    content is already stored with a profile. Touches no database, bulk
+    creation calls it from worker threads. Returns the staged file path,
+    size, sha256 and profile.
+    """
+    staged_file_path = DatasetStore.get_staging_path()
+    if isinstance(source, str):
+        size, sha256 = uploads.consume(source, staged_file_path)
+        profile = None
+        if profile_upload:
+            profile = DatasetProfiler.profile_file(staged_file_path, config['UPLOAD_CHUNK_SIZE'])
+    else:
+        profiler = DatasetProfiler()
+        size, sha256 = save_stream(source.stream, staged_file_path, chunk_size=config['UPLOAD_CHUNK_SIZE'],
+                                   max_bytes=config['MAX_UPLOAD_BYTES'], profiler=profiler)
+        profile = profiler.finish()
+    return staged_file_path, size, sha256, profile
+
+
+def is_forced(request):
+    """True when a train or test request asks to run even if an identical run is stored"""
+    data = request.get_json(silent=True) or {}
+    force = request.args.get('force', data.get('force', False))
+    return str(force).lower() in ['1', 'true', 'yes']
+
+
+def memoized_response(result, message):
+    """Answer a train or test request with the stored result of an identical run"""
+    response_object = {
+        'status': 'success',
+        'message': message,
+        'job_id': result.job_id,
+        'result_id': result.id,
+        'result': [result.to_output()],
+        'cache': 'hit'
+    }
+    return jsonify(response_object), 200
+
+
+def upload_error_response(e):
+    if isinstance(e, UploadTooLarge):
+        status_code = 413
+    elif isinstance(e, UploadNotFound):
+        status_code = 404
+    elif isinstance(e, UploadOffsetMismatch):
+        status_code = 409
+    else:
+        status_code = 400
+    response_object = {
+        'status': 'fail',
+        'message': str(e)
+    }
+    if isinstance(e, UploadOffsetMismatch):
+        response_object['offset'] = e.offset
+    return jsonify(response_object), status_code
+
+def parse_bulk_items(request):
+    """Read the experiments of a bulk create from a JSON body or a multipart experiments field"""
+    if request.is_json:
+        items = (request.get_json(silent=True) or {}).get('experiments')
+    else:
+        try:
+            items = json.loads(request.form.get('experiments') or 'null')
+        except ValueError:
+            items = None
+    if not isinstance(items, list) or not items or not all(isinstance(item, dict) for item in items):
+        raise ValueError('experiments must be a non empty list of objects')
+    max_items = current_app.config['BULK_MAX_EXPERIMENTS']
+    if len(items) > max_items:
+        raise ValueError(f'{len(items)} experiments sent, at most {max_items} allowed')
+    return items
+
+
+def get_bulk_data_source(request, item, data_file):
+    """Resolve a data file of a bulk item to its source and filename.
+
+    A data file is a multipart field named by ``<data_file>_file``, a completed
+    chunked upload named by ``<data_file>_upload_id``, or a stored dataset named
+    by ``<data_file>_sha256`` together with the filename in ``<data_file>``.
+    Raises ValueError or UploadError on invalid input.
+    """
+    if item.get(f'{data_file}_file'):
+        field = item[f'{data_file}_file']
+        if field not in request.files:
+            raise ValueError(f'No file uploaded as {field}')
+        filename = request.files[field].filename
+        source = ('file', field)
+    elif item.get(f'{data_file}_upload_id'):
+        upload_id = item[f'{data_file}_upload_id']
+        upload = chunked_uploads().status(upload_id)
+        if not upload['completed']:
+            raise ValueError(f'Upload {upload_id} is not completed')
+        filename = upload['filename']
+        source = ('upload', upload_id)
+    elif item.get(f'{data_file}_sha256'):
+        filename = item.get(data_file) or ''
+        source = ('sha256', str(item[f'{data_file}_sha256']).lower())
+    else:
+        raise ValueError(f'Please upload {data_file}')
+    if not allowed_file(filename):
+        raise ValueError(f'Invalid file extention {filename}')
+    return source, secure_filename(filename)
+
+
+def validate_bulk_items(request, items):
+    """Validate every bulk item, with one name query and one dataset query for the whole request.
+
+    Returns the parsed fields of each item and a report with an entry per item.
+    """
+    names = [item.get('name') for item in items]
+    existing = set(name for (name,) in db.session.query(Experiment.name)
+                   .filter(Experiment.name.in_([name for name in names if isinstance(name, str)])).all())
+    seen = set()
+    parsed = []
+    report = []
+    for index, item in enumerate(items):
+        name = item.get('name')
+        try:
+            for entry in ['name', 'type']:
+                if not item.get(entry) or not isinstance(item[entry], str):
+                    raise ValueError(f'Please enter experiment {entry}')
+            if name in existing:
+                raise ValueError(f'Experiment with name: {name} exists, Please enter unique experiment name')
+            if name in seen:
+                raise ValueError(f'Experiment name {name} is repeated in the request')
+            seen.add(name)
+            training_mode = item.get('training_mode', 'batch')
+            if training_mode not in TRAINING_MODES:
+                raise ValueError(f'Invalid training mode {training_mode}')
+            model, hyperparams = parse_model_fields(item, name=name, type=item['type'], training_mode=training_mode)
+            fields = {'model': model, 'hyperparams': hyperparams, 'training_mode': training_mode}
+            for data_file in DATA_FILES:
+                fields[data_file] = get_bulk_data_source(request, item, data_file)
+        except (ValueError, UploadError) as e:
+            parsed.append(None)
+            report.append({'index': index, 'name': name, 'status': 'fail',
+                           'message': f'Experiment {name} Invalid! \n {e}'})
+            continue
+        parsed.append(fields)
+        report.append({'index': index, 'name': name, 'status': 'success'})
+
+    sha256s = set(fields[data_file][0][1] for fields in parsed if fields for data_file in DATA_FILES
+                  if fields[data_file][0][0] == 'sha256')
+    dataset_sizes = dict(db.session.query(Dataset.sha256, Dataset.size)
+                         .filter(Dataset.sha256.in_(sha256s)).all()) if sha256s else {}
+    for fields, entry in zip(parsed, report):
+        if not fields:
+            continue
+        for data_file in DATA_FILES:
+            (kind, key), _ = fields[data_file]
+            if kind == 'sha256' and key not in dataset_sizes:
+                entry['status'] = 'fail'
+                entry['message'] = f'Experiment {entry["name"]} Invalid! \n Dataset {key} Not Found!'
+    return parsed, report, dataset_sizes
+
+
+def stage_bulk_sources(request, sources, dataset_sizes):
+    """Stage every distinct uploaded file once, in parallel.
+
+    Returns the size, sha256, profile and staged file path of each source,
+    the profile is None when the stored dataset already has one and the path
+    None for datasets given by sha256. The staged files are moved into the
+    store once their datasets are acquired.
+    """
+    uploads = chunked_uploads()
+    files = request.files
+    config = current_app.config
+
+    upload_sha256s = {key: uploads.status(key)['sha256'] for kind, key in set(sources) if kind == 'upload'}
+    profiled = set(sha256 for (sha256,) in db.session.query(Dataset.sha256).filter(
+        Dataset.sha256.in_(set(upload_sha256s.values())), Dataset.profile.isnot(None)).all()) \
+        if upload_sha256s else set()
+
+    def stage(source):
+        kind, key = source
+        with metrics.stage('file_save'):
+            staged_file_path, size, sha256, profile = stage_data_file(
+                key if kind == 'upload' else files[key], uploads, config,
+                profile_upload=upload_sha256s.get(key) not in profiled)
+        return size, sha256, profile, staged_file_path
+
+    staged = {('sha256', sha256): (size, sha256, None, None) for sha256, size in dataset_sizes.items()}
+    pending = sorted(set(sources) - set(staged))
+    with ThreadPoolExecutor(max_workers=config['BULK_FILE_WORKERS']) as executor:
+        futures = [(source, executor.submit(stage, source)) for source in pending]
+    failures = [future.exception() for _, future in futures if future.exception() is not None]
+    if failures:
+        # Nothing references the files the other sources staged, an UploadError fails the whole request
+        for _, future in futures:
+            if future.exception() is None:
+                os.remove(future.result()[3])
+        raise failures[0]
+    for source, future in futures:
+        staged[source] = future.result()
+    return staged
+
+
+def link_bulk_data_files(experiments):
+    """Create the folders of new experiments and link their data files, in parallel"""
+    def link(experiment):
+        exp_locator = Locator.for_experiment(experiment)
+        exp_locator.create_experiment_folders()
+        DatasetStore.link(DatasetStore.get_blob_path(experiment.train_data_sha256),
+                          exp_locator.get_train_data_file_path())
+        DatasetStore.link(DatasetStore.get_blob_path(experiment.test_data_sha256),
+                          exp_locator.get_test_data_file_path())
+
+    with ThreadPoolExecutor(max_workers=current_app.config['BULK_FILE_WORKERS']) as executor:
+        list(executor.map(link, experiments))
+
+
 @experiments_blueprint.route('/experiments', methods=['POST'])
 def add_experiment():
     """Add experiment to database"""
@@ -63,6 +439,8 @@ def add_experiment():
 
         name = request.form['name']
         type = request.form['type']
+        training_mode = request.form.get('training_mode', 'batch')
+        model, hyperparams = parse_model_fields(request.form, name=name, type=type, training_mode=training_mode)
 
         experiment = Experiment.query.filter_by(name=name).first()
 
@@ -73,22 +451,34 @@ def add_experiment():
             }
             return jsonify(response_object), 409
 
-        train_data_file = request.files['train_data']
-        train_data_filename = secure_filename(train_data_file.filename)
-
-        test_data_file = request.files['test_data']
-        test_data_filename = secure_filename(test_data_file.filename)
+        try:
+            train_data_filename, train_data_source = get_data_file(request, 'train_data')
+            test_data_filename, test_data_source = get_data_file(request, 'test_data')
+        except UploadError as e:
+            return upload_error_response(e)
 
-        experiment = Experiment(name=name, type=type)
+        experiment = Experiment(name=name, type=type, training_mode=training_mode,
+                                model=model, hyperparams=hyperparams)
         db.session.add(experiment)
         db.session.commit()
 
         experiment_locator = Locator(experiment.id,
                                      train_data_filename=train_data_filename,
                                      test_data_filename=test_data_filename)
+        experiment_locator.create_experiment_folders()
 
-        train_data_file.save(experiment_locator.get_train_data_file_path())
-        test_data_file.save(experiment_locator.get_test_data_file_path())
+        try:
+            experiment.train_data_size, experiment.train_data_sha256 = save_data_file(
+                train_data_source, experiment_locator.get_train_data_file_path())
+            experiment.test_data_size, experiment.test_data_sha256 = save_data_file(
+                test_data_source, experiment_locator.get_test_data_file_path())
+        except UploadError as e:
+            DatasetStore.release(experiment.train_data_sha256)
+            db.session.delete(experiment)
+            db.session.commit()
+            DatasetStore.purge([experiment.train_data_sha256])
+            Locator.delete_experiment_folders(experiment.id)
+            return upload_error_response(e)
 
         experiment.train_data = train_data_filename
         experiment.test_data = test_data_filename
@@ -102,7 +492,93 @@ def add_experiment():
         }
         return jsonify(response_object), 201
     except Exception as e:
-        print(str(e))
+        current_app.logger.exception('Adding experiment failed')
+        response_object = {
+            'status': 'fail',
+            'message': "Internal Server Error",
+            'error': str(e)
+        }
+        return jsonify(response_object), 500
+
+@experiments_blueprint.route('/experiments/bulk', methods=['POST'])
+def add_experiments_bulk():
+    """Add many experiments in one request and one transaction, all or none"""
+    try:
+        try:
+            items = parse_bulk_items(request)
+        except ValueError as e:
+            response_object = {
+                'status': 'fail',
+                'message': f'Experiments Invalid! \n {e}'
+            }
+            return jsonify(response_object), 400
+
+        parsed, report, dataset_sizes = validate_bulk_items(request, items)
+        if any(entry['status'] == 'fail' for entry in report):
+            response_object = {
+                'status': 'fail',
+                'message': 'Experiments Invalid! No experiment was added',
+                'experiments': report
+            }
+            return jsonify(response_object), 400
+
+        try:
+            staged = stage_bulk_sources(request, [fields[data_file][0] for fields in parsed
+                                                  for data_file in DATA_FILES], dataset_sizes)
+        except UploadError as e:
+            return upload_error_response(e)
+
+        experiments = []
+        start_date = datetime.utcnow()
+        for item, fields in zip(items, parsed):
+            experiment = Experiment(name=item['name'], type=item['type'], start_date=start_date,
+                                    training_mode=fields['training_mode'], model=fields['model'],
+                                    hyperparams=fields['hyperparams'])
+            for data_file in DATA_FILES:
+                source, filename = fields[data_file]
+                size, sha256, _, _ = staged[source]
+                setattr(experiment, data_file, filename)
+                setattr(experiment, f'{data_file}_size', size)
+                setattr(experiment, f'{data_file}_sha256', sha256)
+            experiments.append(experiment)
+        db.session.add_all(experiments)
+
+        references = Counter(getattr(experiment, f'{data_file}_sha256') for experiment in experiments
+                             for data_file in DATA_FILES)
+        stored_by_sha256 = {}
+        for size, sha256, profile, _ in staged.values():
+            if stored_by_sha256.get(sha256, (size, None))[1] is None:
+                stored_by_sha256[sha256] = (size, profile)
+        for sha256, count in references.items():
+            size, profile = stored_by_sha256[sha256]
+            DatasetStore.acquire(sha256, size, count=count, profile=profile)
+        db.session.flush()
+        # Acquired first, a purge of the same content either sees the references or already removed its blob
+        for _, sha256, _, staged_file_path in staged.values():
+            if staged_file_path is not None:
+                DatasetStore.store(staged_file_path, sha256)
+
+        try:
+            link_bulk_data_files(experiments)
+        except Exception:
+            experiment_ids = [experiment.id for experiment in experiments]
+            db.session.rollback()
+            for experiment_id in experiment_ids:
+                shutil.rmtree(os.path.join(Locator.root, str(experiment_id)), ignore_errors=True)
+            raise
+        db.session.commit()
+
+        for entry, experiment in zip(report, experiments):
+            entry['id'] = experiment.id
+            entry['message'] = f'Experiment {experiment.name} added!'
+        response_object = {
+            'status': 'success',
+            'message': f'{len(experiments)} Experiments added!',
+            'experiments': report
+        }
+        return jsonify(response_object), 201
+    except Exception as e:
+        current_app.logger.exception('Adding experiments failed')
         response_object = {
             'status': 'fail',
             'message': "Internal Server Error",
@@ -117,17 +593,11 @@ def get_single_experiment(id):
         experiment = Experiment.query.filter_by(id=id).first()
 
         if experiment:
+            data = experiment.to_json()
+            data['results'] = Result.summarize([experiment.id]).get(experiment.id, {})
             response_object = {
                 'status': 'success',
-                'data': {
-                    'id': experiment.id,
-                    'name': experiment.name,
-                    'type': experiment.type,
-                    'train_data': experiment.train_data,
-                    'test_data': experiment.test_data,
-                    'result': experiment.result,
-                    'start_date': experiment.start_date
-                }
+                'data': data
             }
 
             return jsonify(response_object), 200
@@ -148,18 +618,40 @@ def get_single_experiment(id):
 
 @experiments_blueprint.route('/experiments', methods=['GET'])
 def get_all_experiments():
-    """Get all experiments"""
+    """Get a page of experiments, filtered and projected by the query string"""
     try:
-        all_experiments = [experiment.to_json() for experiment in Experiment.query.all()]
+        try:
+            list_args = parse_list_args(request.args)
+        except ValueError as e:
+            response_object = {
+                'status': 'fail',
+                'message': f'Invalid experiments query! \n {e}'
+            }
+            return jsonify(response_object), 400
 
-        if all_experiments:
+        experiments = list_experiments(**list_args)
+        filtered = any(list_args[arg] for arg in ['after_id', 'type', 'name_prefix', 'start_date_from',
+                                                  'start_date_to'])
+
+        if experiments or filtered:
+            next_after_id = experiments[-1].id if len(experiments) == list_args['limit'] else None
+            fields = list_args['fields']
+            experiments_json = [experiment.to_json(fields=fields) for experiment in experiments]
+            if fields is None or 'results' in fields:
+                summary = Result.summarize([experiment.id for experiment in experiments])
+                for experiment_json in experiments_json:
+                    experiment_json['results'] = summary.get(experiment_json['id'], {})
             response_object = {
                 'status': 'success',
                 'data': {
-                    'experiments': all_experiments
+                    'experiments': experiments_json,
+                    'next_after_id': next_after_id
                 }
             }
-            return jsonify(response_object), 200
+            # Pollers send the ETag back in If-None-Match and get a bodyless 304 while the page is unchanged
+            response = jsonify(response_object)
+            response.add_etag()
+            return response.make_conditional(request)
         else:
             response_object = {
                 'status': 'fail',
@@ -174,6 +666,98 @@ def get_all_experiments():
         }
         return jsonify(response_object), 500
 
+@experiments_blueprint.route('/experiments/<id>/profile', methods=['GET'])
+def get_experiment_profile(id):
+    """Get the statistics of the data files of an experiment, computed when they were uploaded"""
+    try:
+        experiment = Experiment.query.filter_by(id=id).first()
+        if not experiment:
+            response_object = {
+                'status': 'fail',
+                'message': f'Experiment id {id} Not Found!'
+            }
+            return jsonify(response_object), 404
+
+        sha256s = {data_file: getattr(experiment, f'{data_file}_sha256') for data_file in DATA_FILES}
+        profiles = dict(db.session.query(Dataset.sha256, Dataset.profile)
+                        .filter(Dataset.sha256.in_([sha256 for sha256 in sha256s.values() if sha256])).all())
+        if not any(profiles.values()):
+            response_object = {
+                'status': 'fail',
+                'message': f'Experiment id {id} has no dataset profile, its data was uploaded before profiling'
+            }
+            return jsonify(response_object), 404
+
+        features = ModelRegistry.resolve(experiment).dataset_maker_class.features
+        data = {}
+        for data_file, sha256 in sha256s.items():
+            profile = profiles.get(sha256)
+            if profile is not None:
+                profile = dict(profile, sha256=sha256, schema=check_schema(profile, features))
+            data[data_file] = profile
+        response_object = {
+            'status': 'success',
+            'data': data
+        }
+        return jsonify(response_object), 200
+    except Exception as e:
+        response_object = {
+            'status': 'fail',
+            'message': "Internal Server Error",
+            'error': str(e)
+        }
+        return jsonify(response_object), 500
+
+@experiments_blueprint.route('/experiments/<id>/results', methods=['GET'])
+def get_experiment_results(id):
+    """Get a page of the runs of an experiment, newest first"""
+    try:
+        experiment = Experiment.query.filter_by(id=id).first()
+        if not experiment:
+            response_object = {
+                'status': 'fail',
+                'message': f'Experiment id {id} Not Found!'
+            }
+            return jsonify(response_object), 404
+
+        try:
+            limit = int(request.args.get('limit', current_app.config['EXPERIMENTS_PAGE_SIZE']))
+            before_id = int(request.args['before_id']) if request.args.get('before_id') else None
+        except ValueError:
+            limit = None
+        max_limit = current_app.config['EXPERIMENTS_MAX_PAGE_SIZE']
+        if limit is None or not 1 <= limit <= max_limit:
+            response_object = {
+                'status': 'fail',
+                'message': f'Invalid results query! \n limit must be between 1 and {max_limit}, '
+                           f'before_id an integer'
+            }
+            return jsonify(response_object), 400
+
+        query = Result.query.filter(Result.experiment_id == experiment.id)
+        if request.args.get('run_type'):
+            query = query.filter(Result.run_type == request.args['run_type'])
+        if before_id is not None:
+            query = query.filter(Result.id < before_id)
+        results = query.order_by(Result.id.desc()).limit(limit).all()
+
+        response_object = {
+            'status': 'success',
+            'data': {
+                'results': [result.to_json() for result in results],
+                'summary': Result.summarize([experiment.id]).get(experiment.id, {}),
+                'next_before_id': results[-1].id if len(results) == limit else None
+            }
+        }
+        return jsonify(response_object), 200
+    except Exception as e:
+        response_object = {
+            'status': 'fail',
+            'message': "Internal Server Error",
+            'error': str(e)
+        }
+        return jsonify(response_object), 500
+
 @experiments_blueprint.route('/experiments/<id>', methods=['PUT'])
 def update_single_experiment(id):
     """Update Single Experiment"""
@@ -192,28 +776,75 @@ def update_single_experiment(id):
         result = request.form['result']
         start_date = request.form['start_date']
         start_date = datetime.strptime(start_date, '%Y-%m-%d %H:%M:%S.%f')
+        training_mode = request.form.get('training_mode', experiment.training_mode)
 
-        train_data_file = request.files['train_data']
-        train_data_filename = secure_filename(train_data_file.filename)
+        if training_mode not in TRAINING_MODES:
+            response_object = {
+                'status': 'fail',
+                'message': f'Experiment id {id} Invalid! \n Invalid training mode {training_mode}'
+            }
+            return jsonify(response_object), 400
 
-        test_data_file = request.files['test_data']
-        test_data_filename = secure_filename(test_data_file.filename)
+        try:
+            model, hyperparams = parse_model_fields(request.form, name=name, type=type,
+                                                    training_mode=training_mode,
+                                                    model=experiment.model,
+                                                    hyperparams=experiment.hyperparams)
+        except ValueError as e:
+            response_object = {
+                'status': 'fail',
+                'message': f'Experiment id {id} Invalid! \n {e}'
+            }
+            return jsonify(response_object), 400
 
+        try:
+            train_data_filename, train_data_source = get_data_file(request, 'train_data')
+            test_data_filename, test_data_source = get_data_file(request, 'test_data')
+
+            with metrics.stage('file_save'):
+                staged = [stage_request_data_file(train_data_source)]
+                try:
+                    staged.append(stage_request_data_file(test_data_source))
+                except UploadError:
+                    os.remove(staged[0][0])
+                    raise
+        except UploadError as e:
+            db.session.rollback()
+            return upload_error_response(e)
+
+        # Both files are staged, the data files the experiment reads are only replaced now
         experiment_locator = Locator(experiment.id,
                                      train_data_filename=train_data_filename,
                                      test_data_filename=test_data_filename)
+        with metrics.stage('file_save'):
+            blob_paths = []
+            for staged_file_path, size, sha256, profile in staged:
+                DatasetStore.acquire(sha256, size, profile=profile)
+                blob_paths.append(DatasetStore.store(staged_file_path, sha256))
+            DatasetStore.link(blob_paths[0], experiment_locator.get_train_data_file_path())
+            DatasetStore.link(blob_paths[1], experiment_locator.get_test_data_file_path())
+        (_, train_data_size, train_data_sha256, _), (_, test_data_size, test_data_sha256, _) = staged
 
-        train_data_file.save(experiment_locator.get_train_data_file_path())
-        test_data_file.save(experiment_locator.get_test_data_file_path())
-
+        replaced_sha256s = [experiment.train_data_sha256, experiment.test_data_sha256]
         experiment.name = name
         experiment.type = type
+        experiment.training_mode = training_mode
+        experiment.model = model
+        experiment.hyperparams = hyperparams
         experiment.result = result
         experiment.start_date = start_date
         experiment.train_data = train_data_filename
         experiment.test_data = test_data_filename
+        experiment.train_data_size = train_data_size
+        experiment.train_data_sha256 = train_data_sha256
+        experiment.test_data_size = test_data_size
+        experiment.test_data_sha256 = test_data_sha256
 
+        for sha256 in replaced_sha256s:
+            DatasetStore.release(sha256)
         db.session.commit()
+        DatasetStore.purge(replaced_sha256s)
+        model_cache.invalidate(experiment.id)
 
         response_object = {
             'status': 'success',
@@ -241,9 +872,17 @@ def delete_single_experiment(id):
             }
             return jsonify(response_object), 404
         else:
+            sha256s = [experiment.train_data_sha256, experiment.test_data_sha256]
+            for sha256 in sha256s:
+                DatasetStore.release(sha256)
             db.session.delete(experiment)
+            tombstone = Tombstone(experiment.id)
+            db.session.add(tombstone)
             db.session.commit()
-            Locator.delete_experiment_folders(id)
+            model_cache.invalidate(id)
+            # A single rename, the reaper removes the folder in the background
+            Locator.trash_experiment_folders(experiment.id, tombstone.trash_name)
+            DatasetStore.purge(sha256s)
             response_object = {
                 'status': 'success',
                 'message': f'Experiment id {id} Deleted!'
@@ -270,16 +909,136 @@ def train(id):
             }
             return jsonify(response_object), 404
 
-        experiment = ConductExperiment.train(experiment=experiment)
+        force = is_forced(request)
+        memoized = None if force else ConductExperiment.find_memoized(experiment, 'train')
+        if memoized:
+            return memoized_response(memoized, f'Experiment id {id} Already Trained on this Data!')
+
+        job = job_queue.submit(experiment=experiment, kind='train')
 
-        db.session.commit()
         response_object = {
             'status': 'success',
-            'message': f'Experiment id {id} Trained!',
-            'result': experiment.result
+            'message': f'Experiment id {id} Training Job Submitted!',
+            'job_id': job.id,
+            'cache': 'bypass' if force else 'miss'
             }
 
-        return jsonify(response_object), 200
+        return jsonify(response_object), 202
+    except Exception as e:
+        response_object = {
+            'status': 'fail',
+            'message': "Internal Server Error",
+            'error': str(e)
+        }
+        return jsonify(response_object), 500
+
+@experiments_blueprint.route('/experiments/bulk/train', methods=['POST'])
+def train_bulk():
+    """Submit training jobs for many experiments in one commit, reporting a status per experiment"""
+    try:
+        data = request.get_json(silent=True) or {}
+        ids = data.get('ids')
+        max_items = current_app.config['BULK_MAX_EXPERIMENTS']
+        if not isinstance(ids, list) or not ids or len(ids) > max_items or \
+                not all(isinstance(id, int) and not isinstance(id, bool) for id in ids):
+            response_object = {
+                'status': 'fail',
+                'message': f'Invalid bulk train request! \n ids must be a list of 1 to {max_items} experiment ids'
+            }
+            return jsonify(response_object), 400
+
+        force = is_forced(request)
+        experiments = {experiment.id: experiment for experiment in
+                       Experiment.query.filter(Experiment.id.in_(ids)).all()}
+        memoized_results = {} if force else ConductExperiment.find_memoized_many(experiments.values(), 'train')
+        report = []
+        submitted = []
+        for id in dict.fromkeys(ids):
+            experiment = experiments.get(id)
+            if experiment is None:
+                report.append({'id': id, 'status': 'fail', 'message': f'Experiment id {id} Not Found!'})
+                continue
+            memoized = memoized_results.get(id)
+            if memoized:
+                report.append({'id': id, 'status': 'success',
+                               'message': f'Experiment id {id} Already Trained on this Data!',
+                               'job_id': memoized.job_id, 'result_id': memoized.id, 'cache': 'hit'})
+                continue
+            entry = {'id': id, 'status': 'success', 'message': f'Experiment id {id} Training Job Submitted!',
+                     'cache': 'bypass' if force else 'miss'}
+            report.append(entry)
+            submitted.append((experiment, entry))
+
+        jobs = job_queue.submit_many([experiment for experiment, _ in submitted], kind='train') if submitted else []
+        for (_, entry), job in zip(submitted, jobs):
+            entry['job_id'] = job.id
+
+        response_object = {
+            'status': 'success',
+            'message': f'{len(jobs)} Training Jobs Submitted!',
+            'experiments': report
+        }
+        return jsonify(response_object), 202 if jobs else 200
+    except Exception as e:
+        response_object = {
+            'status': 'fail',
+            'message': "Internal Server Error",
+            'error': str(e)
+        }
+        return jsonify(response_object), 500
+
+@experiments_blueprint.route('/experiments/tune/<id>', methods=['POST'])
+def tune(id):
+    """Submit a cross-validated hyperparameter search for an experiment"""
+    try:
+        experiment = Experiment.query.filter_by(id=id).first()
+
+        if not experiment:
+            response_object = {
+            'status': 'fail',
+            'message': f'Experiment id {id} Not Found!',
+            }
+            return jsonify(response_object), 404
+
+        data = request.get_json(silent=True) or {}
+        search = {
+            'space': data.get('space'),
+            'search': data.get('search', 'grid'),
+            'n_trials': data.get('n_trials'),
+            'folds': data.get('folds', 5),
+            'early_stopping_margin': data.get('early_stopping_margin'),
+            'seed': data.get('seed', 0),
+            'workers': current_app.config['TUNE_WORKERS']
+        }
+        try:
+            backend = ModelRegistry.resolve(experiment)
+            n_trials = len(HyperparameterSearch(backend.model_class, base_hyperparams=experiment.hyperparams,
+                                                **search).make_trials())
+        except (ValueError, TypeError, KeyError) as e:
+            response_object = {
+                'status': 'fail',
+                'message': f'Experiment id {id} Invalid search! \n {e}'
+            }
+            return jsonify(response_object), 400
+
+        max_trials = current_app.config['TUNE_MAX_TRIALS']
+        if n_trials > max_trials:
+            response_object = {
+                'status': 'fail',
+                'message': f'Experiment id {id} Invalid search! \n {n_trials} trials requested, at most {max_trials} allowed'
+            }
+            return jsonify(response_object), 400
+
+        job = job_queue.submit(experiment=experiment, kind='tune', params=search)
+
+        response_object = {
+            'status': 'success',
+            'message': f'Experiment id {id} Tuning Job Submitted!',
+            'job_id': job.id,
+            'n_trials': n_trials
+            }
+
+        return jsonify(response_object), 202
     except Exception as e:
         response_object = {
             'status': 'fail',
@@ -307,15 +1066,147 @@ def test(id):
             }
             return jsonify(response_object), 404
 
-        experiment = ConductExperiment.test(experiment=experiment)
-        db.session.commit()
+        force = is_forced(request)
+        memoized = None if force else ConductExperiment.find_memoized(experiment, 'test')
+        if memoized:
+            return memoized_response(memoized, f'Experiment id {id} Already Tested on this Data!')
 
+        job = job_queue.submit(experiment=experiment, kind='test')
+
+        response_object = {
+            'status': 'success',
+            'message': f'Experiment id {id} Testing Job Submitted!',
+            'job_id': job.id,
+            'cache': 'bypass' if force else 'miss'
+            }
+
+        return jsonify(response_object), 202
+    except Exception as e:
+        response_object = {
+            'status': 'fail',
+            'message': "Internal Server Error",
+            'error': str(e)
+        }
+        return jsonify(response_object), 500
+
+@experiments_blueprint.route('/experiments/uploads', methods=['POST'])
+def initiate_upload():
+    """Start a resumable chunked upload of a train or test data file"""
+    try:
+        data = request.get_json(silent=True) or {}
+        filename = secure_filename(data.get('filename', ''))
+
+        if not allowed_file(filename):
+            response_object = {
+                'status': 'fail',
+                'message': f'Upload Invalid! \n Invalid file extention {filename} '
+            }
+            return jsonify(response_object), 400
+
+        upload = chunked_uploads().initiate(filename)
+        response_object = {
+            'status': 'success',
+            'message': f'Upload {upload["upload_id"]} initiated!',
+            'data': upload
+        }
+        return jsonify(response_object), 201
+    except Exception as e:
+        response_object = {
+            'status': 'fail',
+            'message': "Internal Server Error",
+            'error': str(e)
+        }
+        return jsonify(response_object), 500
+
+@experiments_blueprint.route('/experiments/uploads/<upload_id>', methods=['GET'])
+def get_upload(upload_id):
+    """Get the offset a chunked upload should be resumed from"""
+    try:
+        upload = chunked_uploads().status(upload_id)
+        response_object = {
+            'status': 'success',
+            'data': upload
+        }
+        return jsonify(response_object), 200
+    except UploadError as e:
+        return upload_error_response(e)
+    except Exception as e:
+        response_object = {
+            'status': 'fail',
+            'message': "Internal Server Error",
+            'error': str(e)
+        }
+        return jsonify(response_object), 500
+
+@experiments_blueprint.route('/experiments/uploads/<upload_id>', methods=['PUT'])
+def append_upload(upload_id):
+    """Append the raw request body to a chunked upload at ?offset="""
+    try:
+        offset = request.args.get('offset', type=int)
+        if offset is None:
+            response_object = {
+                'status': 'fail',
+                'message': 'Please send the chunk offset'
+            }
+            return jsonify(response_object), 400
+
+        offset = chunked_uploads().append(upload_id, request.stream, offset,
+                                          sha256=request.headers.get('X-Chunk-SHA256'))
+        response_object = {
+            'status': 'success',
+            'message': f'Upload {upload_id} chunk received!',
+            'offset': offset
+        }
+        return jsonify(response_object), 200
+    except UploadError as e:
+        return upload_error_response(e)
+    except Exception as e:
+        response_object = {
+            'status': 'fail',
+            'message': "Internal Server Error",
+            'error': str(e)
+        }
+        return jsonify(response_object), 500
+
+@experiments_blueprint.route('/experiments/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    """Seal a chunked upload so it can be attached to an experiment"""
+    try:
+        data = request.get_json(silent=True) or {}
+        upload = chunked_uploads().complete(upload_id, sha256=data.get('sha256'))
         response_object = {
             'status': 'success',
-            'message': f'Experiment id {id} Tested!',
-            'result':  experiment.result
+            'message': f'Upload {upload_id} completed!',
+            'data': upload
+        }
+        return jsonify(response_object), 200
+    except UploadError as e:
+        return upload_error_response(e)
+    except Exception as e:
+        response_object = {
+            'status': 'fail',
+            'message': "Internal Server Error",
+            'error': str(e)
+        }
+        return jsonify(response_object), 500
+
+@experiments_blueprint.route('/experiments/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get state, timing and result of a train or test job"""
+    try:
+        job = Job.query.filter_by(id=job_id).first()
+
+        if not job:
+            response_object = {
+                'status': 'fail',
+                'message': f'Job id {job_id} Not Found!'
             }
+            return jsonify(response_object), 404
 
+        response_object = {
+            'status': 'success',
+            'data': job.to_json()
+        }
         return jsonify(response_object), 200
     except Exception as e:
         response_object = {
@@ -363,6 +1254,295 @@ def predict(id):
         }
         return jsonify(response_object), 500
 
+def batch_size(samples):
+    if isinstance(samples, dict):
+        return max([len(column) for column in samples.values()], default=0)
+    return len(samples)
+
+
+def invalid_sample_fields(samples):
+    """Columns of a column oriented batch that are not lists, or the positions of samples that are not dicts"""
+    if isinstance(samples, dict):
+        return [str(key) for key, column in samples.items() if not isinstance(column, list)]
+    return [str(index) for index, sample in enumerate(samples) if not isinstance(sample, dict)]
+
+@experiments_blueprint.route('/experiments/predict/<id>/batch', methods=['POST'])
+def predict_batch(id):
+    """Predict a batch of data samples with a single vectorized call"""
+    try:
+        experiment = Experiment.query.filter_by(id=id).first()
+
+        if not experiment:
+            response_object = {
+            'status': 'fail',
+            'message': f'Experiment id {id} Not Found!',
+            }
+            return jsonify(response_object), 404
+
+        if not ConductExperiment.is_experiment_trained(experiment):
+            response_object = {
+                'status': 'fail',
+                'message': f'Experiment id {id} Not Trained! Model Not found',
+            }
+            return jsonify(response_object), 404
+
+        data = request.get_json(silent=True)
+        # A bare JSON list is the list of samples itself
+        samples = data.get('samples') if isinstance(data, dict) else data
+        if not samples or not isinstance(samples, (list, dict)):
+            response_object = {
+                'status': 'fail',
+                'message': 'Invalid payload! Please send a list of samples or a dict of sample columns'
+            }
+            return jsonify(response_object), 400
+
+        invalid = invalid_sample_fields(samples)
+        if invalid:
+            expected = 'lists of values' if isinstance(samples, dict) else 'dicts of features'
+            response_object = {
+                'status': 'fail',
+                'message': f"Invalid payload! Samples must be {expected}, invalid: {', '.join(invalid)}"
+            }
+            return jsonify(response_object), 400
+
+        if not batch_size(samples):
+            response_object = {
+                'status': 'fail',
+                'message': 'Invalid payload! The batch holds no samples'
+            }
+            return jsonify(response_object), 400
+
+        max_batch_size = current_app.config['MAX_PREDICT_BATCH_SIZE']
+        if batch_size(samples) > max_batch_size:
+            response_object = {
+                'status': 'fail',
+                'message': f'Batch too large! At most {max_batch_size} samples can be predicted per request'
+            }
+            return jsonify(response_object), 413
+
+        try:
+            predictions, probabilities = ConductExperiment.predict_batch(experiment=experiment, samples=samples)
+        except InvalidSamples as e:
+            response_object = {
+                'status': 'fail',
+                'message': f'Invalid payload! {e}'
+            }
+            return jsonify(response_object), 400
+
+        response_object = {
+            'status': 'success',
+            'message': f'Experiment id {id}, {len(predictions)} Data Samples Predicted!!',
+            'predictions': predictions,
+            'probabilities': probabilities
+            }
+
+        return jsonify(response_object), 200
+    except Exception as e:
+        response_object = {
+            'status': 'fail',
+            'message': "Internal Server Error",
+            'error': str(e)
+        }
+        return jsonify(response_object), 500
+
+SCORE_MIMETYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+
+def get_score_format(request):
+    """ndjson or csv, from the format parameter or else the Accept header"""
+    score_format = request.args.get('format') or request.form.get('format')
+    if not score_format:
+        best = request.accept_mimetypes.best_match([SCORE_MIMETYPES['ndjson'], SCORE_MIMETYPES['csv']])
+        score_format = 'csv' if best == SCORE_MIMETYPES['csv'] else 'ndjson'
+    if score_format not in SCORE_MIMETYPES:
+        raise ValueError(f"format must be one of {', '.join(SCORE_MIMETYPES)}")
+    return score_format
+
+
+def get_score_chunk_size(request):
+    max_chunk_size = current_app.config['SCORE_MAX_CHUNK_ROWS']
+    try:
+        chunk_size = int(request.args.get('chunk_size', current_app.config['SCORE_CHUNK_ROWS']))
+    except ValueError:
+        raise ValueError('chunk_size must be an integer')
+    if not 1 <= chunk_size <= max_chunk_size:
+        raise ValueError(f'chunk_size must be between 1 and {max_chunk_size}')
+    return chunk_size
+
+
+def get_score_source(request):
+    """The csv to score: an uploaded ``data`` file, a completed chunked upload or a stored dataset.
+
+    Returns an open file or a path, None when the request names no data.
+    Raises ValueError for a malformed JSON body or sha256, UploadError for
+    an unknown or incomplete upload and LookupError for an unknown dataset.
+    """
+    if 'data' in request.files:
+        return request.files['data'].stream
+    data = request.get_json(silent=True)
+    if data is None:
+        data = {}
+    elif not isinstance(data, dict):
+        raise ValueError('Invalid payload! The JSON body must be an object')
+    def reference(name):
+        return request.form.get(name) or request.args.get(name) or data.get(name)
+
+    if reference('upload_id'):
+        return chunked_uploads().get_data_file_path(reference('upload_id'))
+    sha256 = reference('sha256')
+    if sha256:
+        if not isinstance(sha256, str) or not DatasetStore.sha256_pattern.fullmatch(sha256.lower()):
+            raise ValueError('Invalid payload! sha256 must be 64 hexadecimal characters')
+        if not Dataset.query.filter_by(sha256=sha256.lower()).first():
+            raise LookupError(f'Dataset {sha256} Not Found!')
+        return DatasetStore.get_blob_path(sha256.lower())
+    return None
+
+
+def format_scores_ndjson(row, predictions, probabilities):
+    frame = pd.DataFrame({'row': np.arange(row, row + len(predictions)), 'prediction': predictions,
+                          'probabilities': list(probabilities)})
+    lines = frame.to_json(orient='records', lines=True, double_precision=15)
+    return lines if lines.endswith('\n') else lines + '\n'
+
+
+def format_scores_csv(row, predictions, probabilities, classes):
+    columns = {'row': np.arange(row, row + len(predictions)), 'prediction': predictions}
+    for index, label in enumerate(classes):
+        columns[f'probability_{label}'] = probabilities[:, index]
+    return pd.DataFrame(columns).to_csv(index=False, header=False)
+
+
+@experiments_blueprint.route('/experiments/score/<id>', methods=['POST'])
+def score(id):
+    """Score a csv with a trained experiment, streaming the predictions back as NDJSON or CSV.
+
+    The file is predicted chunk by chunk while the response is sent, so the
+    first rows arrive before a large file is done and memory stays bounded
+    by the chunk size.
+    """
+    try:
+        experiment = Experiment.query.filter_by(id=id).first()
+
+        if not experiment:
+            response_object = {
+            'status': 'fail',
+            'message': f'Experiment id {id} Not Found!',
+            }
+            return jsonify(response_object), 404
+
+        if not ConductExperiment.is_experiment_trained(experiment):
+            response_object = {
+                'status': 'fail',
+                'message': f'Experiment id {id} Not Trained! Model Not found',
+            }
+            return jsonify(response_object), 404
+
+        try:
+            score_format = get_score_format(request)
+            chunk_size = get_score_chunk_size(request)
+        except ValueError as e:
+            response_object = {
+                'status': 'fail',
+                'message': str(e)
+            }
+            return jsonify(response_object), 400
+
+        try:
+            source = get_score_source(request)
+        except UploadError as e:
+            return upload_error_response(e)
+        except LookupError as e:
+            response_object = {
+                'status': 'fail',
+                'message': str(e)
+            }
+            return jsonify(response_object), 404
+        except ValueError as e:
+            response_object = {
+                'status': 'fail',
+                'message': str(e)
+            }
+            return jsonify(response_object), 400
+        if source is None:
+            response_object = {
+                'status': 'fail',
+                'message': 'Invalid payload! Please send a data file, an upload_id or the sha256 of a stored dataset'
+            }
+            return jsonify(response_object), 400
+
+        # The first chunk is scored before responding, so an unreadable file still gets an error status
+        chunks = ConductExperiment.score_file(experiment, source, chunk_size)
+        try:
+            first = next(chunks, None)
+        except ValueError as e:
+            response_object = {
+                'status': 'fail',
+                'message': 'Data file could not be scored',
+                'error': str(e)
+            }
+            return jsonify(response_object), 400
+
+        classes = ConductExperiment.get_classes(experiment)
+        if classes is None:
+            classes = list(range(first[2].shape[1])) if first is not None else []
+
+        def generate():
+            if score_format == 'csv':
+                yield ','.join(['row', 'prediction'] + [f'probability_{label}' for label in classes]) + '\n'
+            if first is None:
+                return
+            try:
+                for row, predictions, probabilities in chain([first], chunks):
+                    if score_format == 'csv':
+                        yield format_scores_csv(row, predictions, probabilities, classes)
+                    else:
+                        yield format_scores_ndjson(row, predictions, probabilities)
+            except Exception as e:
+                # The status line is already sent, the stream ends with the error instead
+                current_app.logger.exception(f'Scoring experiment id {id} failed')
+                if score_format == 'csv':
+                    yield f'# Scoring failed: {e}\n'
+                else:
+                    yield json.dumps({'status': 'fail', 'message': 'Scoring failed', 'error': str(e)}) + '\n'
+
+        response = Response(stream_with_context(generate()), mimetype=SCORE_MIMETYPES[score_format])
+        response.headers['X-Score-Chunk-Rows'] = str(chunk_size)
+        return response
+    except Exception as e:
+        response_object = {
+            'status': 'fail',
+            'message': "Internal Server Error",
+            'error': str(e)
+        }
+        return jsonify(response_object), 500
+
+@experiments_blueprint.route('/experiments/models', methods=['GET'])
+def get_models():
+    """List the registered models with their declared hyperparameters"""
+    return jsonify({
+        'status': 'success',
+        'data': {
+            'models': ModelRegistry.describe()
+        }
+    }), 200
+
+@experiments_blueprint.route('/experiments/model_cache', methods=['GET'])
+def get_model_cache_stats():
+    """Get model cache hit/miss counters"""
+    return jsonify({
+        'status': 'success',
+        'data': model_cache.stats()
+    }), 200
+
+@experiments_blueprint.route('/experiments/micro_batcher', methods=['GET'])
+def get_micro_batcher_stats():
+    """Get predict micro-batch size and wait counters"""
+    return jsonify({
+        'status': 'success',
+        'data': micro_batcher.stats()
+    }), 200
+
 @experiments_blueprint.route('/experiments/ping', methods=['GET'])
 def ping():
     return jsonify({
@@ -1,4 +1,6 @@
 # from sqlalchemy.sql import func
+import json
+import uuid
 from datetime import datetime
 from project import db
 
@@ -6,29 +8,288 @@ from project import db
 class Experiment(db.Model):
     __tablename__ = 'experiments'
 
+    __table_args__ = (
+        # Serves the name prefix filter (LIKE 'prefix%') on non C collations
+        db.Index('ix_experiments_name_pattern', 'name', postgresql_ops={'name': 'varchar_pattern_ops'}),
+    )
+
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     name = db.Column(db.String(255), unique=True, nullable=False)
-    start_date = db.Column(db.DateTime, nullable=False)
+    start_date = db.Column(db.DateTime, nullable=False, index=True)
     # start_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
-    type = db.Column(db.String(128), nullable=False)
+    type = db.Column(db.String(128), nullable=False, index=True)
     result = db.Column(db.JSON)
+    training_mode = db.Column(db.String(32), nullable=False, default='batch')
+    model = db.Column(db.String(128))
+    hyperparams = db.Column(db.JSON)
     test_data = db.Column(db.String(255))
     train_data = db.Column(db.String(255))
+    train_data_size = db.Column(db.BigInteger)
+    train_data_sha256 = db.Column(db.String(64))
+    test_data_size = db.Column(db.BigInteger)
+    test_data_sha256 = db.Column(db.String(64))
+    # Recorded when a model is saved, so serving never asks the filesystem
+    trained = db.Column(db.Boolean, nullable=False, default=False)
+    trained_at = db.Column(db.DateTime, index=True)
+    model_path = db.Column(db.String(1024))
+    model_size = db.Column(db.BigInteger)
+    model_sha256 = db.Column(db.String(64))
 
-    def __init__(self, name, type, test_data=None, train_data=None, start_date=datetime.utcnow()):
+    def __init__(self, name, type, test_data=None, train_data=None, start_date=datetime.utcnow(),
+                 training_mode='batch', model=None, hyperparams=None):
         self.name = name
         self.type = type
+        self.training_mode = training_mode
+        self.model = model
+        self.hyperparams = hyperparams
         self.test_data = test_data
         self.train_data = train_data
         self.start_date = start_date
+        self.trained = False
 
-    def to_json(self):
+    # Fields to_json can be projected to, in the order they are serialized
+    json_fields = ('id', 'name', 'type', 'training_mode', 'model', 'hyperparams', 'train_data', 'test_data',
+                   'train_data_size', 'train_data_sha256', 'test_data_size', 'test_data_sha256', 'result',
+                   'start_date', 'trained', 'trained_at', 'model_size', 'model_sha256')
+
+    def to_json(self, fields=None):
+        if fields is not None:
+            return {field: getattr(self, field) for field in self.json_fields if field in fields}
         return {
                 'id': self.id,
                 'name': self.name,
                 'type': self.type,
+                'training_mode': self.training_mode,
+                'model': self.model,
+                'hyperparams': self.hyperparams,
                 'train_data': self.train_data,
                 'test_data': self.test_data,
+                'train_data_size': self.train_data_size,
+                'train_data_sha256': self.train_data_sha256,
+                'test_data_size': self.test_data_size,
+                'test_data_sha256': self.test_data_sha256,
                 'result': self.result,
-                'start_date': self.start_date
-            }
\ No newline at end of file
+                'start_date': self.start_date,
+                'trained': self.trained,
+                'trained_at': self.trained_at,
+                'model_size': self.model_size,
+                'model_sha256': self.model_sha256
+            }
+
+
+
+class Dataset(db.Model):
+    """A data file stored once by content, refcount counts the experiment files linked to it"""
+    __tablename__ = 'datasets'
+
+    sha256 = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.BigInteger, nullable=False)
+    refcount = db.Column(db.Integer, nullable=False, default=0)
+    # Statistics computed while the file was uploaded, see DatasetProfiler
+    profile = db.Column(db.JSON(none_as_null=True))
+    created_at = db.Column(db.DateTime, nullable=False)
+
+    def __init__(self, sha256, size, refcount=0, profile=None):
+        self.sha256 = sha256
+        self.size = size
+        self.refcount = refcount
+        self.profile = profile
+        self.created_at = datetime.utcnow()
+
+    def to_json(self):
+        return {
+                'sha256': self.sha256,
+                'size': self.size,
+                'refcount': self.refcount,
+                'created_at': self.created_at
+            }
+
+
+class Tombstone(db.Model):
+    """A deleted experiment whose folder is waiting for the reaper"""
+    __tablename__ = 'tombstones'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    # No foreign key, the experiment row is gone when the tombstone is written
+    experiment_id = db.Column(db.Integer, nullable=False)
+    # Name of the folder in the trash, unique even when ids are reused or the database is recreated
+    trash_name = db.Column(db.String(32), nullable=False, unique=True)
+    created_at = db.Column(db.DateTime, nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+
+    def __init__(self, experiment_id):
+        self.experiment_id = experiment_id
+        self.trash_name = uuid.uuid4().hex
+        self.created_at = datetime.utcnow()
+        self.attempts = 0
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    experiment_id = db.Column(db.Integer, db.ForeignKey('experiments.id', ondelete='CASCADE'),
+                              nullable=False, index=True)
+    kind = db.Column(db.String(32), nullable=False)
+    status = db.Column(db.String(32), nullable=False, index=True)
+    params = db.Column(db.JSON)
+    result = db.Column(db.JSON)
+    error = db.Column(db.Text)
+    submitted_at = db.Column(db.DateTime, nullable=False)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    # Set when a profiled request submitted the job to the pool, see RequestProfiler
+    profile_mode = db.Column(db.String(16))
+    profile_path = db.Column(db.String(256))
+
+    def __init__(self, experiment_id, kind, status='queued', params=None, profile_mode=None):
+        self.experiment_id = experiment_id
+        self.kind = kind
+        self.status = status
+        self.params = params
+        self.profile_mode = profile_mode
+        self.submitted_at = datetime.utcnow()
+
+    def to_json(self):
+        queued_seconds = None
+        run_seconds = None
+        if self.started_at:
+            queued_seconds = (self.started_at - self.submitted_at).total_seconds()
+            if self.finished_at:
+                run_seconds = (self.finished_at - self.started_at).total_seconds()
+        result = self.result
+        # Jobs finished by earlier builds stored the output as a JSON string
+        if isinstance(result, str):
+            result = json.loads(result)
+        return {
+                'id': self.id,
+                'experiment_id': self.experiment_id,
+                'kind': self.kind,
+                'status': self.status,
+                'params': self.params,
+                'result': result,
+                'error': self.error,
+                'submitted_at': self.submitted_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+                'queued_seconds': queued_seconds,
+                'run_seconds': run_seconds,
+                'profile_path': self.profile_path
+            }
+
+
+class Result(db.Model):
+    """One train, test or tune run of an experiment, appended and never rewritten"""
+    __tablename__ = 'results'
+
+    __table_args__ = (
+        db.Index('ix_results_experiment_id_id', 'experiment_id', 'id'),
+        db.Index('ix_results_experiment_run_type_fingerprint', 'experiment_id', 'run_type', 'fingerprint'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    experiment_id = db.Column(db.Integer, db.ForeignKey('experiments.id', ondelete='CASCADE'), nullable=False)
+    job_id = db.Column(db.Integer)
+    run_type = db.Column(db.String(32), nullable=False)
+    model_sha256 = db.Column(db.String(64))
+    # Hash of the inputs of the run, an identical request reuses this result
+    fingerprint = db.Column(db.String(64))
+    duration_seconds = db.Column(db.Float)
+    # Output that is not a number, e.g. the trials of a hyperparameter search
+    details = db.Column(db.JSON)
+    created_at = db.Column(db.DateTime, nullable=False)
+    metrics = db.relationship('ResultMetric', lazy='selectin', order_by='ResultMetric.id',
+                              cascade='all, delete-orphan', passive_deletes=True)
+
+    def __init__(self, experiment_id, run_type, job_id=None, model_sha256=None, duration_seconds=None,
+                 details=None, fingerprint=None):
+        self.experiment_id = experiment_id
+        self.run_type = run_type
+        self.job_id = job_id
+        self.model_sha256 = model_sha256
+        self.fingerprint = fingerprint
+        self.duration_seconds = duration_seconds
+        self.details = details
+        self.created_at = datetime.utcnow()
+
+    @classmethod
+    def from_run(cls, experiment, run_type, output, job_id=None, duration_seconds=None, fingerprint=None):
+        """Split a run output into metric rows for its numbers and details for the rest"""
+        result = cls(experiment.id, run_type, job_id=job_id, model_sha256=experiment.model_sha256,
+                     duration_seconds=duration_seconds, fingerprint=fingerprint)
+        details = {}
+        for name, value in output.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                result.metrics.append(ResultMetric(experiment.id, run_type, name, value))
+            else:
+                details[name] = value
+        result.details = details or None
+        return result
+
+    @classmethod
+    def summarize(cls, experiment_ids):
+        """Aggregate the metrics of experiments, two grouped queries whatever the number of runs.
+
+        Returns ``{experiment_id: {run_type: {metric: {runs, last, min, max, mean}}}}``.
+        """
+        if not experiment_ids:
+            return {}
+        rows = db.session.query(ResultMetric.experiment_id, ResultMetric.run_type, ResultMetric.name,
+                                db.func.count(ResultMetric.id), db.func.min(ResultMetric.value),
+                                db.func.max(ResultMetric.value), db.func.avg(ResultMetric.value),
+                                db.func.max(ResultMetric.id)) \
+            .filter(ResultMetric.experiment_id.in_(experiment_ids)) \
+            .group_by(ResultMetric.experiment_id, ResultMetric.run_type, ResultMetric.name).all()
+        last_values = dict(db.session.query(ResultMetric.id, ResultMetric.value)
+                           .filter(ResultMetric.id.in_([row[7] for row in rows])).all()) if rows else {}
+
+        summary = {}
+        for experiment_id, run_type, name, runs, minimum, maximum, mean, last_id in rows:
+            summary.setdefault(experiment_id, {}).setdefault(run_type, {})[name] = {
+                'runs': runs,
+                'last': last_values.get(last_id),
+                'min': minimum,
+                'max': maximum,
+                'mean': mean
+            }
+        return summary
+
+    def to_output(self):
+        """The run output as returned by the job that produced it"""
+        return {**{metric.name: metric.value for metric in self.metrics}, **(self.details or {})}
+
+    def to_json(self):
+        return {
+                'id': self.id,
+                'experiment_id': self.experiment_id,
+                'job_id': self.job_id,
+                'run_type': self.run_type,
+                'model_sha256': self.model_sha256,
+                'duration_seconds': self.duration_seconds,
+                'metrics': {metric.name: metric.value for metric in self.metrics},
+                'details': self.details,
+                'created_at': self.created_at
+            }
+
+
+class ResultMetric(db.Model):
+    """One named number of a run, experiment id and run type are copied to aggregate without joins"""
+    __tablename__ = 'result_metrics'
+
+    __table_args__ = (
+        db.Index('ix_result_metrics_experiment_run_type_name', 'experiment_id', 'run_type', 'name'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    result_id = db.Column(db.Integer, db.ForeignKey('results.id', ondelete='CASCADE'), nullable=False,
+                          index=True)
+    experiment_id = db.Column(db.Integer, db.ForeignKey('experiments.id', ondelete='CASCADE'), nullable=False)
+    run_type = db.Column(db.String(32), nullable=False)
+    name = db.Column(db.String(128), nullable=False)
+    value = db.Column(db.Float)
+
+    def __init__(self, experiment_id, run_type, name, value):
+        self.experiment_id = experiment_id
+        self.run_type = run_type
+        self.name = name
+        self.value = value
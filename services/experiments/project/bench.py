@@ -0,0 +1,234 @@
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from project import db
+from project.api.models import Experiment
+from project.compression import response_compressor
+from project.ml.dataset_maker import PimaIndiansDatasetMaker
+from project.ml.environment import Locator
+from project.serialization import json_serializer
+
+
+def make_pima_dataset(n_rows, seed=0):
+    """Synthetic dataset with the Pima Indians Diabetes columns and value ranges"""
+    rng = np.random.RandomState(seed)
+    data = pd.DataFrame({
+        'pregnancies': rng.poisson(3.8, n_rows),
+        'glucose': np.clip(rng.normal(121, 32, n_rows), 40, 200).round(),
+        'blood_pressure': np.clip(rng.normal(69, 19, n_rows), 0, 122).round(),
+        'skin_thickness': np.clip(rng.normal(20, 16, n_rows), 0, 99).round(),
+        'insulin': np.clip(rng.exponential(80, n_rows), 0, 846).round(),
+        'bmi': np.clip(rng.normal(32, 8, n_rows), 0, 67).round(1),
+        'diabetes_pedigree_function': np.clip(rng.lognormal(-0.8, 0.6, n_rows), 0.078, 2.42).round(3),
+        'age': (21 + rng.exponential(12, n_rows)).astype(int)
+    }, columns=PimaIndiansDatasetMaker.features)
+    logit = 0.035 * (data['glucose'] - 121) + 0.08 * (data['bmi'] - 32) + 0.02 * (data['age'] - 33) - 0.6
+    data['outcome'] = (rng.uniform(size=n_rows) < 1 / (1 + np.exp(-logit))).astype(int)
+    return data
+
+
+def summarize(latencies, elapsed, errors):
+    """Latency percentiles in milliseconds and requests per second"""
+    latencies = np.asarray(latencies) * 1000
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': len(latencies) / elapsed if elapsed else None,
+        'mean_ms': float(latencies.mean()) if len(latencies) else None,
+        'p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else None,
+        'p95_ms': float(np.percentile(latencies, 95)) if len(latencies) else None,
+        'p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else None,
+        'max_ms': float(latencies.max()) if len(latencies) else None
+    }
+
+
+def current_rss():
+    """Resident set size of this process in bytes, None where /proc is not available"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+class Benchmark:
+    """Drives the experiments blueprint through the Flask test client.
+
+    Requests go through routing, validation, serialization and the database,
+    so the numbers include the whole request path apart from the network.
+    Expensive operations (create, train, test) run ``runs`` times per dataset
+    size, cheap ones ``requests`` times. Experiment folders are written to a
+    temporary Locator root and the app's database is recreated, so point the
+    app at a scratch database (BenchmarkConfig).
+    """
+
+    def __init__(self, app, runs=3, requests=200, predict_batch_size=100, test_fraction=0.25,
+                 listing_size=1000):
+        self.app = app
+        self.client = app.test_client()
+        self.runs = runs
+        self.requests = requests
+        self.predict_batch_size = predict_batch_size
+        self.test_fraction = test_fraction
+        self.listing_size = listing_size
+        self._created = []
+
+    def run(self, sizes):
+        report = {
+            'started_at': datetime.utcnow().isoformat(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'runs': self.runs,
+            'requests': self.requests,
+            'predict_batch_size': self.predict_batch_size,
+            'json_backend': json_serializer.backend,
+            'compression_encodings': list(response_compressor.encodings),
+            'sizes': {}
+        }
+        root = Locator.root
+        Locator.root = tempfile.mkdtemp(prefix='experiments_bench_')
+        try:
+            with self.app.app_context():
+                db.drop_all()
+                db.create_all()
+                try:
+                    for n_rows in sizes:
+                        report['sizes'][str(n_rows)] = self.run_size(n_rows)
+                    report['large_list'] = self.run_large_list()
+                finally:
+                    self.clean_up()
+        finally:
+            shutil.rmtree(Locator.root, ignore_errors=True)
+            Locator.root = root
+        return report
+
+    def run_size(self, n_rows):
+        train_data = make_pima_dataset(n_rows, seed=n_rows)
+        test_data = make_pima_dataset(max(int(n_rows * self.test_fraction), 1), seed=n_rows + 1)
+        train_csv = train_data.to_csv(index=False).encode()
+        test_csv = test_data.to_csv(index=False).encode()
+        samples = test_data[PimaIndiansDatasetMaker.features].head(self.predict_batch_size).to_dict('records')
+
+        results = {'train_rows': n_rows, 'test_rows': len(test_data), 'train_csv_bytes': len(train_csv)}
+
+        experiment_ids = []
+        def create():
+            response = self.client.post('/experiments', content_type='multipart/form-data', data={
+                'name': f'LR_bench_{n_rows}_{len(self._created)}',
+                'type': 'classification',
+                'train_data': (io.BytesIO(train_csv), 'bench_train.csv'),
+                'test_data': (io.BytesIO(test_csv), 'bench_test.csv')
+            })
+            if response.status_code == 201:
+                experiment_id = json.loads(response.data.decode())['id']
+                self._created.append(experiment_id)
+                experiment_ids.append(experiment_id)
+            return response
+        results['create'] = self.measure(create, self.runs)
+        if not experiment_ids:
+            return results
+        experiment_id = experiment_ids[0]
+
+        results['list'] = self.measure(lambda: self.client.get('/experiments'), self.requests)
+        results['get'] = self.measure(lambda: self.client.get(f'/experiments/{experiment_id}'), self.requests)
+        # Forced, otherwise every run after the first returns the memoized result
+        results['train'] = self.measure(lambda: self.client.post(f'/experiments/train/{experiment_id}?force=true'),
+                                        self.runs)
+        results['test'] = self.measure(lambda: self.client.post(f'/experiments/test/{experiment_id}?force=true'),
+                                       self.runs)
+        results['predict'] = self.measure(
+            lambda: self.client.post(f'/experiments/predict/{experiment_id}',
+                                     data=json.dumps({'sample': samples[0]}), content_type='application/json'),
+            self.requests)
+        results['predict_batch'] = self.measure(
+            lambda: self.client.post(f'/experiments/predict/{experiment_id}/batch',
+                                     data=json.dumps({'samples': samples}), content_type='application/json'),
+            self.requests)
+        results['predict_batch']['samples_per_request'] = len(samples)
+        results['predict_batch_compressed'] = self.measure_encodings(
+            lambda headers: self.client.post(f'/experiments/predict/{experiment_id}/batch', headers=headers,
+                                             data=json.dumps({'samples': samples}),
+                                             content_type='application/json'))
+        results['train_memory'] = self.measure_train_memory(experiment_id)
+        return results
+
+    def run_large_list(self):
+        """One page of GET /experiments at the maximum page size, plain and compressed"""
+        # Rows only, a listing never touches the experiment folders
+        db.session.add_all([Experiment(name=f'LR_list_{i}', type='classification')
+                            for i in range(self.listing_size)])
+        db.session.commit()
+        limit = min(self.listing_size, self.app.config['EXPERIMENTS_MAX_PAGE_SIZE'])
+        results = self.measure_encodings(lambda headers: self.client.get(f'/experiments?limit={limit}',
+                                                                          headers=headers))
+        results['experiments_per_page'] = limit
+        return results
+
+    def measure_encodings(self, send):
+        """Latency and response size of a request without compression and with each supported encoding"""
+        results = {}
+        for encoding in ('identity',) + response_compressor.encodings:
+            headers = {'Accept-Encoding': encoding}
+            results[encoding] = self.measure(lambda: send(headers), self.requests)
+            response = send(headers)
+            results[encoding]['response_bytes'] = len(response.get_data())
+            results[encoding]['content_encoding'] = response.headers.get('Content-Encoding', 'identity')
+        return results
+
+    def measure(self, send, count):
+        latencies = []
+        errors = 0
+        started = time.perf_counter()
+        for _ in range(count):
+            request_started = time.perf_counter()
+            response = send()
+            latencies.append(time.perf_counter() - request_started)
+            # Jobs run inline in benchmarks, a failed one still answers 202
+            failed_job = response.status_code == 202 and self.job_failed(response)
+            if response.status_code >= 400 or failed_job:
+                errors += 1
+        return summarize(latencies, time.perf_counter() - started, errors)
+
+    def job_failed(self, response):
+        job_id = json.loads(response.data.decode()).get('job_id')
+        job = json.loads(self.client.get(f'/experiments/jobs/{job_id}').data.decode())
+        return job['data']['status'] != 'done'
+
+    def measure_train_memory(self, experiment_id):
+        """Peak RSS of a forked process running one training of the experiment"""
+        baseline = current_rss()
+        if not hasattr(os, 'fork'):
+            return {'baseline_rss_bytes': baseline, 'peak_rss_bytes': None}
+
+        db.session.remove()
+        db.engine.dispose()
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                response = self.client.post(f'/experiments/train/{experiment_id}?force=true')
+                status = 0 if response.status_code == 202 and not self.job_failed(response) else 1
+            finally:
+                os._exit(status)
+        _, status, rusage = os.wait4(pid, 0)
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        peak = rusage.ru_maxrss if sys.platform == 'darwin' else rusage.ru_maxrss * 1024
+        return {'baseline_rss_bytes': baseline, 'peak_rss_bytes': peak, 'failed': status != 0}
+
+    def clean_up(self):
+        for experiment_id in self._created:
+            self.client.delete(f'/experiments/{experiment_id}')
+        self._created = []
+        db.session.remove()
+        db.drop_all()
@@ -0,0 +1,104 @@
+import gzip
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/csv', 'text/plain', 'application/x-ndjson')
+
+
+def parse_accept_encoding(header):
+    """Map each coding of an Accept-Encoding header to its quality"""
+    qualities = {}
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+    return qualities
+
+
+class ResponseCompressor:
+    """Compresses large responses with the best encoding the client accepts.
+
+    zstd is preferred when the zstandard package is installed, gzip
+    otherwise. Only responses of ``COMPRESSION_MIMETYPES`` with at least
+    ``COMPRESSION_MIN_BYTES`` are compressed, below that the framing costs
+    more than it saves. Streamed responses are passed through untouched.
+    A compressed response is another representation, its ETag gets the
+    encoding appended so caches never mix it up with the identity one.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.min_bytes = 1024
+        self.gzip_level = 6
+        self.zstd_level = 3
+        self.mimetypes = COMPRESSIBLE_MIMETYPES
+
+    def init_app(self, app):
+        self.enabled = app.config.get('COMPRESSION_ENABLED', self.enabled)
+        self.min_bytes = app.config.get('COMPRESSION_MIN_BYTES', self.min_bytes)
+        self.gzip_level = app.config.get('COMPRESSION_GZIP_LEVEL', self.gzip_level)
+        self.zstd_level = app.config.get('COMPRESSION_ZSTD_LEVEL', self.zstd_level)
+        self.mimetypes = tuple(app.config.get('COMPRESSION_MIMETYPES', self.mimetypes))
+        if self.enabled:
+            app.after_request(self.compress)
+
+    @property
+    def encodings(self):
+        """Supported encodings, most preferred first"""
+        return ('zstd', 'gzip') if zstandard is not None else ('gzip',)
+
+    def choose_encoding(self, accept_encoding):
+        """The supported encoding with the highest quality, ties go to the preferred one"""
+        qualities = parse_accept_encoding(accept_encoding or '')
+        best, best_quality = None, 0.0
+        for encoding in self.encodings:
+            quality = qualities.get(encoding, qualities.get('*', 0.0))
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+    def encode(self, data, encoding):
+        if encoding == 'zstd':
+            return zstandard.ZstdCompressor(level=self.zstd_level).compress(data)
+        return gzip.compress(data, compresslevel=self.gzip_level)
+
+    def compress(self, response):
+        from flask import request
+        from project.metrics import metrics
+
+        if response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers \
+                or not 200 <= response.status_code < 300 or response.mimetype not in self.mimetypes:
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = self.choose_encoding(request.headers.get('Accept-Encoding'))
+        if encoding is None:
+            return response
+        data = response.get_data()
+        if len(data) < self.min_bytes:
+            return response
+        with metrics.stage(f'compress_{encoding}'):
+            response.set_data(self.encode(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag is None:
+            return response
+        response.set_etag(f'{etag}-{encoding}', weak)
+        # The view compared If-None-Match with the identity ETag, compare again with this one
+        return response.make_conditional(request)
+
+
+response_compressor = ResponseCompressor()
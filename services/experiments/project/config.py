@@ -5,6 +5,56 @@ class BaseConfig:
     TESTING = False
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SECRET_KEY = 'my_precious'
+    METRICS_ENABLED = True
+    # auto encodes responses with orjson when it is installed, json falls back to the json module
+    JSON_BACKEND = os.environ.get('JSON_BACKEND', 'auto')
+    JSONIFY_PRETTYPRINT_REGULAR = False
+    # Responses the client accepts compressed, zstd when zstandard is installed and gzip otherwise
+    COMPRESSION_ENABLED = True
+    COMPRESSION_MIN_BYTES = 1024
+    COMPRESSION_GZIP_LEVEL = 6
+    COMPRESSION_ZSTD_LEVEL = 3
+    # Wraps the blueprint views so single requests can ask for a profile, off means zero overhead
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED') == '1'
+    PROFILING_SAMPLE_INTERVAL_MS = 1
+    MODEL_CACHE_MAX_ENTRIES = 32
+    MODEL_CACHE_MAX_BYTES = 256 * 1024 * 1024
+    # Models without array weights are saved as pickles, loading them runs their code
+    MODEL_STORE_ALLOW_PICKLE = os.environ.get('MODEL_STORE_ALLOW_PICKLE') == '1'
+    MAX_PREDICT_BATCH_SIZE = 10000
+    # Rows predicted per chunk when scoring a file, and the most a request may ask for
+    SCORE_CHUNK_ROWS = 10000
+    SCORE_MAX_CHUNK_ROWS = 100000
+    PREDICT_MICRO_BATCHING = False
+    PREDICT_MICRO_BATCH_MAX_WAIT_MS = 2
+    PREDICT_MICRO_BATCH_MAX_SIZE = 64
+    PREDICT_MICRO_BATCH_ADAPTIVE = True
+    EXPERIMENTS_PAGE_SIZE = 100
+    EXPERIMENTS_MAX_PAGE_SIZE = 1000
+    JOB_QUEUE_WORKERS = 2
+    # Experiments per bulk create or bulk train request, and threads writing their data files
+    BULK_MAX_EXPERIMENTS = 500
+    BULK_FILE_WORKERS = 8
+    TUNE_WORKERS = os.cpu_count() or 1
+    TUNE_MAX_TRIALS = 200
+    WSGI_BIND = os.environ.get('WSGI_BIND', '0.0.0.0:5000')
+    WSGI_WORKERS = int(os.environ.get('WSGI_WORKERS', os.cpu_count() or 1))
+    # More than one thread switches workers to gthread, which lets the predict micro-batcher coalesce requests
+    WSGI_THREADS = int(os.environ.get('WSGI_THREADS', 1))
+    WSGI_TIMEOUT = 120
+    # Models of the N most recently trained experiments loaded before forking the workers
+    WARM_UP_MODELS = int(os.environ.get('WARM_UP_MODELS', 0))
+    # None stages uploads in Locator.get_upload_dir(), under EXPERIMENTS_ROOT
+    UPLOAD_STAGING_DIR = os.environ.get('UPLOAD_STAGING_DIR')
+    UPLOAD_CHUNK_SIZE = 1024 * 1024
+    MAX_UPLOAD_BYTES = 16 * 1024 * 1024 * 1024
+    # Background removal of deleted experiments' folders, see project.reaper
+    GC_REAPER_ENABLED = os.environ.get('GC_REAPER_ENABLED', '1') == '1'
+    GC_INTERVAL_SECONDS = 30
+    GC_BATCH_SIZE = 20
+    GC_MAX_DELETES_PER_SECOND = 1000
+    # manage.py gc leaves younger orphans alone, they may belong to a request in flight
+    GC_MIN_AGE_SECONDS = 3600
 
 
 class DevelopmentConfig(BaseConfig):
@@ -16,4 +66,14 @@ class DevelopmentConfig(BaseConfig):
 class TestingConfig(BaseConfig):
     """Testing configuration"""
     TESTING = True
+    JOB_QUEUE_WORKERS = 0
+    TUNE_WORKERS = 2
+    GC_REAPER_ENABLED = False
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_TEST_URL')
+
+
+class BenchmarkConfig(BaseConfig):
+    """Benchmark configuration, the database is dropped and recreated by every run"""
+    JOB_QUEUE_WORKERS = 0
+    GC_REAPER_ENABLED = False
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_BENCH_URL', 'sqlite:////tmp/experiments_bench.db')
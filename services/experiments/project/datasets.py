@@ -0,0 +1,148 @@
+import os
+import re
+import stat
+import uuid
+from datetime import datetime
+
+from sqlalchemy import func
+
+from project import db
+from project.api.models import Dataset
+from project.ml.data_loader import DataLoader
+from project.ml.environment import Locator
+
+
+class DatasetStore:
+    """Content-addressed store of uploaded data files.
+
+    An upload is staged, then moved to ``<dataset dir>/<sha[:2]>/<sha256>``
+    unless a file with the same content is already stored. The data file path
+    of an experiment is a relative symlink to that blob, so a dataset uploaded
+    by many experiments is stored, parsed and cached once. The ``datasets``
+    table counts the links to every blob; a blob and the sidecars derived
+    from it are removed once no experiment references it anymore.
+
+    A reference is taken before the blob is stored and the blob is removed
+    while its row is locked, so an upload of the same content either keeps
+    the blob alive or waits for the purge and stores it again.
+    """
+
+    sha256_pattern = re.compile(r'[0-9a-f]{64}')
+
+    @classmethod
+    def get_staging_path(cls):
+        staging_dir = os.path.join(Locator.get_dataset_dir(), 'staging')
+        os.makedirs(staging_dir, exist_ok=True)
+        return os.path.join(staging_dir, uuid.uuid4().hex)
+
+    @classmethod
+    def get_blob_path(cls, sha256):
+        return os.path.join(Locator.get_dataset_dir(), sha256[:2], sha256)
+
+    @classmethod
+    def add(cls, staged_file_path, size, sha256, file_path, profile=None):
+        """Store a staged file by its content and link file_path to it, one reference is taken"""
+        cls.acquire(sha256, size, profile=profile)
+        blob_path = cls.store(staged_file_path, sha256)
+        cls.link(blob_path, file_path)
+        return blob_path
+
+    @classmethod
+    def store(cls, staged_file_path, sha256):
+        """Move a staged file into the store, or drop it when the content is already stored"""
+        blob_path = cls.get_blob_path(sha256)
+        if os.path.exists(blob_path):
+            os.remove(staged_file_path)
+        else:
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            # Blobs are shared, nothing may rewrite one in place
+            os.chmod(staged_file_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+            os.replace(staged_file_path, blob_path)
+        return blob_path
+
+    @classmethod
+    def link(cls, blob_path, file_path):
+        link_path = file_path + '.link'
+        if os.path.lexists(link_path):
+            os.remove(link_path)
+        os.symlink(os.path.relpath(blob_path, os.path.dirname(file_path)), link_path)
+        os.replace(link_path, file_path)
+
+    @classmethod
+    def acquire(cls, sha256, size, count=1, profile=None):
+        """Take count references, inserting the dataset row when the content is new"""
+        insert = cls._upsert_insert()
+        if insert is None:
+            return cls._acquire_without_upsert(sha256, size, count, profile)
+        table = Dataset.__table__
+        statement = insert(table).values(sha256=sha256, size=size, refcount=count, profile=profile,
+                                         created_at=datetime.utcnow())
+        # Two first uploads of one content both end up counted, neither fails on the primary key
+        db.session.execute(statement.on_conflict_do_update(index_elements=[table.c.sha256], set_={
+            'refcount': table.c.refcount + statement.excluded.refcount,
+            'profile': func.coalesce(table.c.profile, statement.excluded.profile)
+        }))
+
+    @classmethod
+    def _upsert_insert(cls):
+        dialect = db.engine.dialect.name
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+            return insert
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+            return insert
+        return None
+
+    @classmethod
+    def _acquire_without_upsert(cls, sha256, size, count, profile):
+        updated = Dataset.query.filter_by(sha256=sha256) \
+            .update({Dataset.refcount: Dataset.refcount + count}, synchronize_session=False)
+        if not updated:
+            db.session.add(Dataset(sha256=sha256, size=size, refcount=count, profile=profile))
+            db.session.flush()
+        elif profile is not None:
+            Dataset.query.filter(Dataset.sha256 == sha256, Dataset.profile.is_(None)) \
+                .update({Dataset.profile: profile}, synchronize_session=False)
+
+    @classmethod
+    def has_profile(cls, sha256):
+        return db.session.query(Dataset.query.filter(Dataset.sha256 == sha256, Dataset.profile.isnot(None))
+                                .exists()).scalar()
+
+    @classmethod
+    def release(cls, sha256):
+        """Drop one reference, the blob stays until purge runs after the commit"""
+        if sha256:
+            Dataset.query.filter_by(sha256=sha256) \
+                .update({Dataset.refcount: Dataset.refcount - 1}, synchronize_session=False)
+
+    @classmethod
+    def purge(cls, sha256s):
+        """Delete the rows and blobs of the given datasets that lost their last reference"""
+        purged = []
+        for sha256 in set(sha256 for sha256 in sha256s if sha256):
+            # The row lock holds back acquire until the blob is gone, and the refcount is checked under it
+            dataset = Dataset.query.filter(Dataset.sha256 == sha256, Dataset.refcount <= 0) \
+                .with_for_update().first()
+            if dataset is None:
+                db.session.commit()
+                continue
+            try:
+                blob_path = cls.get_blob_path(sha256)
+                for path in (blob_path, *DataLoader.get_sidecar_paths(blob_path)):
+                    if os.path.exists(path):
+                        os.remove(path)
+                db.session.delete(dataset)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            purged.append(sha256)
+        return purged
+
+    @classmethod
+    def purge_unreferenced(cls):
+        """Purge every dataset without references, left behind when a request failed before its purge"""
+        return cls.purge([sha256 for (sha256,) in db.session.query(Dataset.sha256)
+                          .filter(Dataset.refcount <= 0).all()])
@@ -0,0 +1,248 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from datetime import datetime
+
+from flask import current_app, has_app_context
+
+from project import db
+
+
+class JobQueue:
+    """Local process-pool queue for train, test and tune jobs.
+
+    Job state lives in the ``jobs`` table so any web worker can report on a job
+    no matter which process ran it. With ``JOB_QUEUE_WORKERS = 0`` jobs run
+    inline in the submitting request, which keeps tests and debugging simple.
+    A finished job hands its stage timings back to the submitting process,
+    whose ``/metrics`` reports them. A job whose worker died, or that could
+    not be handed to the pool, is marked failed, and a broken pool is
+    replaced by a new one for the next submission.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+
+    def submit(self, experiment, kind, params=None):
+        """Record a queued job for the experiment and hand it to the worker pool"""
+        return self.submit_many([experiment], kind, params=params)[0]
+
+    def submit_many(self, experiments, kind, params=None):
+        """Record one queued job per experiment in a single commit, then hand them to the worker pool"""
+        from project.api.models import Job
+        from project.profiling import request_profiler
+
+        max_workers = current_app.config.get('JOB_QUEUE_WORKERS', 0)
+        # Inline jobs are already part of the profile of the request running them
+        profile_mode = request_profiler.active_mode() if max_workers > 0 else None
+        jobs = [Job(experiment_id=experiment.id, kind=kind, params=params, profile_mode=profile_mode)
+                for experiment in experiments]
+        db.session.add_all(jobs)
+        db.session.commit()
+        job_ids = [job.id for job in jobs]
+
+        for job_id in job_ids:
+            if max_workers <= 0:
+                self._job_finished(run_job(job_id))
+                continue
+            try:
+                executor, future = self._submit(max_workers, job_id)
+            except Exception as e:
+                self._fail_job(job_id, f'Job could not be queued: {e}')
+                continue
+            future.add_done_callback(partial(self._job_done, current_app._get_current_object(), executor, job_id))
+        return jobs
+
+    def stats(self):
+        """Jobs waiting or running, finished jobs are counted by metrics.jobs_finished"""
+        from project.api.models import Job
+
+        # Only the unfinished statuses, through the status index, the finished jobs pile up forever
+        counts = dict(db.session.query(Job.status, db.func.count(Job.id))
+                      .filter(Job.status.in_(['queued', 'running'])).group_by(Job.status).all())
+        return {
+            'max_workers': current_app.config.get('JOB_QUEUE_WORKERS', 0),
+            'queued': counts.get('queued', 0),
+            'running': counts.get('running', 0)
+        }
+
+    def _submit(self, max_workers, job_id):
+        executor = self._get_executor(max_workers)
+        try:
+            return executor, executor.submit(_run_job_in_worker, job_id)
+        except BrokenProcessPool:
+            # A worker of this pool died since the last submission, the pool takes no more jobs
+            self._discard_executor(executor)
+            executor = self._get_executor(max_workers)
+            return executor, executor.submit(_run_job_in_worker, job_id)
+
+    def _job_done(self, app, executor, job_id, future):
+        # Usually called in the pool's management thread, outside of any request
+        if future.cancelled():
+            error = 'Job was cancelled'
+        elif future.exception() is not None:
+            if isinstance(future.exception(), BrokenProcessPool):
+                self._discard_executor(executor)
+            error = f'Job worker failed: {future.exception()}'
+        else:
+            self._job_finished(future.result())
+            return
+        if has_app_context():
+            # A future that failed before the callback was added calls back in the submitting request
+            self._fail_job(job_id, error)
+            return
+        with app.app_context():
+            try:
+                self._fail_job(job_id, error)
+            except Exception:
+                app.logger.exception(f'Could not mark job {job_id} failed')
+            finally:
+                db.session.remove()
+
+    def _fail_job(self, job_id, error):
+        """Mark a job that never reported back failed, unless it finished after all"""
+        from project.api.models import Job
+        from project.metrics import metrics
+
+        job = Job.query.filter_by(id=job_id).first()
+        if not job or job.status not in ['queued', 'running']:
+            return
+        job.status = 'failed'
+        job.error = error
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        metrics.jobs_finished.inc(job.kind, job.status)
+
+    def _job_finished(self, summary):
+        from project.metrics import metrics
+
+        if summary is None:
+            return
+        for stage, seconds in summary['stages']:
+            metrics.observe_stage(stage, seconds)
+        metrics.jobs_finished.inc(summary['kind'], summary['status'])
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            if self._executor is not None and self._executor_pid == os.getpid():
+                self._executor.shutdown(wait=wait)
+            self._executor = None
+            self._executor_pid = None
+
+    def _discard_executor(self, executor):
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+            self._executor_pid = None
+        executor.shutdown(wait=False)
+
+    def _get_executor(self, max_workers):
+        # The pool is created lazily and per process so that forked web workers
+        # never share the parent's pipes to pool processes.
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                config = {key: value for key, value in current_app.config.items() if key.isupper()}
+                self._executor = ProcessPoolExecutor(max_workers=max_workers,
+                                                     initializer=_init_worker,
+                                                     initargs=(config,))
+                self._executor_pid = os.getpid()
+            return self._executor
+
+
+def run_job(job_id):
+    """Run a queued job and record its state transitions.
+
+    Returns the job's kind, final status and the stages it timed, None when
+    the job does not exist.
+    """
+    from project.metrics import metrics
+
+    with metrics.capture_stages() as stages:
+        status = _run_job(job_id)
+    if status is None:
+        return None
+    return {'kind': status[0], 'status': status[1], 'stages': stages}
+
+
+def _run_job(job_id):
+    from project.api.models import Experiment, Job
+    from project.ml.environment import Locator
+    from project.profiling import run_profiled, write_profile
+
+    job = Job.query.filter_by(id=job_id).first()
+    if not job:
+        return None
+
+    job.status = 'running'
+    job.started_at = datetime.utcnow()
+    db.session.commit()
+
+    try:
+        experiment = Experiment.query.filter_by(id=job.experiment_id).first()
+        if not experiment:
+            raise Exception(f"Experiment id {job.experiment_id} Not Found!")
+
+        if job.profile_mode:
+            interval = current_app.config['PROFILING_SAMPLE_INTERVAL_MS'] / 1000
+            output, profiler = run_profiled(job.profile_mode, interval, _conduct, job, experiment)
+            job.profile_path = write_profile(job.profile_mode, profiler, Locator.get_profile_dir(experiment.id),
+                                             f'job-{job.id}-{job.kind}')
+        else:
+            output = _conduct(job, experiment)
+
+        job.result = output
+        job.status = 'done'
+    except Exception as e:
+        db.session.rollback()
+        job = Job.query.filter_by(id=job_id).first()
+        if not job:
+            return None
+        job.status = 'failed'
+        job.error = str(e)
+
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    return job.kind, job.status
+
+
+def _conduct(job, experiment):
+    from project.ml.conduct_experiment import ConductExperiment
+
+    if job.kind == 'train':
+        return ConductExperiment.train(experiment=experiment, job_id=job.id)
+    if job.kind == 'test':
+        return ConductExperiment.test(experiment=experiment, job_id=job.id)
+    if job.kind == 'tune':
+        return ConductExperiment.tune(experiment=experiment, search=job.params, job_id=job.id)
+    raise Exception(f"Unsupported job kind {job.kind}")
+
+
+_worker_app = None
+
+
+def _init_worker(config):
+    global _worker_app
+    from project import create_app
+
+    # A forked worker inherits the submitting thread's session, which is bound
+    # to the parent's connection pool; drop it without closing it.
+    db.session.registry.clear()
+    _worker_app = create_app()
+    _worker_app.config.update(config)
+    _worker_app.config['JOB_QUEUE_WORKERS'] = 0
+
+
+def _run_job_in_worker(job_id):
+    with _worker_app.app_context():
+        try:
+            return run_job(job_id)
+        finally:
+            db.session.remove()
+
+
+job_queue = JobQueue()
@@ -0,0 +1,224 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+
+# Seconds, from a sub-millisecond predict to a long training
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+                   30.0, 60.0, 300.0)
+
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    return '{' + ','.join(pairs) + '}'
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, label_names=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{format_labels(self.label_names, label_values)} {format_value(value)}')
+        return lines
+
+
+class Histogram:
+    """Fixed bucket histogram, an observation is one bisect and a few additions under a lock"""
+
+    def __init__(self, name, help, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            snapshot = [(label_values, list(counts), total, count)
+                        for label_values, (counts, total, count) in sorted(self._series.items())]
+        for label_values, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = format_labels(self.label_names + ('le',), label_values + (format_value(bound),))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = format_labels(self.label_names, label_values)
+            lines.append(f'{self.name}_sum{labels} {format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class Metrics:
+    """Process-local request and stage metrics rendered in Prometheus text format.
+
+    Every gunicorn worker keeps its own values, each scrape of ``/metrics``
+    reports the worker that served it together with its pid. Recording is a
+    perf_counter call and a locked dict update, cheap enough to leave on.
+    Stages timed in a job pool process are captured there with
+    ``capture_stages`` and observed by the web worker that submitted the job.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.requests = Counter('experiments_http_requests_total', 'HTTP requests served',
+                                ['method', 'route', 'status'])
+        self.request_latency = Histogram('experiments_http_request_duration_seconds',
+                                         'HTTP request latency', ['method', 'route'])
+        self.stage_latency = Histogram('experiments_stage_duration_seconds',
+                                       'Time spent in a processing stage', ['stage'])
+        self.jobs_finished = Counter('experiments_jobs_finished_total',
+                                     'Jobs submitted by this worker that finished', ['kind', 'status'])
+        self._collectors = []
+        self._captured = threading.local()
+
+    def init_app(self, app):
+        from flask import g, request
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+
+        self.enabled = app.config.get('METRICS_ENABLED', self.enabled)
+
+        @app.before_request
+        def start_timer():
+            g.metrics_started = time.perf_counter()
+
+        @app.after_request
+        def record_request(response):
+            started = g.get('metrics_started')
+            if self.enabled and started is not None:
+                route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+                self.request_latency.observe(time.perf_counter() - started, request.method, route)
+                self.requests.inc(request.method, route, str(response.status_code))
+            return response
+
+        if not getattr(Engine, '_experiments_metrics_listening', False):
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+            Engine._experiments_metrics_listening = True
+
+        if service_gauges not in self._collectors:
+            self.register_collector(service_gauges)
+        app.add_url_rule('/metrics', 'metrics', self.view)
+
+    def register_collector(self, collector):
+        """Add a callable returning exposition lines, called on every scrape"""
+        self._collectors.append(collector)
+
+    def observe_stage(self, stage, seconds):
+        if not self.enabled:
+            return
+        captured = getattr(self._captured, 'stages', None)
+        if captured is not None:
+            captured.append((stage, seconds))
+        else:
+            self.stage_latency.observe(seconds, stage)
+
+    @contextmanager
+    def capture_stages(self):
+        """Collect the stages observed by this thread into a list of (stage, seconds) instead of recording them"""
+        previous = getattr(self._captured, 'stages', None)
+        self._captured.stages = captured = []
+        try:
+            yield captured
+        finally:
+            self._captured.stages = previous
+
+    @contextmanager
+    def stage(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(stage, time.perf_counter() - started)
+
+    def render(self):
+        lines = []
+        for metric in [self.requests, self.request_latency, self.stage_latency, self.jobs_finished]:
+            lines.extend(metric.render())
+        lines.extend(gauge_lines('experiments_process_pid', 'Pid of the worker that served this scrape',
+                                 {(): os.getpid()}))
+        for collector in self._collectors:
+            lines.extend(collector())
+        return '\n'.join(lines) + '\n'
+
+    def view(self):
+        from flask import Response
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info['metrics_query_started'] = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop('metrics_query_started', None)
+        if started is not None:
+            self.observe_stage('db_query', time.perf_counter() - started)
+
+
+def gauge_lines(name, help, samples, label_names=()):
+    """Exposition lines for a gauge, samples maps label value tuples to values"""
+    lines = [f'# HELP {name} {help}', f'# TYPE {name} gauge']
+    for label_values, value in samples.items():
+        lines.append(f'{name}{format_labels(label_names, label_values)} {format_value(value)}')
+    return lines
+
+
+def service_gauges():
+    """Model cache, job queue and micro-batcher gauges"""
+    from project.jobs import job_queue
+    from project.ml.micro_batcher import micro_batcher
+    from project.ml.model_cache import model_cache
+
+    lines = []
+    for key, value in model_cache.stats().items():
+        lines.extend(gauge_lines(f'experiments_model_cache_{key}', f'Model cache {key.replace("_", " ")}',
+                                 {(): value}))
+    job_stats = job_queue.stats()
+    lines.extend(gauge_lines('experiments_job_queue_workers', 'Job queue worker processes',
+                             {(): job_stats.pop('max_workers')}))
+    lines.extend(gauge_lines('experiments_jobs', 'Jobs waiting or running', {(status,): count for status, count in
+                                                                          job_stats.items()}, ['status']))
+    batcher_stats = micro_batcher.stats()
+    for key in ['batches', 'requests', 'mean_batch_size', 'mean_batch_wait_ms']:
+        lines.extend(gauge_lines(f'experiments_micro_batcher_{key}', f'Predict micro-batcher {key.replace("_", " ")}',
+                                 {(): batcher_stats[key]}))
+    return lines
+
+
+metrics = Metrics()
@@ -1,61 +1,238 @@
+import functools
+import hashlib
 import json
 import os
+import time
+from datetime import datetime
+
+import numpy as np
+import sklearn
+
+from project import db
+from project.api.models import Result
 from project.ml.data_loader import DataLoader
 from project.ml.environment import Locator
-from project.ml.models import Logistic_Regression
-from project.ml.dataset_maker import LRPimaIndiansDatasetMaker
+from project.metrics import metrics
+from project.ml.micro_batcher import micro_batcher
+from project.ml.model_cache import model_cache
+from project.ml.model_store import ModelStore
+from project.ml.registry import ModelRegistry
+from project.ml.tuning import HyperparameterSearch
+
+@functools.lru_cache(maxsize=None)
+def code_version():
+    """CODE_VERSION from the environment, else a hash of the ml sources and library versions"""
+    if os.environ.get('CODE_VERSION'):
+        return os.environ['CODE_VERSION']
+    checksum = hashlib.sha256(f'numpy {np.__version__} sklearn {sklearn.__version__}'.encode())
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    for filename in sorted(os.listdir(package_dir)):
+        if filename.endswith('.py'):
+            with open(os.path.join(package_dir, filename), 'rb') as source_file:
+                checksum.update(filename.encode())
+                checksum.update(source_file.read())
+    return checksum.hexdigest()[:16]
+
 
 class ConductExperiment:
+    """Runs train, test and tune on an experiment.
+
+    Each run appends one Result row and returns its output as a list, the
+    caller commits the session.
+    """
+
+    @classmethod
+    def train(cls, experiment, job_id=None):
+        started = time.perf_counter()
+        fingerprint = cls.fingerprint(experiment, 'train')
+        exp_locator = Locator.for_experiment(experiment)
+        backend = ModelRegistry.resolve(experiment)
+        dataset_maker = backend.dataset_maker_class(exp_locator)
+        model = backend.model_class(hyperparams=experiment.hyperparams)
+
+        if experiment.training_mode == 'streaming':
+            with metrics.stage('fit'):
+                result = model.train_incremental(dataset_maker.iter_train_dataset)
+        else:
+            X, y  = dataset_maker.make_train_dataset()
+            with metrics.stage('fit'):
+                result = model.train(X, y)
+
+        model_file_path = ModelStore.save(model, exp_locator.get_model_dir(),
+                                          features=backend.dataset_maker_class.features)
+        model_cache.invalidate(experiment.id)
+        cls.record_model(experiment, model_file_path)
+        cls.record_result(experiment, 'train', result, job_id, time.perf_counter() - started, fingerprint)
+        return [result]
+
     @classmethod
-    def train(cls, experiment):
-        name = experiment.name
-        exp_locator = Locator(experiment.id, experiment.train_data, experiment.test_data)
-        if 'LR_' in name:
-            lr_dataset_maker = LRPimaIndiansDatasetMaker(exp_locator)
-            X, y  = lr_dataset_maker.make_train_dataset()
-            hyperparams = {'penalty': 'l2'}
-            logistic_regression = Logistic_Regression(hyperparams=hyperparams)
-            result = logistic_regression.train(X, y)
-            DataLoader.save(file_object=logistic_regression,
-                            file_path=os.path.join(exp_locator.get_model_dir(), 'model.pkl'))
-            experiment.result = json.dumps([result])
-            return experiment
+    def tune(cls, experiment, search, job_id=None):
+        """Run a cross-validated hyperparameter search and keep the best model"""
+        started = time.perf_counter()
+        exp_locator = Locator.for_experiment(experiment)
+        backend = ModelRegistry.resolve(experiment)
+        if experiment.training_mode == 'streaming':
+            raise Exception("Hyperparameter search needs the train dataset in memory, use batch training mode")
+        dataset_maker = backend.dataset_maker_class(exp_locator)
+        hyperparameter_search = HyperparameterSearch(backend.model_class, base_hyperparams=experiment.hyperparams,
+                                                     **search)
+
+        X, y = dataset_maker.make_train_dataset()
+        tune_result = hyperparameter_search.run(X, y, work_dir=exp_locator.get_train_result_dir())
+        if not tune_result['best']:
+            errors = set(trial['error'] for trial in tune_result['trials'] if trial['error'])
+            raise Exception(f"No hyperparameter search trial finished {', '.join(sorted(errors))}")
 
-        raise Exception("No valid Experiment Name to train Experiment")
+        hyperparams = tune_result['best']['hyperparams']
+        model = backend.model_class(hyperparams=hyperparams)
+        with metrics.stage('fit'):
+            result = model.train(X, y)
+
+        model_file_path = ModelStore.save(model, exp_locator.get_model_dir(),
+                                          features=backend.dataset_maker_class.features)
+        model_cache.invalidate(experiment.id)
+        cls.record_model(experiment, model_file_path)
+        experiment.hyperparams = hyperparams
+        cls.record_result(experiment, 'tune', {**result, 'tune': tune_result}, job_id,
+                          time.perf_counter() - started)
+        return [result, {'tune': tune_result}]
 
     @classmethod
-    def test(cls, experiment):
-        name = experiment.name
-        exp_locator = Locator(experiment.id, experiment.train_data, experiment.test_data)
+    def test(cls, experiment, job_id=None):
+        started = time.perf_counter()
+        fingerprint = cls.fingerprint(experiment, 'test')
+        exp_locator = Locator.for_experiment(experiment)
+        backend = ModelRegistry.resolve(experiment)
+        dataset_maker = backend.dataset_maker_class(exp_locator)
+        model = ModelStore.load(experiment.model_path)
 
-        if 'LR_' in name:
-            lr_dataset_maker = LRPimaIndiansDatasetMaker(exp_locator)
-            X, y = lr_dataset_maker.make_test_dataset()
-            logistic_regression = DataLoader.load(exp_locator.get_model_file_path())
-            test_result = logistic_regression.test(X, y)
-            exp_result = json.loads(experiment.result)
-            exp_result.append(test_result)
-            experiment.result = json.dumps(exp_result)
-            return experiment
+        if experiment.training_mode == 'streaming':
+            test_result = model.test_incremental(dataset_maker.iter_test_dataset)
+        else:
+            X, y = dataset_maker.make_test_dataset()
+            test_result = model.test(X, y)
 
-        raise Exception("No valid Experiment Name to train Experiment")
+        cls.record_result(experiment, 'test', test_result, job_id, time.perf_counter() - started, fingerprint)
+        return [test_result]
 
     @classmethod
     def predict(cls, experiment, sample):
-        name = experiment.name
-        exp_locator = Locator(experiment.id, experiment.train_data, experiment.test_data)
-        if 'LR_' in name:
-            lr_dataset_maker = LRPimaIndiansDatasetMaker(exp_locator)
-            X = lr_dataset_maker.make_one_sample(sample)
-            logistic_regression = DataLoader.load(exp_locator.get_model_file_path())
-            prediction = logistic_regression.predict(X)
-            prediction = prediction.tolist()
-            return prediction
+        exp_locator = Locator.for_experiment(experiment)
+        backend = ModelRegistry.resolve(experiment)
+        dataset_maker = backend.dataset_maker_class(exp_locator)
+        X = dataset_maker.make_one_sample(sample)
+        model = cls.get_model(experiment)
+        # Keyed on the model version too, so a retrained model never shares a batch with the old one
+        with metrics.stage('predict'):
+            prediction = micro_batcher.submit((experiment.id, experiment.model_sha256), X, model.predict)
+        # Arrays are serialized by the app's JSON encoder, no list copy here
+        return prediction
 
     @classmethod
-    def is_experiment_trained(cls, experiment):
-        exp_locator = Locator(experiment.id, experiment.train_data, experiment.test_data)
-        if os.path.exists(exp_locator.get_model_file_path()):
-            return True
+    def predict_batch(cls, experiment, samples):
+        exp_locator = Locator.for_experiment(experiment)
+        backend = ModelRegistry.resolve(experiment)
+        dataset_maker = backend.dataset_maker_class(exp_locator)
+        X = dataset_maker.make_samples(samples)
+        model = cls.get_model(experiment)
+        with metrics.stage('predict'):
+            predictions, probabilities = model.predict_with_proba(X)
+        return predictions, probabilities
+
+    @classmethod
+    def score_file(cls, experiment, data_file, chunk_size):
+        """Predict a csv chunk by chunk, yielding the first row, predictions and probabilities of each chunk.
+
+        data_file is a path or an open binary file. Only one chunk is in
+        memory at a time, whatever the size of the file.
+        """
+        exp_locator = Locator.for_experiment(experiment)
+        backend = ModelRegistry.resolve(experiment)
+        dataset_maker = backend.dataset_maker_class(exp_locator)
+        model = cls.get_model(experiment)
+        row = 0
+        for chunk in DataLoader.iter_csv(data_file, chunk_size):
+            if not len(chunk):
+                continue
+            X = dataset_maker.make_frame_samples(chunk)
+            with metrics.stage('predict'):
+                predictions, probabilities = model.predict_with_proba(X)
+            yield row, predictions, probabilities
+            row += len(X)
+
+    @classmethod
+    def get_classes(cls, experiment):
+        """Labels of the probability columns, None when the model does not expose them"""
+        classifier = getattr(cls.get_model(experiment), 'clf', None)
+        classes = getattr(classifier, 'classes_', None)
+        return None if classes is None else list(classes)
+
+    @classmethod
+    def get_model(cls, experiment):
+        return model_cache.get(experiment.id, experiment.model_path, version=experiment.model_sha256,
+                               size=experiment.model_size)
+
+    @classmethod
+    def record_model(cls, experiment, model_file_path):
+        """Record the saved model on the experiment, the database is the source of truth for it"""
+        experiment.trained = True
+        experiment.trained_at = datetime.utcnow()
+        experiment.model_path = model_file_path
+        experiment.model_size = ModelStore.artifact_size(model_file_path)
+        experiment.model_sha256 = ModelStore.checksum(model_file_path)
+        return experiment
+
+    @classmethod
+    def record_result(cls, experiment, run_type, output, job_id=None, duration_seconds=None, fingerprint=None):
+        """Append the result of a run, earlier results are never read or rewritten"""
+        result = Result.from_run(experiment, run_type, output, job_id=job_id, duration_seconds=duration_seconds,
+                                 fingerprint=fingerprint)
+        db.session.add(result)
+        return result
+
+    @classmethod
+    def fingerprint(cls, experiment, run_type):
+        """Hash of everything a train or test run depends on, None when a dataset hash is unknown"""
+        if run_type == 'train':
+            model_class = ModelRegistry.resolve(experiment).model_class
+            inputs = {
+                'data_sha256': experiment.train_data_sha256,
+                'model_class': model_class.__name__,
+                'hyperparams': model_class.make_hyperparams(experiment.hyperparams)
+            }
+        elif run_type == 'test':
+            inputs = {'data_sha256': experiment.test_data_sha256, 'model_sha256': experiment.model_sha256}
         else:
-            return False
+            return None
+        if inputs['data_sha256'] is None:
+            return None
+        inputs.update(run_type=run_type, training_mode=experiment.training_mode, code_version=code_version())
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+    @classmethod
+    def find_memoized(cls, experiment, run_type):
+        """The stored result of an earlier run with the same fingerprint, or None"""
+        return cls.find_memoized_many([experiment], run_type).get(experiment.id)
+
+    @classmethod
+    def find_memoized_many(cls, experiments, run_type):
+        """The memoized results of many experiments in one query, keyed by experiment id"""
+        # A train result only stands while the model it saved is still the current one
+        wanted = {}
+        for experiment in experiments:
+            fingerprint = cls.fingerprint(experiment, run_type)
+            if fingerprint is not None and cls.is_experiment_trained(experiment):
+                wanted[experiment.id] = (fingerprint, experiment.model_sha256)
+        if not wanted:
+            return {}
+        fingerprints = set(fingerprint for fingerprint, _ in wanted.values())
+        memoized = {}
+        for result in Result.query.filter(Result.run_type == run_type, Result.experiment_id.in_(list(wanted)),
+                                          Result.fingerprint.in_(fingerprints)).order_by(Result.id).all():
+            if (result.fingerprint, result.model_sha256) == wanted[result.experiment_id]:
+                memoized[result.experiment_id] = result
+        return memoized
+
+    @classmethod
+    def is_experiment_trained(cls, experiment):
+        return bool(experiment.trained and experiment.model_path)
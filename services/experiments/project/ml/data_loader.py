@@ -1,13 +1,19 @@
 import os
+import json
+import numpy as np
 import pandas as pd
 import pickle
+import tempfile
+
+from project.metrics import metrics
 
 class DataLoader:
     @classmethod
     def load(cls, file_path):
         filename, file_extension = os.path.splitext(file_path)
         if 'csv' in file_extension:
-            data = pd.read_csv(file_path, encoding = 'utf8')
+            with metrics.stage('csv_parse'):
+                data = cls.load_csv(file_path)
         elif 'pkl' in file_extension:
             with open(file_path, 'rb') as pickle_file:
                 data = pickle.load(pickle_file)
@@ -24,4 +30,121 @@ class DataLoader:
         else:
             raise Exception("Unsupported file extension. Data Cannot be loaded.")
 
+    @classmethod
+    def load_csv(cls, file_path):
+        """Load a csv, memory-mapping its .npy sidecar when it is still fresh.
+
+        The first load parses the text and, for all-numeric tables, writes the
+        rows to ``<file>.npy`` as a record array, one field per column in the
+        column's own dtype, plus a ``<file>.meta.json`` holding the column names
+        and the source file signature. Later loads map the records instead of
+        parsing text, every column is a view of the mapping so nothing is copied
+        and the pages are shared by every process loading the file; any change
+        to the csv invalidates the sidecar.
+        """
+        array_file_path, meta_file_path = cls.get_sidecar_paths(file_path)
+        signature = cls._file_signature(file_path)
+
+        records = cls._map_sidecar(file_path, signature)
+        if records is not None:
+            return cls._records_frame(*records)
+
+        data = pd.read_csv(file_path, encoding = 'utf8')
+        cls._write_sidecar(data, signature, array_file_path, meta_file_path)
+        return data
+
+    @classmethod
+    def iter_csv(cls, file_path, chunk_size):
+        """Yield a csv as DataFrames of at most chunk_size rows.
+
+        Slices of a fresh sidecar are served when one exists; otherwise the text
+        is parsed chunk by chunk, so memory stays bounded by chunk_size. An open
+        binary file is parsed the same way, it has no sidecar.
+        """
+        if not isinstance(file_path, str):
+            yield from pd.read_csv(file_path, encoding = 'utf8', chunksize=chunk_size)
+            return
+
+        records = cls._map_sidecar(file_path, cls._file_signature(file_path))
+        if records is not None:
+            values, columns = records
+            for start in range(0, len(values), chunk_size):
+                yield cls._records_frame(values[start:start + chunk_size], columns)
+            return
+
+        for chunk in pd.read_csv(file_path, encoding = 'utf8', chunksize=chunk_size):
+            yield chunk
+
+    @classmethod
+    def get_sidecar_paths(cls, file_path):
+        # Next to the stored dataset, so experiments sharing a dataset share its sidecar
+        file_path = os.path.realpath(file_path)
+        return f'{file_path}.npy', f'{file_path}.meta.json'
 
+    @classmethod
+    def _file_signature(cls, file_path):
+        stat = os.stat(file_path)
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'inode': stat.st_ino}
+
+    @classmethod
+    def _read_sidecar_meta(cls, meta_file_path):
+        try:
+            with open(meta_file_path) as meta_file:
+                return json.load(meta_file)
+        except (OSError, ValueError):
+            return None
+
+    @classmethod
+    def _map_sidecar(cls, file_path, signature):
+        """The mapped records and column names of a fresh sidecar, None when there is none to map"""
+        array_file_path, meta_file_path = cls.get_sidecar_paths(file_path)
+        meta = cls._read_sidecar_meta(meta_file_path)
+        # Sidecars without a layout hold a single dtype 2-d array, they are rewritten as records
+        if meta is None or meta['source'] != signature or meta.get('layout') != 'records':
+            return None
+        try:
+            values = np.load(array_file_path, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        return values, meta['columns']
+
+    @classmethod
+    def _records_frame(cls, values, columns):
+        # Fields are named by position, csv column names need not be unique
+        data = pd.DataFrame({name: values[name].view(np.ndarray) for name in values.dtype.names}, copy=False)
+        data.columns = columns
+        return data
+
+    @classmethod
+    def _write_sidecar(cls, data, signature, array_file_path, meta_file_path):
+        if data.empty or not all(isinstance(dtype, np.dtype) and pd.api.types.is_numeric_dtype(dtype)
+                                 for dtype in data.dtypes):
+            return
+        meta = {
+            'source': signature,
+            'layout': 'records',
+            'columns': [str(column) for column in data.columns],
+            'dtypes': [str(dtype) for dtype in data.dtypes]
+        }
+        values = np.empty(len(data), dtype=[(f'f{index}', dtype) for index, dtype in enumerate(data.dtypes)])
+        for index in range(data.shape[1]):
+            values[f'f{index}'] = data.iloc[:, index].to_numpy()
+        try:
+            # Experiments sharing a dataset share its sidecar, concurrent first loads each write their own part
+            cls._replace_atomically(array_file_path, lambda part_file: np.save(part_file, values))
+            cls._replace_atomically(meta_file_path, lambda part_file: part_file.write(json.dumps(meta).encode()))
+        except OSError:
+            # The sidecar is only an accelerator, a read-only data dir is fine.
+            pass
+
+    @classmethod
+    def _replace_atomically(cls, file_path, write):
+        file_descriptor, part_file_path = tempfile.mkstemp(dir=os.path.dirname(file_path),
+                                                           prefix=os.path.basename(file_path) + '.', suffix='.part')
+        try:
+            with os.fdopen(file_descriptor, 'wb') as part_file:
+                write(part_file)
+            os.replace(part_file_path, file_path)
+        except BaseException:
+            os.remove(part_file_path)
+            raise
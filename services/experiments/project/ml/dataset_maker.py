@@ -3,6 +3,11 @@ from project.ml.environment import Locator
 from project.ml.data_loader import DataLoader
 import numpy as np
 
+
+class InvalidSamples(ValueError):
+    pass
+
+
 class DatasetMaker(ABC):
 
     @abstractmethod
@@ -17,15 +22,34 @@ class DatasetMaker(ABC):
     def make_test_dataset(self):
         pass
 
+    @abstractmethod
+    def iter_train_dataset(self, chunk_size):
+        pass
+
+    @abstractmethod
+    def iter_test_dataset(self, chunk_size):
+        pass
+
     @abstractmethod
     def make_one_sample(self, sample):
         pass
 
+    @abstractmethod
+    def make_samples(self, samples):
+        pass
+
+    @abstractmethod
+    def make_frame_samples(self, frame):
+        pass
+
     @abstractmethod
     def _make_dataset(self, input):
         pass
 
-class LRPimaIndiansDatasetMaker(DatasetMaker):
+class PimaIndiansDatasetMaker(DatasetMaker):
+
+    features = ['pregnancies', 'glucose', 'blood_pressure', 'skin_thickness', 'insulin', 'bmi',
+                'diabetes_pedigree_function', 'age']
 
     def __init__(self, locator: Locator):
         self.locator = locator
@@ -40,18 +64,81 @@ class LRPimaIndiansDatasetMaker(DatasetMaker):
         X, y = self._make_dataset(test_data_file_path)
         return X, y
 
+    def iter_train_dataset(self, chunk_size=100000):
+        train_data_file_path = self.locator.get_train_data_file_path()
+        return self._iter_dataset(train_data_file_path, chunk_size)
+
+    def iter_test_dataset(self, chunk_size=100000):
+        test_data_file_path = self.locator.get_test_data_file_path()
+        return self._iter_dataset(test_data_file_path, chunk_size)
+
     def make_one_sample(self, sample):
-        features = ['pregnancies', 'glucose', 'blood_pressure', 'skin_thickness', 'insulin', 'bmi',
-                    'diabetes_pedigree_function', 'age']
-        values = [sample[key] for key in features]
+        values = [sample[key] for key in self.features]
         x = np.array(values).reshape(1, -1)
         return x
 
+    def make_samples(self, samples):
+        """Build one (N, n_features) array from a list of samples or a column oriented dict.
+
+        Raises InvalidSamples naming the features that are missing or not numbers.
+        """
+        if isinstance(samples, dict):
+            missing = [key for key in self.features if key not in samples]
+        else:
+            missing = [key for key in self.features if any(key not in sample for sample in samples)]
+        if missing:
+            raise InvalidSamples(f"Missing features: {', '.join(missing)}")
+        try:
+            if isinstance(samples, dict):
+                columns = [np.asarray(samples[key], dtype=float) for key in self.features]
+                if any(column.ndim != 1 for column in columns):
+                    raise ValueError('Sample columns must be flat')
+                if len({len(column) for column in columns}) > 1:
+                    raise InvalidSamples("All sample columns must have the same length")
+                X = np.column_stack(columns)
+            else:
+                X = np.array([[sample[key] for key in self.features] for sample in samples], dtype=float)
+                if X.ndim != 2:
+                    raise ValueError('Sample values must be scalars')
+        except InvalidSamples:
+            raise
+        except (TypeError, ValueError):
+            # Only a failed batch pays for finding the culprits
+            invalid = [key for key in self.features if not self._is_numeric(samples, key)]
+            raise InvalidSamples(f"Features must be numbers: {', '.join(invalid)}")
+        if not len(X):
+            raise InvalidSamples("No samples to predict")
+        return X
+
+    def _is_numeric(self, samples, key):
+        values = samples[key] if isinstance(samples, dict) else [sample[key] for sample in samples]
+        try:
+            return np.asarray(values, dtype=float).ndim == 1
+        except (TypeError, ValueError):
+            return False
+
+    def make_frame_samples(self, frame):
+        """Features of a csv chunk, by name when the header has them, else the leading columns"""
+        if all(feature in frame.columns for feature in self.features):
+            X = frame[self.features]
+        elif frame.shape[1] >= len(self.features):
+            X = frame.iloc[:, :len(self.features)]
+        else:
+            raise ValueError(f'Expected {len(self.features)} feature columns, found {frame.shape[1]}')
+        return X.to_numpy(dtype=float)
+
     def _make_dataset(self, input):
         dataset = DataLoader.load(input)
         X = dataset.iloc[:, :-1]
         y = dataset.iloc[:, -1]
         return X, y
 
+    def _iter_dataset(self, input, chunk_size):
+        for chunk in DataLoader.iter_csv(input, chunk_size):
+            X = chunk.iloc[:, :-1]
+            y = chunk.iloc[:, -1]
+            yield X, y
 
 
+# Kept for callers written before the model registry, when only LR existed
+LRPimaIndiansDatasetMaker = PimaIndiansDatasetMaker
@@ -0,0 +1,154 @@
+import csv
+import io
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+
+class DatasetProfiler:
+    """Statistics of a csv data file computed from the chunks of its upload.
+
+    Feed every chunk to ``update`` as it is written and call ``finish`` at the
+    end, the file is never read back. Complete lines are parsed a block at a
+    time by the pandas C parser, so profiling costs about one read_csv of the
+    file while memory stays bounded by the chunk size. As for DataLoader the
+    first line is the header and the last column the label.
+    """
+
+    # Beyond this many distinct labels the class balance is not kept
+    max_classes = 100
+
+    def __init__(self):
+        self.columns = None
+        self.rows = 0
+        self.error = None
+        self._pending = b''
+        self._counts = None
+        self._nulls = None
+        self._non_numeric = None
+        self._minimum = None
+        self._maximum = None
+        self._sum = None
+        self._classes = Counter()
+        self._too_many_classes = False
+
+    @classmethod
+    def profile_file(cls, file_path, chunk_size):
+        profiler = cls()
+        with open(file_path, 'rb') as data_file:
+            for chunk in iter(lambda: data_file.read(chunk_size), b''):
+                profiler.update(chunk)
+        return profiler.finish()
+
+    def update(self, chunk):
+        if self.error is not None:
+            return
+        block = self._pending + chunk
+        end = block.rfind(b'\n')
+        if end < 0:
+            self._pending = block
+            return
+        self._pending = block[end + 1:]
+        self._parse(block[:end + 1])
+
+    def finish(self):
+        if self.error is None and self._pending.strip():
+            self._parse(self._pending)
+        self._pending = b''
+        return self.to_json()
+
+    def _parse(self, block):
+        try:
+            if self.columns is None:
+                header_end = block.find(b'\n')
+                header_end = len(block) if header_end < 0 else header_end
+                self._start(next(csv.reader([block[:header_end].decode('utf8').rstrip('\r')])))
+                block = block[header_end + 1:]
+            if not block.strip():
+                return
+            frame = pd.read_csv(io.BytesIO(block), header=None, names=list(range(len(self.columns))),
+                                encoding='utf8', skip_blank_lines=True)
+        except (ValueError, UnicodeDecodeError, StopIteration, pd.errors.ParserError) as e:
+            self.error = str(e).strip() or type(e).__name__
+            return
+
+        self.rows += len(frame)
+        for index in range(len(self.columns)):
+            column = frame[index]
+            nulls = int(column.isna().sum())
+            values = column if pd.api.types.is_numeric_dtype(column) else pd.to_numeric(column, errors='coerce')
+            numeric = values.dropna()
+            self._nulls[index] += nulls
+            self._counts[index] += len(column) - nulls
+            self._non_numeric[index] += len(column) - nulls - len(numeric)
+            if len(numeric):
+                self._minimum[index] = min(self._minimum[index], float(numeric.min()))
+                self._maximum[index] = max(self._maximum[index], float(numeric.max()))
+                self._sum[index] += float(numeric.sum())
+
+        if not self._too_many_classes:
+            labels = frame[len(self.columns) - 1].dropna()
+            self._classes.update({self._label_key(label): int(count)
+                                  for label, count in labels.value_counts().items()})
+            if len(self._classes) > self.max_classes:
+                self._too_many_classes = True
+                self._classes.clear()
+
+    def _start(self, columns):
+        self.columns = columns
+        self._counts = [0] * len(columns)
+        self._nulls = [0] * len(columns)
+        self._non_numeric = [0] * len(columns)
+        self._minimum = [np.inf] * len(columns)
+        self._maximum = [-np.inf] * len(columns)
+        self._sum = [0.0] * len(columns)
+
+    @staticmethod
+    def _label_key(label):
+        if isinstance(label, (float, np.floating)) and float(label).is_integer():
+            label = int(label)
+        return str(label)
+
+    def to_json(self):
+        columns = []
+        for index, name in enumerate(self.columns or []):
+            numeric_count = self._counts[index] - self._non_numeric[index]
+            columns.append({
+                'name': name,
+                'count': self._counts[index],
+                'nulls': self._nulls[index],
+                'non_numeric': self._non_numeric[index],
+                'min': self._minimum[index] if numeric_count else None,
+                'max': self._maximum[index] if numeric_count else None,
+                'mean': self._sum[index] / numeric_count if numeric_count else None
+            })
+        label = None
+        if self.columns:
+            label = {
+                'name': self.columns[-1],
+                'classes': None if self._too_many_classes else dict(self._classes.most_common())
+            }
+        return {'rows': self.rows, 'columns': columns, 'label': label, 'error': self.error}
+
+
+def check_schema(profile, features):
+    """Check a profile against the features a dataset maker expects, followed by the label"""
+    errors = []
+    if profile['error']:
+        errors.append(f"Data file could not be parsed: {profile['error']}")
+    columns = profile['columns']
+    if len(columns) != len(features) + 1:
+        errors.append(f'Expected {len(features)} feature columns and a label, found {len(columns)} columns')
+    for feature, column in zip(features, columns):
+        if column['non_numeric']:
+            errors.append(f"Column {column['name']} ({feature}) has {column['non_numeric']} non numeric values")
+    if not profile['rows']:
+        errors.append('Data file has no rows')
+    return {
+        'valid': not errors,
+        'features': list(features),
+        'expected_columns': len(features) + 1,
+        'columns': len(columns),
+        'errors': errors
+    }
@@ -1,3 +1,4 @@
+import functools
 import os
 from typing import Text
 import pathlib
@@ -5,21 +6,35 @@ import shutil
 
 class Locator:
 
+    # Directory holding one folder per experiment
+    root = os.environ.get('EXPERIMENTS_ROOT', '/experiments')
+
     def __init__ (self, id: int, train_data_filename: Text, test_data_filename: Text):
 
         self.train_data_filename = train_data_filename
         self.test_data_filename = test_data_filename
-        self.model_filename = 'model.pkl'
+        self.model_filename = 'model.json'
+        self.legacy_model_filename = 'model.pkl'
+
+        self.train_data_dir = f'{self.root}/{id}/data/train'
+        self.test_data_dir = f'{self.root}/{id}/data/test'
+        self.model_dir = f'{self.root}/{id}/model'
+        self.train_result_dir = f'{self.root}/{id}/result/train'
+        self.test_result_dir = f'{self.root}/{id}/result/test'
 
-        self.train_data_dir = f'/experiments/{id}/data/train'
-        self.test_data_dir = f'/experiments/{id}/data/test'
-        self.model_dir = f'/experiments/{id}/model'
-        self.train_result_dir = f'/experiments/{id}/result/train'
-        self.test_result_dir = f'/experiments/{id}/result/test'
+    @classmethod
+    def for_experiment(cls, experiment):
+        """Locator of an experiment, built once per experiment id and data file names"""
+        return cls._cached(cls.root, experiment.id, experiment.train_data, experiment.test_data)
 
-        self.create_experiment_folders()
+    @classmethod
+    @functools.lru_cache(maxsize=1024)
+    def _cached(cls, root, id, train_data_filename, test_data_filename):
+        # root is part of the key so a changed Locator.root never returns stale paths
+        return cls(id, train_data_filename, test_data_filename)
 
     def create_experiment_folders(self):
+        """Create the experiment folders, done once when the experiment is created"""
         for dir in [self.train_data_dir,
                     self.test_data_dir,
                     self.model_dir,
@@ -27,9 +42,38 @@ class Locator:
                     self.test_result_dir]:
             pathlib.Path(dir).mkdir(parents=True, exist_ok=True)
 
+    @classmethod
+    def get_profile_dir(cls, id):
+        return f'{cls.root}/{id}/result/profiles'
+
+    @classmethod
+    def get_dataset_dir(cls):
+        """Content-addressed data files shared by every experiment"""
+        return f'{cls.root}/datasets'
+
+    @classmethod
+    def get_trash_dir(cls):
+        """Folders of deleted experiments waiting for the reaper"""
+        return f'{cls.root}/trash'
+
+    @classmethod
+    def get_upload_dir(cls):
+        """Chunked uploads being received, on the same volume as the datasets they are moved to"""
+        return f'{cls.root}/uploads'
+
+    @classmethod
+    def trash_experiment_folders(cls, id, trash_name):
+        """Move the folder of an experiment to the trash in one rename, False when it has none"""
+        pathlib.Path(cls.get_trash_dir()).mkdir(parents=True, exist_ok=True)
+        try:
+            os.rename(f'{cls.root}/{id}', os.path.join(cls.get_trash_dir(), str(trash_name)))
+        except FileNotFoundError:
+            return False
+        return True
+
     @classmethod
     def delete_experiment_folders(cls, id):
-        shutil.rmtree(f'/experiments/{id}')
+        shutil.rmtree(f'{cls.root}/{id}')
 
     def get_train_data_file_path(self):
         return os.path.join(self.get_train_data_dir(), self.train_data_filename)
@@ -40,6 +84,10 @@ class Locator:
     def get_model_file_path(self):
         return os.path.join(self.get_model_dir(), self.model_filename)
 
+    def get_legacy_model_file_path(self):
+        """Path of a model.pkl saved before manifests existed"""
+        return os.path.join(self.get_model_dir(), self.legacy_model_filename)
+
     def get_train_data_dir(self):
         return self.train_data_dir
 
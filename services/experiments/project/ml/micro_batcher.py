@@ -0,0 +1,162 @@
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+
+
+class _Batch:
+    def __init__(self):
+        self.rows = []
+        self.results = None
+        self.error = None
+        self.opened = time.perf_counter()
+        self.full = threading.Event()
+        self.done = threading.Event()
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-sample predictions into one vectorized call.
+
+    The first request for a key opens a batch and becomes its leader; requests
+    arriving while it is open append their row and wait. The leader closes the
+    batch after ``max_wait`` seconds or once it holds ``max_batch_size`` rows,
+    predicts all rows at once and fans the results back out. When ``adaptive``
+    a leader with no concurrent requests for its key, and whose previous batch
+    held a single row, predicts straight away so idle traffic pays no extra
+    latency. Only requests served concurrently by one process
+    (threaded server or gthread workers) can share a batch. The previous
+    batch size is remembered for the ``max_keys`` keys batched last.
+    """
+
+    size_buckets = [(1, 1), (2, 4), (5, 16), (17, 64), (65, None)]
+    max_keys = 1024
+
+    def __init__(self, enabled=False, max_wait=0.002, max_batch_size=64, adaptive=True):
+        self.enabled = enabled
+        self.max_wait = max_wait
+        self.max_batch_size = max_batch_size
+        self.adaptive = adaptive
+        self._lock = threading.Lock()
+        self._open = {}
+        self._in_flight = defaultdict(int)
+        self._last_size = {}
+        self._reset_stats()
+
+    def init_app(self, app):
+        self.enabled = app.config.get('PREDICT_MICRO_BATCHING', self.enabled)
+        self.max_wait = app.config.get('PREDICT_MICRO_BATCH_MAX_WAIT_MS', self.max_wait * 1000) / 1000
+        self.max_batch_size = app.config.get('PREDICT_MICRO_BATCH_MAX_SIZE', self.max_batch_size)
+        self.adaptive = app.config.get('PREDICT_MICRO_BATCH_ADAPTIVE', self.adaptive)
+        self.clear()
+
+    def submit(self, key, row, predict):
+        """Predict one row, batched with concurrent rows submitted for the same key.
+
+        predict takes an (N, n_features) array and returns N results, the
+        result for row is returned as a length 1 slice.
+        """
+        row = np.asarray(row, dtype=np.float64).reshape(-1)
+        if not self.enabled or self.max_batch_size <= 1:
+            return predict(row.reshape(1, -1))
+
+        wait = False
+        with self._lock:
+            self._in_flight[key] += 1
+            batch = self._open.get(key)
+            leader = batch is None
+            if leader:
+                batch = _Batch()
+                self._open[key] = batch
+                wait = not self.adaptive or self._in_flight[key] > 1 or self._last_size.get(key, 1) > 1
+            index = len(batch.rows)
+            batch.rows.append(row)
+            if len(batch.rows) >= self.max_batch_size:
+                del self._open[key]
+                batch.full.set()
+
+        try:
+            if leader:
+                self._lead(key, batch, predict, wait)
+            else:
+                batch.done.wait()
+        finally:
+            with self._lock:
+                self._in_flight[key] -= 1
+                if not self._in_flight[key]:
+                    del self._in_flight[key]
+
+        if batch.error is not None:
+            raise batch.error
+        return batch.results[index:index + 1]
+
+    def _lead(self, key, batch, predict, wait):
+        if wait:
+            batch.full.wait(self.max_wait)
+        with self._lock:
+            if self._open.get(key) is batch:
+                del self._open[key]
+            # Reinserted so the dict is ordered by last batch, the key batched longest ago goes first
+            self._last_size.pop(key, None)
+            self._last_size[key] = len(batch.rows)
+            if len(self._last_size) > self.max_keys:
+                del self._last_size[next(iter(self._last_size))]
+        waited = time.perf_counter() - batch.opened
+
+        try:
+            batch.results = predict(np.vstack(batch.rows))
+        except Exception as e:
+            batch.error = e
+        finally:
+            self._record(len(batch.rows), waited)
+            batch.done.set()
+
+    def _record(self, size, waited):
+        with self._lock:
+            self.batches += 1
+            self.requests += size
+            self.max_size = max(self.max_size, size)
+            self.total_wait += waited
+            self.max_wait_seen = max(self.max_wait_seen, waited)
+            for low, high in self.size_buckets:
+                if size >= low and (high is None or size <= high):
+                    self.size_histogram[self._bucket_name(low, high)] += 1
+                    break
+
+    def clear(self):
+        with self._lock:
+            self._last_size.clear()
+            self._reset_stats()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'max_wait_ms': self.max_wait * 1000,
+                'max_batch_size': self.max_batch_size,
+                'adaptive': self.adaptive,
+                'batches': self.batches,
+                'requests': self.requests,
+                'mean_batch_size': self.requests / self.batches if self.batches else 0.0,
+                'largest_batch_size': self.max_size,
+                'mean_batch_wait_ms': self.total_wait / self.batches * 1000 if self.batches else 0.0,
+                'longest_batch_wait_ms': self.max_wait_seen * 1000,
+                'batch_sizes': dict(self.size_histogram)
+            }
+
+    def _reset_stats(self):
+        self.batches = 0
+        self.requests = 0
+        self.max_size = 0
+        self.total_wait = 0.0
+        self.max_wait_seen = 0.0
+        self.size_histogram = {self._bucket_name(low, high): 0 for low, high in self.size_buckets}
+
+    @classmethod
+    def _bucket_name(cls, low, high):
+        if high is None:
+            return f'{low}+'
+        return str(low) if low == high else f'{low}-{high}'
+
+
+micro_batcher = MicroBatcher()
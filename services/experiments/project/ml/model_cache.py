@@ -0,0 +1,97 @@
+import os
+import threading
+from collections import OrderedDict
+
+from project.ml.model_store import ModelStore
+
+
+class ModelCache:
+    """In-process LRU cache of loaded models.
+
+    Entries are keyed by experiment id and remember the version of the model
+    they were loaded from, so a retrained model is picked up even when the
+    invalidation happened in another process. The version is the model sha256
+    recorded on the experiment, a hit then needs no syscall; without one the
+    mtime of the model file is used. The cache is bounded both by the
+    number of entries and by the total size of the model files it holds.
+    """
+
+    def __init__(self, max_entries=32, max_bytes=256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def init_app(self, app):
+        self.max_entries = app.config.get('MODEL_CACHE_MAX_ENTRIES', self.max_entries)
+        self.max_bytes = app.config.get('MODEL_CACHE_MAX_BYTES', self.max_bytes)
+        self.clear()
+
+    def get(self, experiment_id, model_file_path, version=None, size=None):
+        """Return the model for an experiment, loading it from disk on a miss"""
+        experiment_id = int(experiment_id)
+        if version is None:
+            version = os.stat(model_file_path).st_mtime_ns
+
+        with self._lock:
+            entry = self._entries.get(experiment_id)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(experiment_id)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        model = ModelStore.load(model_file_path)
+        if size is None:
+            size = ModelStore.artifact_size(model_file_path)
+        self.put(experiment_id, version, size, model)
+        return model
+
+    def put(self, experiment_id, version, size, model):
+        experiment_id = int(experiment_id)
+        with self._lock:
+            self._discard(experiment_id)
+            if self.max_entries <= 0 or size > self.max_bytes:
+                return
+            self._entries[experiment_id] = (version, size, model)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, experiment_id):
+        with self._lock:
+            self._discard(int(experiment_id))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+    def _discard(self, experiment_id):
+        entry = self._entries.pop(experiment_id, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+
+model_cache = ModelCache()
@@ -0,0 +1,245 @@
+import fcntl
+import json
+import os
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+import sklearn
+
+from project.metrics import metrics
+from project.ml.data_loader import DataLoader
+from project.ml.registry import ModelRegistry
+from project.uploads import file_checksum
+
+
+class ModelIntegrityError(Exception):
+    pass
+
+
+class ModelStore:
+    """Saves trained models as raw ``.npy`` weights plus a JSON manifest.
+
+    The manifest records the model class, hyperparameters, feature order and
+    the sha256 of every weight file. Loading maps the weights read-only, so it
+    costs O(size of weights), runs no pickled code and shares pages between
+    every process serving the same model. Weight files are named after their
+    checksum and the manifest is replaced last, so a reader never mixes the
+    weights of two trainings. Models without ``array_attributes`` fall back to
+    a checksummed pickle referenced by the same manifest. Neither that pickle
+    nor a legacy ``model.pkl`` is loaded unless ``MODEL_STORE_ALLOW_PICKLE``
+    is set; ``manage.py convert_models`` converts the legacy ones.
+
+    The manifest records the scikit-learn version that saved the model.
+    Pickles and models whose weights are scikit-learn internals
+    (``version_sensitive``) are refused by any other version, they have to
+    be retrained.
+
+    Concurrent saves to one model dir write uniquely named part files, then
+    take a file lock to publish them, replace the manifest and remove the
+    weights only the manifest they replaced referenced.
+    """
+
+    format_version = 1
+    manifest_filename = 'model.json'
+    legacy_filename = 'model.pkl'
+    lock_filename = 'model.lock'
+    allow_pickle = False
+
+    @classmethod
+    def init_app(cls, app):
+        cls.allow_pickle = app.config.get('MODEL_STORE_ALLOW_PICKLE', cls.allow_pickle)
+
+    @classmethod
+    def save(cls, model, model_dir, features=None):
+        """Write model to model_dir and return the manifest path"""
+        manifest = {
+            'format_version': cls.format_version,
+            'model_class': type(model).__name__,
+            'hyperparams': getattr(model, 'hyperparams', None),
+            'features': list(features) if features is not None else None,
+            'sklearn_version': sklearn.__version__
+        }
+
+        arrays = model.to_arrays() if getattr(model, 'array_attributes', ()) else {}
+        parts = {}
+        try:
+            if arrays and not any(array.dtype.hasobject for array in arrays.values()):
+                manifest['format'] = 'npy'
+                manifest['arrays'] = {}
+                for name, array in arrays.items():
+                    part_file_path, manifest['arrays'][name] = cls._write_array(array, model_dir, name)
+                    parts[part_file_path] = manifest['arrays'][name]['file']
+            else:
+                manifest['format'] = 'pickle'
+                part_file_path, manifest['pickle'] = cls._write_pickle(model, model_dir)
+                parts[part_file_path] = manifest['pickle']['file']
+
+            manifest_path = os.path.join(model_dir, cls.manifest_filename)
+            part_file_path = cls._part_file_path(model_dir, cls.manifest_filename)
+            with open(part_file_path, 'w') as manifest_file:
+                json.dump(manifest, manifest_file, indent=2)
+            parts[part_file_path] = cls.manifest_filename
+
+            with cls._exclusive(model_dir):
+                replaced = cls._referenced_files(manifest_path)
+                # The manifest is last, readers only ever see complete weights
+                for part_file_path, filename in parts.items():
+                    os.replace(part_file_path, os.path.join(model_dir, filename))
+                parts.clear()
+                # The legacy model.pkl is superseded by the manifest too
+                cls._remove_files(model_dir, (replaced | {cls.legacy_filename}) - cls._manifest_files(manifest))
+        finally:
+            cls._remove_files(model_dir, [os.path.basename(part_file_path) for part_file_path in parts])
+        return manifest_path
+
+    @classmethod
+    def load(cls, model_file_path, verify=True):
+        """Load a model from its manifest, or from a legacy model.pkl"""
+        with metrics.stage('model_load'):
+            return cls._load(model_file_path, verify)
+
+    @classmethod
+    def _load(cls, model_file_path, verify):
+        if os.path.splitext(model_file_path)[1] == '.pkl':
+            if not cls.allow_pickle:
+                raise ModelIntegrityError(f"{os.path.basename(model_file_path)} is a legacy pickle, convert it with "
+                                          f"manage.py convert_models or set MODEL_STORE_ALLOW_PICKLE to load it")
+            return DataLoader.load(model_file_path)
+
+        manifest = cls.read_manifest(model_file_path)
+        model_dir = os.path.dirname(model_file_path)
+        model_class = ModelRegistry.get_model_class(manifest['model_class'])
+        if manifest['format'] == 'pickle' or model_class.version_sensitive:
+            cls._check_sklearn_version(manifest)
+
+        if manifest['format'] == 'npy':
+            arrays = {}
+            for name, entry in manifest['arrays'].items():
+                array_file_path = os.path.join(model_dir, entry['file'])
+                if verify:
+                    cls._verify(array_file_path, entry)
+                arrays[name] = np.load(array_file_path, mmap_mode='r', allow_pickle=False)
+            return model_class.from_arrays(manifest['hyperparams'], arrays)
+
+        entry = manifest['pickle']
+        if not cls.allow_pickle:
+            raise ModelIntegrityError(f"{entry['file']} is a pickle, set MODEL_STORE_ALLOW_PICKLE to load it")
+        pickle_file_path = os.path.join(model_dir, entry['file'])
+        cls._verify(pickle_file_path, entry)
+        model = DataLoader.load(pickle_file_path)
+        if not isinstance(model, model_class):
+            raise ModelIntegrityError(f"{entry['file']} does not hold a {manifest['model_class']}")
+        return model
+
+    @classmethod
+    def read_manifest(cls, manifest_path):
+        with open(manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
+        if manifest.get('format_version') != cls.format_version:
+            raise ModelIntegrityError(f"Unsupported model format version {manifest.get('format_version')}")
+        return manifest
+
+    @classmethod
+    def artifact_size(cls, model_file_path):
+        """Bytes taken by a saved model, manifest and weight files included"""
+        size = os.path.getsize(model_file_path)
+        if os.path.splitext(model_file_path)[1] == '.pkl':
+            return size
+        manifest = cls.read_manifest(model_file_path)
+        entries = manifest['arrays'].values() if manifest['format'] == 'npy' else [manifest['pickle']]
+        return size + sum(entry['size'] for entry in entries)
+
+    @classmethod
+    def checksum(cls, model_file_path):
+        """sha256 of the manifest, which pins the checksum of every weight file"""
+        return file_checksum(model_file_path, 1024 * 1024)
+
+    @classmethod
+    def convert(cls, model_dir, features=None):
+        """Convert a legacy model.pkl in model_dir, returning the manifest path or None"""
+        legacy_file_path = os.path.join(model_dir, cls.legacy_filename)
+        if not os.path.exists(legacy_file_path):
+            return None
+        model = DataLoader.load(legacy_file_path)
+        return cls.save(model, model_dir, features=features)
+
+    @classmethod
+    def _write_array(cls, array, model_dir, name):
+        array = np.asarray(array, order='C')
+        part_file_path = cls._part_file_path(model_dir, f'{name}.npy')
+        with open(part_file_path, 'wb') as array_file:
+            np.save(array_file, array, allow_pickle=False)
+        sha256 = cls._file_checksum(part_file_path)
+        return part_file_path, {
+            'file': f'{name}.{sha256[:16]}.npy',
+            'dtype': str(array.dtype),
+            'shape': list(array.shape),
+            'size': os.path.getsize(part_file_path),
+            'sha256': sha256
+        }
+
+    @classmethod
+    def _write_pickle(cls, model, model_dir):
+        part_file_path = cls._part_file_path(model_dir, 'model.pkl')
+        DataLoader.save(file_object=model, file_path=part_file_path)
+        sha256 = cls._file_checksum(part_file_path)
+        return part_file_path, {
+            'file': f'model.{sha256[:16]}.pkl',
+            'size': os.path.getsize(part_file_path),
+            'sha256': sha256
+        }
+
+    @classmethod
+    def _part_file_path(cls, model_dir, filename):
+        # Unique per save, two trainings of one experiment never write the same part file
+        root, extension = os.path.splitext(filename)
+        return os.path.join(model_dir, f'{root}.{uuid.uuid4().hex}.part{extension}')
+
+    @classmethod
+    def _referenced_files(cls, manifest_path):
+        try:
+            manifest = cls.read_manifest(manifest_path)
+        except (OSError, ValueError, ModelIntegrityError):
+            return set()
+        return cls._manifest_files(manifest)
+
+    @classmethod
+    def _manifest_files(cls, manifest):
+        entries = manifest['arrays'].values() if manifest['format'] == 'npy' else [manifest['pickle']]
+        return set(entry['file'] for entry in entries)
+
+    @classmethod
+    def _remove_files(cls, model_dir, filenames):
+        for filename in filenames:
+            try:
+                # Readers that mapped the old weights keep them until they unmap
+                os.remove(os.path.join(model_dir, filename))
+            except FileNotFoundError:
+                pass
+
+    @classmethod
+    @contextmanager
+    def _exclusive(cls, model_dir):
+        with open(os.path.join(model_dir, cls.lock_filename), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @classmethod
+    def _check_sklearn_version(cls, manifest):
+        saved_version = manifest.get('sklearn_version')
+        if saved_version != sklearn.__version__:
+            raise ModelIntegrityError(f"{manifest['model_class']} was saved by scikit-learn {saved_version or 'unknown'}"
+                                      f" and cannot be loaded by {sklearn.__version__}, retrain it")
+
+    @classmethod
+    def _verify(cls, file_path, entry):
+        if os.path.getsize(file_path) != entry['size'] or cls._file_checksum(file_path) != entry['sha256']:
+            raise ModelIntegrityError(f"Checksum mismatch for {os.path.basename(file_path)}")
+
+    @classmethod
+    def _file_checksum(cls, file_path):
+        return file_checksum(file_path, chunk_size=1024 * 1024)
@@ -1,10 +1,61 @@
 from abc import ABC, abstractmethod
+import numpy as np
 from project.ml.data_loader import DataLoader
-from sklearn.linear_model import LogisticRegression
+from project.ml.scoring import LinearScorer
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.svm import SVC
+from sklearn.tree import DecisionTreeClassifier
+from sklearn.tree._tree import Tree
 from sklearn import metrics
+import sklearn
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _is_integer(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def number(greater_than):
+    """Rule accepting ints and floats above greater_than"""
+    return f'a number > {greater_than}', lambda value: _is_number(value) and value > greater_than
+
+
+def integer(minimum, optional=False):
+    """Rule accepting integers from minimum on, and null when optional"""
+    description = f'an integer >= {minimum}' + (' or null' if optional else '')
+    return description, lambda value: (optional and value is None) or (_is_integer(value) and value >= minimum)
+
+
+def choice(*options):
+    """Rule accepting one of the given strings"""
+    return f"one of {', '.join(options)}", lambda value: isinstance(value, str) and value in options
+
+
+def one_of(*rules):
+    """Rule accepting what any of rules accepts"""
+    return ' or '.join(description for description, _ in rules), \
+        lambda value: any(accepts(value) for _, accepts in rules)
+
+
+# joblib counts negative n_jobs back from the number of cores, 0 is an error
+n_jobs_rule = ('null or a non-zero integer', lambda value: value is None or (_is_integer(value) and value != 0))
+
 
 class Model(ABC):
 
+    # Declared hyperparameters and their defaults
+    default_hyperparams = {}
+    # (description, accepts) rule per declared hyperparameter, values without one are not checked
+    hyperparam_rules = {}
+    # Name of the hyperparameter controlling how many cores the backend uses,
+    # None when the backend is single threaded
+    n_jobs_param = None
+    supports_incremental = False
+
     @abstractmethod
     def __init__(self, hyperparams):
         pass
@@ -21,28 +72,284 @@ class Model(ABC):
     def predict(self, X):
         pass
 
+    @abstractmethod
+    def predict_proba(self, X):
+        pass
+
+    def predict_with_proba(self, X):
+        """Return labels and class probabilities for X"""
+        return self.predict(X), self.predict_proba(X)
 
-class Logistic_Regression(Model):
-    """Linear Model"""
-    def __init__(self, hyperparams):
-        self.hyperparams = hyperparams
+    def train_incremental(self, make_batches):
+        raise NotImplementedError(f"{type(self).__name__} does not support streaming training")
+
+    def test_incremental(self, make_batches):
+        raise NotImplementedError(f"{type(self).__name__} does not support streaming testing")
+
+    @classmethod
+    def make_hyperparams(cls, hyperparams=None):
+        """Merge hyperparams over the declared defaults, rejecting undeclared ones and invalid values"""
+        hyperparams = hyperparams or {}
+        cls.check_hyperparam_names(hyperparams)
+        invalid = [f'{name} must be {cls.hyperparam_rules[name][0]}, not {value!r}'
+                   for name, value in sorted(hyperparams.items())
+                   if name in cls.hyperparam_rules and not cls.hyperparam_rules[name][1](value)]
+        if invalid:
+            raise ValueError(f"Invalid hyperparameters for {cls.__name__}: {'; '.join(invalid)}")
+        return {**cls.default_hyperparams, **hyperparams}
+
+    @classmethod
+    def check_hyperparam_names(cls, names):
+        unknown = sorted(set(names) - set(cls.default_hyperparams))
+        if unknown:
+            raise ValueError(f"Unknown hyperparameters for {cls.__name__}: {', '.join(unknown)}")
+
+
+class SklearnModel(Model):
+    """Model backed by a scikit-learn classifier stored in self.clf"""
+
+    # Fitted classifier attributes that fully describe the model, saved as
+    # plain arrays by ModelStore. Empty when the model can only be pickled.
+    array_attributes = ()
+    # True when array_attributes are scikit-learn internals, which only the
+    # scikit-learn version that saved them is known to read back correctly
+    version_sensitive = False
+    # Compiled scoring path used instead of self.clf when not None
+    scorer = None
+
+    def __init__(self, hyperparams=None):
+        self.hyperparams = self.make_hyperparams(hyperparams)
+
+    def to_arrays(self):
+        return {attribute: np.asarray(getattr(self.clf, attribute)) for attribute in self.array_attributes}
+
+    @classmethod
+    def from_arrays(cls, hyperparams, arrays):
+        """Rebuild a fitted model from the arrays returned by to_arrays"""
+        model = cls(hyperparams=hyperparams)
+        model.clf = model._make_classifier()
+        for attribute in cls.array_attributes:
+            setattr(model.clf, attribute, arrays[attribute])
+        if 'coef_' in arrays:
+            model.clf.n_features_in_ = arrays['coef_'].shape[1]
+        model.compile()
+        return model
+
+    @abstractmethod
+    def _make_classifier(self):
+        pass
+
+    def _make_scorer(self):
+        return None
+
+    def compile(self):
+        """Build the scoring path from the fitted classifier"""
+        self.scorer = self._make_scorer()
 
     def train(self, X, y):
-        self.clf = LogisticRegression(penalty=self.hyperparams['penalty'])
+        self.clf = self._make_classifier()
         self.clf.fit(X, y)
-        y_hat = self.clf.predict(X)
+        self.compile()
+        y_hat = self.predict(X)
         accuracy = metrics.accuracy_score(y, y_hat)
         result = {'train_accuracy': accuracy}
         return result
 
     def test(self, X, y):
-        y_hat = self.clf.predict(X)
+        y_hat = self.predict(X)
         accuracy = metrics.accuracy_score(y, y_hat)
         result = {'test_accuracy': accuracy}
         return result
 
     def predict(self, X):
+        if self.scorer is not None:
+            return self.scorer.predict(X)
         y_hat = self.clf.predict(X)
         return y_hat
 
+    def predict_proba(self, X):
+        if self.scorer is not None:
+            return self.scorer.predict_proba(X)
+        probabilities = self.clf.predict_proba(X)
+        return probabilities
+
+    def predict_with_proba(self, X):
+        if self.scorer is not None:
+            return self.scorer.predict_with_proba(X)
+        return super().predict_with_proba(X)
+
+
+class LinearSklearnModel(SklearnModel):
+    """Linear classifier served by a LinearScorer over its coef_ and intercept_"""
+    array_attributes = ('coef_', 'intercept_', 'classes_')
+
+    def _make_scorer(self):
+        return LinearScorer.from_classifier(self.clf, link=self._multiclass_link())
+
+    def _multiclass_link(self):
+        return 'ovr'
+
+
+class Logistic_Regression(LinearSklearnModel):
+    """Linear Model, fits one-vs-rest classes on n_jobs cores, a binary fit is single threaded"""
+    default_hyperparams = {'penalty': 'l2', 'C': 1.0, 'max_iter': 100, 'n_jobs': None}
+    # The lbfgs solver only fits l2 or unpenalized models
+    hyperparam_rules = {'penalty': choice('l2', 'none'), 'C': number(greater_than=0), 'max_iter': integer(1),
+                        'n_jobs': n_jobs_rule}
+    n_jobs_param = 'n_jobs'
+
+    def _make_classifier(self):
+        # Only passed when set, scikit-learn 1.8 deprecated n_jobs here once it fit every class jointly
+        n_jobs = {} if self.hyperparams['n_jobs'] is None else {'n_jobs': self.hyperparams['n_jobs']}
+        return LogisticRegression(penalty=self.hyperparams['penalty'],
+                                  C=self.hyperparams['C'],
+                                  max_iter=self.hyperparams['max_iter'],
+                                  **n_jobs)
+
+    def _multiclass_link(self):
+        # scikit-learn before 0.22 defaults to one-vs-rest ('warn' means ovr),
+        # 'auto' is one-vs-rest only with liblinear and releases that dropped
+        # multi_class are always multinomial
+        multi_class = getattr(self.clf, 'multi_class', None)
+        if multi_class in ('ovr', 'warn') or (multi_class == 'auto' and self.clf.solver == 'liblinear'):
+            return 'ovr'
+        return 'softmax'
+
+
+class SGD_Logistic_Regression(LinearSklearnModel):
+    """Linear Model fitted incrementally with SGD, for datasets larger than memory"""
+    default_hyperparams = {'penalty': 'l2', 'alpha': 0.0001, 'epochs': 1, 'n_jobs': None}
+    # The optimal learning rate schedule divides by alpha
+    hyperparam_rules = {'penalty': choice('l2', 'l1', 'elasticnet'), 'alpha': number(greater_than=0),
+                        'epochs': integer(1), 'n_jobs': n_jobs_rule}
+    n_jobs_param = 'n_jobs'
+    supports_incremental = True
+
+    def _make_classifier(self):
+        # 'log' was renamed to 'log_loss' in scikit-learn 1.1
+        loss = 'log_loss' if 'log_loss' in SGDClassifier.loss_functions else 'log'
+        return SGDClassifier(loss=loss,
+                             penalty=self.hyperparams['penalty'],
+                             alpha=self.hyperparams['alpha'],
+                             n_jobs=self.hyperparams['n_jobs'])
+
+    def train_incremental(self, make_batches):
+        """Fit on (X, y) chunks, make_batches() must return a fresh chunk iterator.
+
+        One pass collects the labels, ``epochs`` passes call partial_fit and a
+        last pass counts correct predictions, so only one chunk is held at a time.
+        """
+        classes = set()
+        for _, y in make_batches():
+            classes.update(np.unique(y).tolist())
+
+        self.clf = self._make_classifier()
+        classes = np.array(sorted(classes))
+        for _ in range(self.hyperparams['epochs']):
+            for X, y in make_batches():
+                self.clf.partial_fit(X, y, classes=classes)
+        self.compile()
+
+        accuracy = self._incremental_accuracy(make_batches)
+        result = {'train_accuracy': accuracy}
+        return result
+
+    def test_incremental(self, make_batches):
+        accuracy = self._incremental_accuracy(make_batches)
+        result = {'test_accuracy': accuracy}
+        return result
+
+    def _incremental_accuracy(self, make_batches):
+        correct = 0
+        total = 0
+        for X, y in make_batches():
+            correct += int((self.predict(X) == np.asarray(y)).sum())
+            total += len(y)
+        return correct / total if total else 0.0
+
+
+class Random_Forest(SklearnModel):
+    """Tree ensemble, fits and predicts its trees on n_jobs cores"""
+    default_hyperparams = {'n_estimators': 100, 'max_depth': None, 'min_samples_leaf': 1, 'n_jobs': -1}
+    hyperparam_rules = {'n_estimators': integer(1), 'max_depth': integer(1, optional=True),
+                        'min_samples_leaf': integer(1), 'n_jobs': n_jobs_rule}
+    n_jobs_param = 'n_jobs'
+    # The nodes and leaf values of every tree are concatenated, node_counts splits them again
+    array_attributes = ('classes_', 'n_features_in_', 'node_counts', 'max_depths', 'nodes', 'values')
+    # The node layout is the private state of sklearn.tree._tree.Tree
+    version_sensitive = True
+
+    def _make_classifier(self):
+        return RandomForestClassifier(n_estimators=self.hyperparams['n_estimators'],
+                                      max_depth=self.hyperparams['max_depth'],
+                                      min_samples_leaf=self.hyperparams['min_samples_leaf'],
+                                      n_jobs=self.hyperparams['n_jobs'])
+
+    def to_arrays(self):
+        states = [estimator.tree_.__getstate__() for estimator in self.clf.estimators_]
+        return {
+            'classes_': np.asarray(self.clf.classes_),
+            'n_features_in_': np.asarray(self.clf.n_features_in_),
+            'node_counts': np.array([state['node_count'] for state in states], dtype=np.int64),
+            'max_depths': np.array([state['max_depth'] for state in states], dtype=np.int64),
+            'nodes': np.concatenate([state['nodes'] for state in states]),
+            'values': np.concatenate([state['values'] for state in states])
+        }
+
+    @classmethod
+    def from_arrays(cls, hyperparams, arrays):
+        model = cls(hyperparams=hyperparams)
+        model.clf = model._make_classifier()
+        model.clf.classes_ = arrays['classes_']
+        model.clf.n_classes_ = len(arrays['classes_'])
+        model.clf.n_outputs_ = 1
+        model.clf.n_features_in_ = int(arrays['n_features_in_'])
+
+        n_classes = np.array([model.clf.n_classes_], dtype=np.intp)
+        ends = np.cumsum(arrays['node_counts'])
+        model.clf.estimators_ = []
+        for start, end, max_depth in zip(ends - arrays['node_counts'], ends, arrays['max_depths']):
+            # Tree copies the nodes into its own buffers, nothing is unpickled
+            tree = Tree(model.clf.n_features_in_, n_classes, 1)
+            tree.__setstate__({'max_depth': int(max_depth), 'node_count': int(end - start),
+                               'nodes': np.ascontiguousarray(arrays['nodes'][start:end]),
+                               'values': np.ascontiguousarray(arrays['values'][start:end])})
+            estimator = DecisionTreeClassifier(max_depth=model.clf.max_depth,
+                                               min_samples_leaf=model.clf.min_samples_leaf)
+            estimator.tree_ = tree
+            estimator.classes_ = np.arange(model.clf.n_classes_, dtype=np.float64)
+            estimator.n_classes_ = model.clf.n_classes_
+            estimator.n_outputs_ = 1
+            estimator.n_features_in_ = model.clf.n_features_in_
+            model.clf.estimators_.append(estimator)
+        model.compile()
+        return model
+
+
+class SVM(SklearnModel):
+    """Kernel Support Vector Machine, libsvm is single threaded"""
+    default_hyperparams = {'C': 1.0, 'kernel': 'rbf', 'gamma': 'scale'}
+    hyperparam_rules = {'C': number(greater_than=0), 'kernel': choice('linear', 'poly', 'rbf', 'sigmoid'),
+                        'gamma': one_of(choice('scale', 'auto'), number(greater_than=0))}
+    # What libsvm predicts from, the underscored copies are the ones it is handed
+    array_attributes = ('classes_', 'class_weight_', 'support_', 'support_vectors_', '_n_support',
+                        'dual_coef_', '_dual_coef_', 'intercept_', '_intercept_', '_probA', '_probB',
+                        '_gamma', 'shape_fit_')
+    version_sensitive = True
+
+    def _make_classifier(self):
+        return SVC(C=self.hyperparams['C'],
+                   kernel=self.hyperparams['kernel'],
+                   gamma=self.hyperparams['gamma'],
+                   probability=True)
 
+    @classmethod
+    def from_arrays(cls, hyperparams, arrays):
+        # libsvm takes writable buffers, the weights are small enough to copy
+        model = super().from_arrays(hyperparams, {name: np.array(array) for name, array in arrays.items()})
+        model.clf._gamma = float(model.clf._gamma)
+        model.clf.shape_fit_ = tuple(model.clf.shape_fit_.tolist())
+        model.clf._sparse = False
+        model.clf.fit_status_ = 0
+        model.clf.n_features_in_ = model.clf.support_vectors_.shape[1]
+        return model
@@ -0,0 +1,81 @@
+from collections import namedtuple
+
+from project.ml.dataset_maker import PimaIndiansDatasetMaker
+from project.ml.models import Logistic_Regression, SGD_Logistic_Regression, Random_Forest, SVM
+
+
+Backend = namedtuple('Backend', ['key', 'model_class', 'dataset_maker_class', 'name_prefixes'])
+
+
+class ModelRegistry:
+    """Maps an experiment to the Model and DatasetMaker that run it.
+
+    An explicit ``model`` on the experiment wins. Otherwise the legacy name
+    prefixes (``LR_``, ``SVM_``, ...) and finally the experiment ``type`` are
+    tried, so experiments created before the registry keep working.
+    """
+
+    _backends = {}
+    # Backend used for streaming experiments whose model does not support it
+    streaming_default = 'sgd_logistic_regression'
+
+    @classmethod
+    def register(cls, key, model_class, dataset_maker_class, name_prefixes=()):
+        cls._backends[key] = Backend(key, model_class, dataset_maker_class, tuple(name_prefixes))
+
+    @classmethod
+    def get(cls, key):
+        if key not in cls._backends:
+            raise ValueError(f"Unknown model {key}. Available models: {', '.join(sorted(cls._backends))}")
+        return cls._backends[key]
+
+    @classmethod
+    def get_model_class(cls, name):
+        """Return the registered Model class called name, saved models only rebuild these"""
+        for backend in cls._backends.values():
+            if backend.model_class.__name__ == name:
+                return backend.model_class
+        raise ValueError(f"Unknown model class {name}")
+
+    @classmethod
+    def resolve(cls, experiment):
+        model = getattr(experiment, 'model', None)
+        if model:
+            backend = cls.get(model)
+        else:
+            backend = cls._resolve_legacy(experiment)
+
+        if getattr(experiment, 'training_mode', 'batch') == 'streaming' and \
+                not backend.model_class.supports_incremental:
+            if model:
+                raise ValueError(f"Model {model} does not support streaming training")
+            backend = cls.get(cls.streaming_default)
+        return backend
+
+    @classmethod
+    def describe(cls):
+        return [{
+            'model': backend.key,
+            'model_class': backend.model_class.__name__,
+            'dataset_maker_class': backend.dataset_maker_class.__name__,
+            'hyperparams': backend.model_class.default_hyperparams,
+            'n_jobs_param': backend.model_class.n_jobs_param,
+            'supports_streaming': backend.model_class.supports_incremental,
+            'name_prefixes': list(backend.name_prefixes)
+        } for backend in cls._backends.values()]
+
+    @classmethod
+    def _resolve_legacy(cls, experiment):
+        for backend in cls._backends.values():
+            if any(prefix in experiment.name for prefix in backend.name_prefixes):
+                return backend
+        if experiment.type in cls._backends:
+            return cls._backends[experiment.type]
+        raise ValueError(f"No valid model for Experiment {experiment.name}")
+
+
+ModelRegistry.register('logistic_regression', Logistic_Regression, PimaIndiansDatasetMaker, name_prefixes=['LR_'])
+ModelRegistry.register('sgd_logistic_regression', SGD_Logistic_Regression, PimaIndiansDatasetMaker,
+                       name_prefixes=['SGD_'])
+ModelRegistry.register('random_forest', Random_Forest, PimaIndiansDatasetMaker, name_prefixes=['RF_'])
+ModelRegistry.register('svm', SVM, PimaIndiansDatasetMaker, name_prefixes=['SVM_'])
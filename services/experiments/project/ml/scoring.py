@@ -0,0 +1,70 @@
+import numpy as np
+
+
+class LinearScorer:
+    """Scores a fitted linear classifier with plain vectorized NumPy.
+
+    The weights are pulled out of the estimator once, after training or
+    loading, so a prediction is one matrix product plus the link function
+    instead of a pass through scikit-learn's input validation. ``link`` is
+    ``'ovr'`` for one-vs-rest logistic probabilities (normalized across
+    classes when there are more than two) or ``'softmax'`` for multinomial
+    models; binary models always use the logistic sigmoid.
+    """
+
+    def __init__(self, coef, intercept, classes, link='ovr'):
+        if link not in ('ovr', 'softmax'):
+            raise ValueError(f"Unsupported link {link}, use ovr or softmax")
+        # (n_features, n_outputs) so X @ weights needs no transpose per call
+        self.weights = np.ascontiguousarray(np.asarray(coef, dtype=np.float64).T)
+        self.intercept = np.asarray(intercept, dtype=np.float64)
+        self.classes = np.asarray(classes)
+        self.link = link
+
+    @classmethod
+    def from_classifier(cls, clf, link='ovr'):
+        return cls(clf.coef_, clf.intercept_, clf.classes_, link=link)
+
+    @property
+    def n_features(self):
+        return self.weights.shape[0]
+
+    def decision_function(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"X has {X.shape[1]} features, the model expects {self.n_features}")
+        scores = X @ self.weights
+        scores += self.intercept
+        return scores
+
+    def predict(self, X):
+        return self._labels(self.decision_function(X))
+
+    def predict_proba(self, X):
+        return self._probabilities(self.decision_function(X))
+
+    def predict_with_proba(self, X):
+        """Return labels and probabilities from a single pass over X"""
+        scores = self.decision_function(X)
+        return self._labels(scores), self._probabilities(scores)
+
+    def _labels(self, scores):
+        if scores.shape[1] == 1:
+            return self.classes[(scores[:, 0] > 0).astype(np.intp)]
+        return self.classes[scores.argmax(axis=1)]
+
+    def _probabilities(self, scores):
+        if scores.shape[1] == 1:
+            positive = 1.0 / (1.0 + np.exp(-scores[:, 0]))
+            return np.column_stack([1.0 - positive, positive])
+        if self.link == 'softmax':
+            scores = np.exp(scores - scores.max(axis=1, keepdims=True))
+            return scores / scores.sum(axis=1, keepdims=True)
+        probabilities = 1.0 / (1.0 + np.exp(-scores))
+        totals = probabilities.sum(axis=1, keepdims=True)
+        # A row where every class scores zero gets uniform probabilities
+        probabilities[totals[:, 0] == 0] = 1.0
+        totals[totals == 0] = probabilities.shape[1]
+        return probabilities / totals
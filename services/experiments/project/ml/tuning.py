@@ -0,0 +1,166 @@
+import itertools
+import math
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sklearn.model_selection import StratifiedKFold
+
+
+class HyperparameterSearch:
+    """Cross-validated grid or random search run across a process pool.
+
+    The train and test matrices of every fold are written once to ``.npy``
+    files in a directory of their own under the work directory, and every
+    trial memory-maps them, so folds are shared through the page cache
+    instead of being pickled to each process or copied by each trial. A trial is stopped early when,
+    after a fold, its running mean score trails the best finished trial by
+    more than ``early_stopping_margin``. Backends with an ``n_jobs_param`` fit
+    on one core inside a trial, the pool already keeps every worker busy.
+    """
+
+    def __init__(self, model_class, space, search='grid', n_trials=None, folds=5, workers=2,
+                 early_stopping_margin=None, seed=0, base_hyperparams=None):
+        self.model_class = model_class
+        self.space = space
+        self.base_hyperparams = base_hyperparams or {}
+        self.search = search
+        self.n_trials = n_trials
+        self.folds = folds
+        self.workers = workers
+        self.early_stopping_margin = early_stopping_margin
+        self.seed = seed
+
+        if not space:
+            raise ValueError("Search space is empty")
+        if folds < 2:
+            raise ValueError("At least 2 folds are needed for cross-validation")
+        model_class.check_hyperparam_names(space)
+        model_class.make_hyperparams(self.base_hyperparams)
+
+    def make_trials(self):
+        """Return the hyperparams of every trial, search values over base_hyperparams"""
+        names = sorted(self.space)
+        if self.search == 'grid':
+            values = [self._grid_values(self.space[name]) for name in names]
+            trials = [dict(zip(names, combination)) for combination in itertools.product(*values)]
+            trials = trials[:self.n_trials] if self.n_trials else trials
+        elif self.search == 'random':
+            rng = random.Random(self.seed)
+            trials = [{name: self._sample(self.space[name], rng) for name in names}
+                      for _ in range(self.n_trials or 10)]
+        else:
+            raise ValueError(f"Unsupported search {self.search}, use grid or random")
+        trials = [{**self.base_hyperparams, **trial} for trial in trials]
+        # Raises for values the backend rejects, before any trial is run
+        for trial in trials:
+            self.model_class.make_hyperparams(trial)
+        return trials
+
+    def run(self, X, y, work_dir):
+        started = time.perf_counter()
+        # One directory per search, tune jobs of the same experiment never share files
+        data_dir = tempfile.mkdtemp(prefix='tune-', dir=work_dir)
+        try:
+            X = np.asarray(X, dtype=np.float64)
+            y = np.asarray(y)
+            for fold, (train_index, test_index) in enumerate(StratifiedKFold(
+                    n_splits=self.folds, shuffle=True, random_state=self.seed).split(X, y)):
+                for part, index in (('train', train_index), ('test', test_index)):
+                    np.save(os.path.join(data_dir, f'fold_{fold}_X_{part}.npy'), X[index])
+                    np.save(os.path.join(data_dir, f'fold_{fold}_y_{part}.npy'), y[index])
+
+            trials = self.make_trials()
+            best_score = multiprocessing.Value('d', -math.inf)
+            with ProcessPoolExecutor(max_workers=max(1, min(self.workers, len(trials))),
+                                     initializer=_init_trial_worker,
+                                     initargs=(best_score,)) as executor:
+                futures = [executor.submit(_run_trial, trial, hyperparams, self.model_class, data_dir,
+                                           self.folds, self.early_stopping_margin,
+                                           self._single_core(hyperparams))
+                           for trial, hyperparams in enumerate(trials)]
+                results = [future.result() for future in futures]
+        finally:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+        finished = [result for result in results if result['status'] == 'done']
+        best = max(finished, key=lambda result: result['mean_score']) if finished else None
+        return {
+            'search': self.search,
+            'folds': self.folds,
+            'workers': self.workers,
+            'n_trials': len(trials),
+            'seconds': time.perf_counter() - started,
+            'trials': results,
+            'best': best
+        }
+
+    def _single_core(self, hyperparams):
+        n_jobs_param = self.model_class.n_jobs_param
+        if n_jobs_param is None or n_jobs_param in self.space:
+            return hyperparams
+        return {**hyperparams, n_jobs_param: 1}
+
+    @classmethod
+    def _grid_values(cls, values):
+        if isinstance(values, dict):
+            raise ValueError("Grid search needs a list of values for every hyperparameter")
+        return list(values)
+
+    @classmethod
+    def _sample(cls, values, rng):
+        if not isinstance(values, dict):
+            return rng.choice(list(values))
+        low, high = values['low'], values['high']
+        if values.get('log'):
+            value = math.exp(rng.uniform(math.log(low), math.log(high)))
+        else:
+            value = rng.uniform(low, high)
+        return int(round(value)) if values.get('type') == 'int' else value
+
+
+_best_score = None
+
+
+def _init_trial_worker(best_score):
+    global _best_score
+    _best_score = best_score
+
+
+def _load_fold(data_dir, fold, part):
+    return (np.load(os.path.join(data_dir, f'fold_{fold}_X_{part}.npy'), mmap_mode='r'),
+            np.load(os.path.join(data_dir, f'fold_{fold}_y_{part}.npy'), mmap_mode='r'))
+
+
+def _run_trial(trial, hyperparams, model_class, data_dir, folds, early_stopping_margin, fit_hyperparams):
+    started = time.perf_counter()
+    result = {'trial': trial, 'hyperparams': hyperparams, 'status': 'done', 'fold_scores': [],
+              'mean_score': None, 'seconds': None, 'error': None}
+    try:
+        for fold in range(folds):
+            model = model_class(hyperparams=fit_hyperparams)
+            model.train(*_load_fold(data_dir, fold, 'train'))
+            score = model.test(*_load_fold(data_dir, fold, 'test'))['test_accuracy']
+            result['fold_scores'].append(score)
+
+            mean_score = float(np.mean(result['fold_scores']))
+            if early_stopping_margin is not None and fold + 1 < folds and \
+                    mean_score < _best_score.value - early_stopping_margin:
+                result['status'] = 'stopped'
+                break
+
+        result['mean_score'] = float(np.mean(result['fold_scores']))
+        if result['status'] == 'done':
+            with _best_score.get_lock():
+                _best_score.value = max(_best_score.value, result['mean_score'])
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = str(e)
+
+    result['seconds'] = time.perf_counter() - started
+    return result
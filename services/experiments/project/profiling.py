@@ -0,0 +1,173 @@
+import cProfile
+import functools
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from flask import current_app, g, has_app_context, request
+
+from project.ml.environment import Locator
+
+
+PROFILE_MODES = {'1': 'sample', 'true': 'sample', 'sample': 'sample', 'cprofile': 'cprofile'}
+
+
+class StackSampler:
+    """Samples the stack of one thread from a background thread.
+
+    The result is in the collapsed stack format (``frame;frame;frame count``
+    per line) read by flamegraph.pl, speedscope and inferno.
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(names))] += 1
+
+
+def run_profiled(mode, interval, func, *args, **kwargs):
+    """Call func under a cProfile or a stack sampler, returning its result and the profiler"""
+    if mode == 'cprofile':
+        profiler = cProfile.Profile()
+        return profiler.runcall(func, *args, **kwargs), profiler
+    profiler = StackSampler(threading.get_ident(), interval)
+    profiler.start()
+    try:
+        return func(*args, **kwargs), profiler
+    finally:
+        profiler.stop()
+
+
+def write_profile(mode, profiler, profile_dir, name):
+    """Store a profile as <stamp>-<name>.pstats or .collapsed in profile_dir, returning its path"""
+    os.makedirs(profile_dir, exist_ok=True)
+    extension = 'pstats' if mode == 'cprofile' else 'collapsed'
+    stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')
+    profile_path = os.path.join(profile_dir, f'{stamp}-{name}.{extension}')
+    if mode == 'cprofile':
+        profiler.dump_stats(profile_path)
+    else:
+        with open(profile_path, 'w') as profile_file:
+            profile_file.write(profiler.collapsed())
+    return profile_path
+
+
+class RequestProfiler:
+    """Opt-in profiling of single requests to the experiments blueprint.
+
+    With ``PROFILING_ENABLED`` the blueprint views are wrapped when the app is
+    created; otherwise nothing is wrapped and requests pay nothing. A request
+    is profiled when it sends the ``X-Profile`` header or ``profile`` query
+    flag, set to ``sample`` (stack sampling, collapsed stacks) or ``cprofile``.
+    Profiles of requests for an existing experiment are stored in its
+    ``result/profiles`` dir and named in the ``X-Profile-Path`` header; other
+    requests, or ``X-Profile-Output: inline``, get the profile as the body.
+
+    Jobs run inline are part of the request profile. Jobs a profiled request
+    hands to the worker pool are profiled by the worker with the same mode,
+    their profile is stored in the same dir and named by the job's
+    ``profile_path``.
+    """
+
+    header = 'X-Profile'
+    output_header = 'X-Profile-Output'
+
+    def init_app(self, app, blueprint_name='experiments'):
+        if not app.config.get('PROFILING_ENABLED', False):
+            return
+        for endpoint, view in list(app.view_functions.items()):
+            if endpoint.startswith(f'{blueprint_name}.') and not getattr(view, 'profiled', False):
+                app.view_functions[endpoint] = self.wrap(view)
+
+    def wrap(self, view):
+        @functools.wraps(view)
+        def profiled_view(*args, **kwargs):
+            mode = self.requested_mode()
+            if mode is None:
+                return view(*args, **kwargs)
+            return self.profile(mode, view, args, kwargs)
+        profiled_view.profiled = True
+        return profiled_view
+
+    def requested_mode(self):
+        value = request.headers.get(self.header) or request.args.get('profile')
+        if not value:
+            return None
+        return PROFILE_MODES.get(value.lower())
+
+    def profile(self, mode, view, args, kwargs):
+        started = time.perf_counter()
+        g.profile_mode = mode
+        try:
+            rv, profiler = run_profiled(mode, current_app.config['PROFILING_SAMPLE_INTERVAL_MS'] / 1000,
+                                        view, *args, **kwargs)
+        finally:
+            g.profile_mode = None
+        elapsed = time.perf_counter() - started
+
+        response = current_app.make_response(rv)
+        response.headers['X-Profile-Seconds'] = f'{elapsed:.6f}'
+        profile_dir = self.get_profile_dir(kwargs.get('id'))
+        inline = request.headers.get(self.output_header, request.args.get('profile_output')) == 'inline'
+
+        if profile_dir is None or inline:
+            response.headers['X-Profiled-Status'] = str(response.status_code)
+            response.set_data(self.render(mode, profiler))
+            response.mimetype = 'text/plain'
+            response.status_code = 200
+            return response
+
+        response.headers['X-Profile-Path'] = write_profile(mode, profiler, profile_dir,
+                                                           request.endpoint.split('.')[-1])
+        return response
+
+    def active_mode(self):
+        """Mode of the profiled request being served, None outside of one"""
+        return g.get('profile_mode') if has_app_context() else None
+
+    def render(self, mode, profiler):
+        if mode != 'cprofile':
+            return profiler.collapsed()
+        report = io.StringIO()
+        pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(50)
+        return report.getvalue()
+
+    def get_profile_dir(self, experiment_id):
+        if experiment_id is None or not str(experiment_id).isdigit():
+            return None
+        # Requests for unknown experiments must not create their folders
+        if not os.path.isdir(os.path.join(Locator.root, str(experiment_id))):
+            return None
+        return Locator.get_profile_dir(experiment_id)
+
+
+request_profiler = RequestProfiler()
@@ -0,0 +1,198 @@
+import fcntl
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from project import db
+from project.ml.environment import Locator
+
+
+def remove_tree(path, max_deletes_per_second=None):
+    """Remove a directory tree bottom-up, at most max_deletes_per_second unlinks and rmdirs a second.
+
+    Symlinks are removed, never followed. Returns the number of entries removed.
+    """
+    removed = 0
+    started = time.monotonic()
+
+    def remove(entry_path, is_dir):
+        nonlocal removed
+        if is_dir and not os.path.islink(entry_path):
+            os.rmdir(entry_path)
+        else:
+            os.remove(entry_path)
+        removed += 1
+        if max_deletes_per_second:
+            ahead = removed / max_deletes_per_second - (time.monotonic() - started)
+            if ahead > 0:
+                time.sleep(ahead)
+
+    if not os.path.lexists(path):
+        return 0
+    if os.path.islink(path) or not os.path.isdir(path):
+        remove(path, False)
+        return removed
+    for dir_path, dir_names, file_names in os.walk(path, topdown=False):
+        for file_name in file_names:
+            remove(os.path.join(dir_path, file_name), False)
+        for dir_name in dir_names:
+            remove(os.path.join(dir_path, dir_name), True)
+    remove(path, True)
+    return removed
+
+
+def is_older_than(path, seconds):
+    try:
+        return time.time() - os.lstat(path).st_mtime > seconds
+    except FileNotFoundError:
+        return False
+
+
+def find_orphans(min_age_seconds):
+    """Paths under Locator.root that nothing in the database references.
+
+    These are experiment folders without an experiment row, trash entries
+    without a tombstone, stored datasets without a dataset row and stale
+    staging files. Paths younger than min_age_seconds are skipped, they may
+    belong to a request that has not committed yet.
+    """
+    from project.api.models import Dataset, Experiment, Tombstone
+
+    def entries(directory):
+        try:
+            return [os.path.join(directory, name) for name in sorted(os.listdir(directory))]
+        except FileNotFoundError:
+            return []
+
+    def old(paths):
+        return [path for path in paths if is_older_than(path, min_age_seconds)]
+
+    orphans = []
+    experiment_dirs = {int(os.path.basename(path)): path for path in entries(Locator.root)
+                       if os.path.basename(path).isdigit()}
+    if experiment_dirs:
+        existing = set(experiment_id for (experiment_id,) in db.session.query(Experiment.id)
+                       .filter(Experiment.id.in_(list(experiment_dirs))).all())
+        orphans += old([path for experiment_id, path in sorted(experiment_dirs.items())
+                        if experiment_id not in existing])
+
+    trash_names = set(trash_name for (trash_name,) in db.session.query(Tombstone.trash_name).all())
+    orphans += old([path for path in entries(Locator.get_trash_dir())
+                    if os.path.basename(path) not in trash_names and os.path.basename(path) != '.lock'])
+
+    dataset_dir = Locator.get_dataset_dir()
+    orphans += old(entries(os.path.join(dataset_dir, 'staging')))
+    blobs = {}
+    for prefix_dir in entries(dataset_dir):
+        if len(os.path.basename(prefix_dir)) != 2:
+            continue
+        for path in entries(prefix_dir):
+            # Sidecars are named after their blob, <sha256>.npy and <sha256>.meta.json
+            blobs.setdefault(os.path.basename(path).split('.')[0], []).append(path)
+    stored = set()
+    sha256s = sorted(blobs)
+    for start in range(0, len(sha256s), 500):
+        stored.update(sha256 for (sha256,) in db.session.query(Dataset.sha256)
+                      .filter(Dataset.sha256.in_(sha256s[start:start + 500])).all())
+    orphans += old([path for sha256 in sha256s if sha256 not in stored for path in blobs[sha256]])
+    return orphans
+
+
+class Reaper:
+    """Reclaims the folders of deleted experiments in the background.
+
+    Deleting an experiment commits a tombstone and renames its folder into
+    the trash, so the request never waits on the disk. Every
+    ``GC_INTERVAL_SECONDS`` a daemon thread removes the folders of up to
+    ``GC_BATCH_SIZE`` tombstones, throttled to ``GC_MAX_DELETES_PER_SECOND``
+    unlinks, then drops datasets nothing references anymore. A file lock in
+    the trash lets only one process reap at a time.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.interval = 30
+        self.batch_size = 20
+        self.max_deletes_per_second = 1000
+        self._thread = None
+        self._thread_pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.enabled = app.config.get('GC_REAPER_ENABLED', self.enabled)
+        self.interval = app.config.get('GC_INTERVAL_SECONDS', self.interval)
+        self.batch_size = app.config.get('GC_BATCH_SIZE', self.batch_size)
+        self.max_deletes_per_second = app.config.get('GC_MAX_DELETES_PER_SECOND', self.max_deletes_per_second)
+        if not self.enabled:
+            return
+
+        @app.before_request
+        def start_reaper():
+            self.start(app)
+
+    def start(self, app):
+        # Started lazily and per process, a thread of the preloading master is not inherited by its workers
+        with self._lock:
+            if self._thread is not None and self._thread_pid == os.getpid():
+                return
+            self._thread = threading.Thread(target=self._run, args=(app,), name='reaper', daemon=True)
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def _run(self, app):
+        while True:
+            time.sleep(self.interval)
+            try:
+                with app.app_context():
+                    self.reap()
+                    db.session.remove()
+            except Exception:
+                app.logger.exception('Reaping deleted experiments failed')
+
+    def reap(self, limit=None):
+        """Remove the folders of up to limit tombstoned experiments, returning their ids"""
+        from project.api.models import Experiment, Tombstone
+        from project.datasets import DatasetStore
+
+        with self._exclusive() as acquired:
+            if not acquired:
+                return []
+            reaped = []
+            tombstones = Tombstone.query.order_by(Tombstone.attempts, Tombstone.id) \
+                .limit(limit or self.batch_size).all()
+            for tombstone in tombstones:
+                trash_path = os.path.join(Locator.get_trash_dir(), tombstone.trash_name)
+                try:
+                    # The deleting request stopped between its commit and the rename
+                    if not os.path.lexists(trash_path) and \
+                            not Experiment.query.filter_by(id=tombstone.experiment_id).first():
+                        Locator.trash_experiment_folders(tombstone.experiment_id, tombstone.trash_name)
+                    remove_tree(trash_path, self.max_deletes_per_second)
+                except OSError as e:
+                    tombstone.attempts += 1
+                    tombstone.error = str(e)
+                    db.session.commit()
+                    continue
+                db.session.delete(tombstone)
+                db.session.commit()
+                reaped.append(tombstone.experiment_id)
+            DatasetStore.purge_unreferenced()
+            return reaped
+
+    @contextmanager
+    def _exclusive(self):
+        os.makedirs(Locator.get_trash_dir(), exist_ok=True)
+        with open(os.path.join(Locator.get_trash_dir(), '.lock'), 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+reaper = Reaper()
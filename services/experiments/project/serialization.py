@@ -0,0 +1,65 @@
+import numpy as np
+from flask.json import JSONEncoder as FlaskJSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+JSON_BACKENDS = ('auto', 'orjson', 'json')
+
+
+class JSONEncoder(FlaskJSONEncoder):
+    """Flask JSON encoder that writes NumPy values natively and hands the work to orjson when installed.
+
+    Dates keep Flask's HTTP date format, so responses read the same with
+    either backend. Objects orjson refuses, integers beyond 64 bits for
+    example, are encoded by the json module as before.
+    """
+
+    def default(self, o):
+        if isinstance(o, np.ndarray):
+            return o.tolist()
+        if isinstance(o, np.generic):
+            return o.item()
+        return super().default(o)
+
+    def encode(self, o):
+        if json_serializer.backend == 'orjson':
+            option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME
+            if self.sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            if self.indent:
+                option |= orjson.OPT_INDENT_2
+            try:
+                return orjson.dumps(o, default=self.default, option=option).decode()
+            except TypeError:
+                pass
+        return super().encode(o)
+
+
+class JSONSerializer:
+    """Chooses the JSON backend of the app's responses.
+
+    ``JSON_BACKEND`` is ``auto`` (orjson when it is installed), ``orjson``
+    or ``json``. orjson is optional, without it responses are encoded by the
+    json module with the same NumPy support.
+    """
+
+    def __init__(self):
+        self.backend = 'orjson' if orjson is not None else 'json'
+
+    def init_app(self, app):
+        backend = app.config.get('JSON_BACKEND', 'auto')
+        if backend not in JSON_BACKENDS:
+            raise ValueError(f"JSON_BACKEND must be one of {', '.join(JSON_BACKENDS)}, not {backend}")
+        if backend == 'orjson' and orjson is None:
+            raise RuntimeError('JSON_BACKEND is orjson but orjson is not installed')
+        if backend == 'auto':
+            backend = 'orjson' if orjson is not None else 'json'
+        self.backend = backend
+        app.json_encoder = JSONEncoder
+
+
+json_serializer = JSONSerializer()
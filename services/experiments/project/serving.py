@@ -0,0 +1,73 @@
+from project import db
+
+
+def recently_trained_experiments(limit):
+    """Experiments whose model was saved most recently, newest first"""
+    from project.api.models import Experiment
+
+    return Experiment.query.filter(Experiment.trained.is_(True)) \
+        .order_by(Experiment.trained_at.desc()) \
+        .limit(limit).all()
+
+
+def warm_up(app, limit):
+    """Load the models of the most recently trained experiments into the model cache.
+
+    Run in the master before forking, the loaded models are inherited by every
+    worker. Returns the ids of the experiments that were loaded.
+    """
+    from project.ml.conduct_experiment import ConductExperiment
+
+    loaded = []
+    if limit <= 0:
+        return loaded
+    with app.app_context():
+        for experiment in recently_trained_experiments(limit):
+            try:
+                ConductExperiment.get_model(experiment)
+            except Exception as e:
+                app.logger.warning(f'Warm up of experiment id {experiment.id} failed: {e}')
+                continue
+            loaded.append(experiment.id)
+        # Forked workers must open their own database connections
+        db.session.remove()
+        db.engine.dispose()
+    return loaded
+
+
+def make_server_options(config, workers=None, threads=None):
+    workers = workers or config['WSGI_WORKERS']
+    threads = threads or config['WSGI_THREADS']
+    return {
+        'bind': config['WSGI_BIND'],
+        'workers': workers,
+        'threads': threads,
+        'worker_class': 'gthread' if threads > 1 else 'sync',
+        'timeout': config['WSGI_TIMEOUT'],
+        'preload_app': True
+    }
+
+
+def serve(app, workers=None, threads=None, warm_up_models=None):
+    """Serve app with pre-forked gunicorn workers, the app is loaded once in the master"""
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def __init__(self, application, options):
+            self.application = application
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return self.application
+
+    if warm_up_models is None:
+        warm_up_models = app.config['WARM_UP_MODELS']
+    loaded = warm_up(app, warm_up_models)
+    app.logger.info(f'Warmed up models of experiments {loaded}')
+
+    Server(app, make_server_options(app.config, workers=workers, threads=threads)).run()
@@ -0,0 +1,37 @@
+from project.bench import Benchmark, make_pima_dataset
+from project.ml.dataset_maker import PimaIndiansDatasetMaker
+from project.ml.environment import Locator
+from project.tests.base import BaseTestCase
+
+
+class TestBenchmark(BaseTestCase):
+    """Tests for the API benchmark suite"""
+
+    def test_make_pima_dataset(self):
+        """Ensure synthetic datasets have the Pima columns and both classes"""
+        data = make_pima_dataset(500)
+        self.assertEqual(list(data.columns), PimaIndiansDatasetMaker.features + ['outcome'])
+        self.assertEqual(len(data), 500)
+        self.assertEqual(sorted(data['outcome'].unique()), [0, 1])
+
+    def test_run_reports_every_operation(self):
+        """Ensure a run reports latency percentiles for every operation without errors"""
+        root = Locator.root
+        report = Benchmark(self.app, runs=1, requests=3, predict_batch_size=10, listing_size=50).run([300])
+
+        self.assertEqual(Locator.root, root)
+        results = report['sizes']['300']
+        for operation in ['create', 'list', 'get', 'train', 'test', 'predict', 'predict_batch']:
+            self.assertEqual(results[operation]['errors'], 0, operation)
+            for key in ['p50_ms', 'p95_ms', 'p99_ms', 'rps']:
+                self.assertIsNotNone(results[operation][key])
+        self.assertEqual(results['predict_batch']['samples_per_request'], 10)
+        self.assertIn('peak_rss_bytes', results['train_memory'])
+
+        # Ten predictions are below the compression threshold, a 50 experiment page is not
+        self.assertEqual(results['predict_batch_compressed']['gzip']['errors'], 0)
+        large_list = report['large_list']
+        self.assertEqual(large_list['experiments_per_page'], 50)
+        self.assertEqual(large_list['identity']['content_encoding'], 'identity')
+        self.assertEqual(large_list['gzip']['content_encoding'], 'gzip')
+        self.assertLess(large_list['gzip']['response_bytes'], large_list['identity']['response_bytes'])
@@ -0,0 +1,142 @@
+import io
+import json
+import os
+
+from project.api.models import Dataset, Experiment
+from project.ml.environment import Locator
+from project.tests.base import BaseTestCase
+from project.tests.test_experiments import clean_up_folders
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data')
+
+
+def dataset_files():
+    return sorted(os.path.join(dir_path, file_name) for dir_path, _, file_names in os.walk(Locator.get_dataset_dir())
+                  for file_name in file_names)
+
+
+class TestBulk(BaseTestCase):
+    """Tests for bulk experiment creation and training"""
+
+    def bulk_add(self, items):
+        return self.client.post('/experiments/bulk', content_type='multipart/form-data', data={
+            'experiments': json.dumps(items),
+            'train': (open(os.path.join(DATA_DIR, 'train.csv'), 'rb'), 'train.csv'),
+            'test': (open(os.path.join(DATA_DIR, 'test.csv'), 'rb'), 'test.csv')
+        })
+
+    def test_bulk_add_experiments(self):
+        """Ensure many experiments are added at once, sharing the files uploaded once"""
+        items = [{'name': f'LR_sweep_{index}', 'type': 'classification', 'hyperparams': {'C': c},
+                  'train_data_file': 'train', 'test_data_file': 'test'}
+                 for index, c in enumerate([0.1, 1.0, 10.0])]
+        with self.client:
+            response = self.bulk_add(items)
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 201)
+            self.assertIn('3 Experiments added!', data['message'])
+            ids = [entry['id'] for entry in data['experiments']]
+            self.assertEqual(len(set(ids)), 3)
+
+            experiments = Experiment.query.filter(Experiment.id.in_(ids)).order_by(Experiment.id).all()
+            self.assertEqual([experiment.hyperparams['C'] for experiment in experiments], [0.1, 1.0, 10.0])
+            self.assertEqual(Dataset.query.filter_by(sha256=experiments[0].train_data_sha256).first().refcount, 3)
+
+            # Datasets already stored are referenced by hash, no upload needed
+            response = self.client.post('/experiments/bulk', content_type='application/json', data=json.dumps({
+                'experiments': [{'name': 'LR_by_hash', 'type': 'classification',
+                                 'train_data': 'train.csv', 'train_data_sha256': experiments[0].train_data_sha256,
+                                 'test_data': 'test.csv', 'test_data_sha256': experiments[0].test_data_sha256}]
+            }))
+            self.assertEqual(response.status_code, 201)
+            ids.append(json.loads(response.data.decode())['experiments'][0]['id'])
+            self.assertEqual(Dataset.query.filter_by(sha256=experiments[0].train_data_sha256).first().refcount, 4)
+
+            response = self.client.get(f'/experiments/{ids[-1]}')
+            self.assertEqual(json.loads(response.data.decode())['data']['train_data'], 'train.csv')
+        clean_up_folders(ids)
+
+    def test_bulk_add_experiments_invalid(self):
+        """Ensure one invalid item rejects the whole request with a status per item"""
+        with self.client:
+            response = self.bulk_add([{'name': 'LR_sweep', 'type': 'classification',
+                                       'train_data_file': 'train', 'test_data_file': 'test'}])
+            experiment_id = json.loads(response.data.decode())['experiments'][0]['id']
+
+            response = self.bulk_add([
+                {'name': 'LR_new', 'type': 'classification', 'train_data_file': 'train', 'test_data_file': 'test'},
+                {'name': 'LR_sweep', 'type': 'classification', 'train_data_file': 'train', 'test_data_file': 'test'},
+                {'name': 'LR_new', 'type': 'classification', 'train_data_file': 'train', 'test_data_file': 'test'},
+                {'name': 'LR_other', 'type': 'classification', 'train_data_file': 'missing',
+                 'test_data_file': 'test'},
+                {'name': 'LR_hash', 'type': 'classification', 'train_data': 'train.csv', 'train_data_sha256': '0' * 64,
+                 'test_data_file': 'test'},
+                {'name': 'LR_bad_c', 'type': 'classification', 'hyperparams': {'C': -1},
+                 'train_data_file': 'train', 'test_data_file': 'test'}
+            ])
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual([entry['status'] for entry in data['experiments']],
+                             ['success', 'fail', 'fail', 'fail', 'fail', 'fail'])
+            self.assertIn('exists', data['experiments'][1]['message'])
+            self.assertIn('repeated', data['experiments'][2]['message'])
+            self.assertIn('No file uploaded as missing', data['experiments'][3]['message'])
+            self.assertIn('Not Found', data['experiments'][4]['message'])
+            self.assertIn('C must be a number > 0', data['experiments'][5]['message'])
+            self.assertEqual(Experiment.query.count(), 1)
+
+            response = self.client.post('/experiments/bulk', content_type='application/json',
+                                        data=json.dumps({'experiments': []}))
+            self.assertEqual(response.status_code, 400)
+        clean_up_folders([experiment_id])
+
+    def test_bulk_add_upload_error_leaves_no_files(self):
+        """Ensure a file failing to upload removes the files the other uploads of the request staged"""
+        train_file_path = os.path.join(DATA_DIR, 'train.csv')
+        stored_files = dataset_files()
+        max_upload_bytes = self.app.config['MAX_UPLOAD_BYTES']
+        self.app.config['MAX_UPLOAD_BYTES'] = os.path.getsize(train_file_path)
+        try:
+            with self.client:
+                response = self.client.post('/experiments/bulk', content_type='multipart/form-data', data={
+                    'experiments': json.dumps([{'name': 'LR_sweep', 'type': 'classification',
+                                                'train_data_file': 'train', 'test_data_file': 'test'}]),
+                    'train': (open(train_file_path, 'rb'), 'train.csv'),
+                    'test': (io.BytesIO(b'0' * (os.path.getsize(train_file_path) + 1)), 'test.csv')
+                })
+                self.assertEqual(response.status_code, 413)
+        finally:
+            self.app.config['MAX_UPLOAD_BYTES'] = max_upload_bytes
+        self.assertEqual(Experiment.query.count(), 0)
+        self.assertEqual(dataset_files(), stored_files)
+
+    def test_bulk_train(self):
+        """Ensure bulk train submits a job per experiment and reports each one"""
+        with self.client:
+            response = self.bulk_add([{'name': f'LR_sweep_{index}', 'type': 'classification',
+                                       'train_data_file': 'train', 'test_data_file': 'test'} for index in range(2)])
+            ids = [entry['id'] for entry in json.loads(response.data.decode())['experiments']]
+
+            response = self.client.post('/experiments/bulk/train', content_type='application/json',
+                                        data=json.dumps({'ids': ids + [1000]}))
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 202)
+            self.assertIn('2 Training Jobs Submitted!', data['message'])
+            self.assertEqual([entry['status'] for entry in data['experiments']], ['success', 'success', 'fail'])
+            self.assertIn('Experiment id 1000 Not Found!', data['experiments'][2]['message'])
+            for entry in data['experiments'][:2]:
+                self.assertEqual(entry['cache'], 'miss')
+                response = self.client.get(f'/experiments/jobs/{entry["job_id"]}')
+                self.assertIn('done', json.loads(response.data.decode())['data']['status'])
+
+            response = self.client.post('/experiments/bulk/train', content_type='application/json',
+                                        data=json.dumps({'ids': ids}))
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([entry['cache'] for entry in data['experiments']], ['hit', 'hit'])
+
+            response = self.client.post('/experiments/bulk/train', content_type='application/json',
+                                        data=json.dumps({'ids': 'all'}))
+            self.assertEqual(response.status_code, 400)
+        clean_up_folders(ids)
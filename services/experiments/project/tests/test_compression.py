@@ -0,0 +1,74 @@
+import gzip
+import json
+import unittest
+
+from project import db
+from project.api.models import Experiment
+from project.compression import ResponseCompressor, parse_accept_encoding
+from project.tests.base import BaseTestCase
+
+
+class TestAcceptEncoding(unittest.TestCase):
+
+    def test_parse_accept_encoding(self):
+        """Ensure codings are parsed with their quality"""
+        self.assertEqual(parse_accept_encoding('gzip, deflate;q=0.5, br;q=bad'),
+                         {'gzip': 1.0, 'deflate': 0.5, 'br': 0.0})
+
+    def test_choose_encoding(self):
+        """Ensure the best accepted encoding is chosen and refusals are honoured"""
+        compressor = ResponseCompressor()
+        self.assertEqual(compressor.choose_encoding('gzip'), 'gzip')
+        self.assertEqual(compressor.choose_encoding('*'), compressor.encodings[0])
+        self.assertIsNone(compressor.choose_encoding('gzip;q=0, br'))
+        self.assertIsNone(compressor.choose_encoding('identity'))
+        self.assertIsNone(compressor.choose_encoding(None))
+
+
+class TestResponseCompression(BaseTestCase):
+    """Tests for compressed API responses"""
+
+    def add_experiments(self, count):
+        db.session.add_all([Experiment(name=f'LR_test_{i}', type='classification') for i in range(count)])
+        db.session.commit()
+
+    def test_large_response_is_compressed(self):
+        """Ensure a large listing is gzipped for a client accepting gzip"""
+        self.add_experiments(50)
+        plain = self.client.get('/experiments')
+        response = self.client.get('/experiments', headers={'Accept-Encoding': 'gzip'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertEqual(int(response.headers['Content-Length']), len(response.data))
+        self.assertLess(len(response.data), len(plain.data))
+        self.assertEqual(json.loads(gzip.decompress(response.data).decode()), json.loads(plain.data.decode()))
+
+    def test_compressed_response_has_its_own_etag(self):
+        """Ensure every encoding of a listing is tagged apart and revalidated with its own ETag"""
+        self.add_experiments(50)
+        plain = self.client.get('/experiments')
+        response = self.client.get('/experiments', headers={'Accept-Encoding': 'gzip'})
+
+        self.assertEqual(response.headers['ETag'], plain.headers['ETag'][:-1] + '-gzip"')
+        response = self.client.get('/experiments', headers={'Accept-Encoding': 'gzip',
+                                                            'If-None-Match': response.headers['ETag']})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+        response = self.client.get('/experiments', headers={'If-None-Match': plain.headers['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    def test_small_response_is_not_compressed(self):
+        """Ensure responses below the threshold or to clients without gzip are sent as they are"""
+        self.add_experiments(50)
+        response = self.client.get('/experiments/1', headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(json.loads(response.data.decode())['status'], 'success')
+
+        response = self.client.get('/experiments')
+        self.assertNotIn('Content-Encoding', response.headers)
+
+
+if __name__ == '__main__':
+    unittest.main()
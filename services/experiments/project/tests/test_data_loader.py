@@ -0,0 +1,87 @@
+import mmap
+import os
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from project.ml.data_loader import DataLoader
+
+
+def is_mapped(array):
+    while array is not None:
+        if isinstance(array, (np.memmap, mmap.mmap)):
+            return True
+        array = getattr(array, 'base', None)
+    return False
+
+
+class TestDataLoader(unittest.TestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.data_file_path = os.path.join(self.data_dir, 'train.csv')
+        shutil.copy(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'train.csv'),
+                    self.data_file_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir)
+
+    def test_load_csv_writes_sidecar(self):
+        """Ensure the first csv load leaves a .npy sidecar next to the file"""
+        DataLoader.load(self.data_file_path)
+
+        for sidecar_path in DataLoader.get_sidecar_paths(self.data_file_path):
+            self.assertTrue(os.path.exists(sidecar_path))
+
+    def test_load_csv_from_sidecar_matches_csv(self):
+        """Ensure data served from the sidecar equals the parsed csv"""
+        parsed = DataLoader.load(self.data_file_path)
+        mapped = DataLoader.load(self.data_file_path)
+
+        pd.testing.assert_frame_equal(parsed, mapped)
+
+    def test_load_csv_maps_columns_in_their_dtypes(self):
+        """Ensure int and float columns are both served from the mapping, without a cast copy"""
+        parsed = DataLoader.load(self.data_file_path)
+        mapped = DataLoader.load(self.data_file_path)
+
+        self.assertGreater(len(set(parsed.dtypes)), 1)
+        self.assertEqual(list(mapped.dtypes), list(parsed.dtypes))
+        for column in mapped.columns:
+            self.assertTrue(is_mapped(mapped[column].to_numpy()))
+
+    def test_concurrent_first_loads_write_one_sidecar(self):
+        """Ensure loads racing to write the sidecar leave one complete sidecar and no part files"""
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(DataLoader.load, [self.data_file_path] * 8))
+
+        self.assertEqual([name for name in os.listdir(self.data_dir) if name.endswith('.part')], [])
+        pd.testing.assert_frame_equal(DataLoader.load(self.data_file_path), pd.read_csv(self.data_file_path))
+
+    def test_load_csv_invalidates_stale_sidecar(self):
+        """Ensure rewriting the csv invalidates its sidecar"""
+        DataLoader.load(self.data_file_path)
+
+        with open(self.data_file_path, 'a') as data_file:
+            data_file.write('\n1,2,3,4,5,6.0,0.5,7,1\n')
+
+        data = DataLoader.load(self.data_file_path)
+        pd.testing.assert_frame_equal(data, pd.read_csv(self.data_file_path))
+
+    def test_iter_csv_parses_text_when_sidecar_is_corrupt(self):
+        """Ensure a sidecar whose array cannot be read falls back to parsing the csv"""
+        DataLoader.load(self.data_file_path)
+        array_file_path, _ = DataLoader.get_sidecar_paths(self.data_file_path)
+        with open(array_file_path, 'wb') as array_file:
+            array_file.write(b'not an array')
+
+        data = pd.concat(DataLoader.iter_csv(self.data_file_path, 100), ignore_index=True)
+        pd.testing.assert_frame_equal(data, pd.read_csv(self.data_file_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import os
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from project.ml.dataset_maker import PimaIndiansDatasetMaker
+from project.ml.dataset_profiler import DatasetProfiler, check_schema
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data')
+
+
+def profile_bytes(data, chunk_size):
+    profiler = DatasetProfiler()
+    for start in range(0, len(data), chunk_size):
+        profiler.update(data[start:start + chunk_size])
+    return profiler.finish()
+
+
+class TestDatasetProfiler(unittest.TestCase):
+
+    def test_profile_matches_pandas(self):
+        """Ensure the streamed statistics equal those of the parsed file, whatever the chunk size"""
+        file_path = os.path.join(DATA_DIR, 'pima-indians-diabetes_train_dataset_1.csv')
+        with open(file_path, 'rb') as data_file:
+            data = data_file.read()
+        expected = pd.read_csv(file_path)
+
+        for chunk_size in [7, 100, len(data)]:
+            profile = profile_bytes(data, chunk_size)
+            self.assertIsNone(profile['error'])
+            self.assertEqual(profile['rows'], len(expected))
+            self.assertEqual([column['name'] for column in profile['columns']], list(expected.columns))
+            for column in profile['columns']:
+                values = expected[column['name']]
+                self.assertEqual(column['count'], values.count())
+                self.assertEqual(column['nulls'], 0)
+                self.assertAlmostEqual(column['min'], values.min())
+                self.assertAlmostEqual(column['max'], values.max())
+                self.assertAlmostEqual(column['mean'], values.mean())
+            self.assertEqual(profile['label']['classes'],
+                             {str(label): count for label, count in expected.iloc[:, -1].value_counts().items()})
+
+    def test_nulls_and_non_numeric_values(self):
+        """Ensure missing and non numeric values are counted and left out of min, max and mean"""
+        profile = profile_bytes(b'a,b,label\n1,x,yes\n,2,no\n3,4,yes', 5)
+        a, b, label = profile['columns']
+        self.assertEqual(profile['rows'], 3)
+        self.assertEqual((a['count'], a['nulls'], a['mean']), (2, 1, 2.0))
+        self.assertEqual((b['non_numeric'], b['min'], b['max']), (1, 2.0, 4.0))
+        self.assertEqual((label['non_numeric'], label['mean']), (3, None))
+        self.assertEqual(profile['label'], {'name': 'label', 'classes': {'yes': 2, 'no': 1}})
+
+    def test_too_many_classes(self):
+        """Ensure the class balance of a continuous label is dropped instead of growing"""
+        data = ('x,y\n' + ''.join(f'{value},{value / 7}\n' for value in range(500))).encode()
+        profile = profile_bytes(data, 64)
+        self.assertEqual(profile['rows'], 500)
+        self.assertIsNone(profile['label']['classes'])
+
+    def test_unparsable_file(self):
+        """Ensure a malformed file is reported instead of failing the upload"""
+        profile = profile_bytes(b'a,b\n1,2\n1,2,3,4\n', 100)
+        self.assertIsNotNone(profile['error'])
+
+    def test_check_schema(self):
+        """Ensure the column count and numeric features are checked against a dataset maker"""
+        features = PimaIndiansDatasetMaker.features
+        header = ','.join(features + ['outcome'])
+        profile = profile_bytes(f'{header}\n1,2,3,4,5,6,7,8,1\n'.encode(), 100)
+        self.assertTrue(check_schema(profile, features)['valid'])
+
+        profile = profile_bytes(b'a,b\n1,2\n', 100)
+        schema = check_schema(profile, features)
+        self.assertFalse(schema['valid'])
+        self.assertIn('Expected 8 feature columns and a label, found 2 columns', schema['errors'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+import json
+import os
+
+from project import db
+from project.api.models import Dataset
+from project.datasets import DatasetStore
+from project.ml.data_loader import DataLoader
+from project.ml.environment import Locator
+from project.tests.base import BaseTestCase
+from project.tests.test_experiments import clean_up_folders
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data')
+
+
+class TestDatasets(BaseTestCase):
+    """Tests for the content-addressed dataset store"""
+
+    def add(self, name, train_file='train.csv', test_file='test.csv'):
+        response = self.client.post('/experiments', content_type='multipart/form-data', data={
+            'name': name,
+            'type': 'classification',
+            'train_data': (open(os.path.join(DATA_DIR, train_file), 'rb'), train_file),
+            'test_data': (open(os.path.join(DATA_DIR, test_file), 'rb'), test_file)
+        })
+        self.assertEqual(response.status_code, 201)
+        experiment_id = json.loads(response.data.decode())['id']
+        return json.loads(self.client.get(f'/experiments/{experiment_id}').data.decode())['data']
+
+    def refcount(self, sha256):
+        dataset = Dataset.query.filter_by(sha256=sha256).first()
+        return dataset.refcount if dataset else None
+
+    def test_same_upload_is_stored_once(self):
+        """Ensure experiments uploading the same file link to one blob"""
+        with self.client:
+            first = self.add('LR_first')
+            second = self.add('LR_second')
+            self.assertEqual(first['train_data_sha256'], second['train_data_sha256'])
+            self.assertEqual(self.refcount(first['train_data_sha256']), 2)
+
+            blob_path = DatasetStore.get_blob_path(first['train_data_sha256'])
+            for experiment in [first, second]:
+                locator = Locator(experiment['id'], experiment['train_data'], experiment['test_data'])
+                self.assertEqual(os.path.realpath(locator.get_train_data_file_path()), blob_path)
+
+            # Parsed forms are derived per content, the second experiment reuses the first one's
+            first_locator = Locator(first['id'], first['train_data'], first['test_data'])
+            DataLoader.load(first_locator.get_train_data_file_path())
+            second_locator = Locator(second['id'], second['train_data'], second['test_data'])
+            self.assertEqual(DataLoader.get_sidecar_paths(second_locator.get_train_data_file_path()),
+                             DataLoader.get_sidecar_paths(blob_path))
+            self.assertTrue(os.path.exists(DataLoader.get_sidecar_paths(blob_path)[0]))
+
+            self.client.delete(f'/experiments/{first["id"]}')
+            self.assertEqual(self.refcount(first['train_data_sha256']), 1)
+            self.assertTrue(os.path.exists(blob_path))
+
+            self.client.delete(f'/experiments/{second["id"]}')
+            self.assertIsNone(self.refcount(first['train_data_sha256']))
+            self.assertFalse(os.path.exists(blob_path))
+            self.assertFalse(os.path.exists(DataLoader.get_sidecar_paths(blob_path)[0]))
+
+    def test_update_releases_replaced_dataset(self):
+        """Ensure replacing the data of an experiment drops the reference to the old data"""
+        with self.client:
+            experiment = self.add('LR_test', train_file='train.csv', test_file='test.csv')
+            old_sha256 = experiment['test_data_sha256']
+            response = self.client.put(f'/experiments/{experiment["id"]}', content_type='multipart/form-data',
+                                       data={
+                                           'name': 'LR_test',
+                                           'type': 'classification',
+                                           'result': '',
+                                           'start_date': '2019-01-01 00:00:00.000000',
+                                           'train_data': (open(os.path.join(DATA_DIR, 'train.csv'), 'rb'),
+                                                          'train.csv'),
+                                           'test_data': (open(os.path.join(DATA_DIR, 'train.csv'), 'rb'),
+                                                         'test.csv')
+                                       })
+            self.assertEqual(response.status_code, 200)
+            self.assertIsNone(self.refcount(old_sha256))
+            self.assertFalse(os.path.exists(DatasetStore.get_blob_path(old_sha256)))
+            self.assertEqual(self.refcount(experiment['train_data_sha256']), 2)
+        clean_up_folders([experiment['id']])
+
+    def test_failed_update_keeps_data_files(self):
+        """Ensure an update whose test file fails leaves the experiment's train file linked as before"""
+        with self.client:
+            experiment = self.add('LR_test', train_file='train.csv', test_file='test.csv')
+            locator = Locator(experiment['id'], experiment['train_data'], experiment['test_data'])
+            train_blob_path = os.path.realpath(locator.get_train_data_file_path())
+            staged = os.listdir(os.path.join(Locator.get_dataset_dir(), 'staging'))
+            max_upload_bytes = self.app.config['MAX_UPLOAD_BYTES']
+            self.app.config['MAX_UPLOAD_BYTES'] = os.path.getsize(os.path.join(DATA_DIR, 'test.csv'))
+            try:
+                response = self.client.put(f'/experiments/{experiment["id"]}', content_type='multipart/form-data',
+                                           data={
+                                               'name': 'LR_test',
+                                               'type': 'classification',
+                                               'result': '',
+                                               'start_date': '2019-01-01 00:00:00.000000',
+                                               'train_data': (open(os.path.join(DATA_DIR, 'test.csv'), 'rb'),
+                                                              'train.csv'),
+                                               'test_data': (open(os.path.join(DATA_DIR, 'train.csv'), 'rb'),
+                                                             'test.csv')
+                                           })
+            finally:
+                self.app.config['MAX_UPLOAD_BYTES'] = max_upload_bytes
+            self.assertEqual(response.status_code, 413)
+            self.assertEqual(os.path.realpath(locator.get_train_data_file_path()), train_blob_path)
+            self.assertEqual(self.refcount(experiment['train_data_sha256']), 1)
+            self.assertEqual(os.listdir(os.path.join(Locator.get_dataset_dir(), 'staging')), staged)
+        clean_up_folders([experiment['id']])
+
+    def test_acquire_inserts_or_counts(self):
+        """Ensure acquiring upserts the dataset row and keeps the first profile"""
+        sha256 = 'ab' * 32
+        DatasetStore.acquire(sha256, 10)
+        DatasetStore.acquire(sha256, 10, count=2, profile={'rows': 1})
+        DatasetStore.acquire(sha256, 10, profile={'rows': 2})
+        db.session.commit()
+
+        dataset = Dataset.query.get(sha256)
+        self.assertEqual(dataset.refcount, 4)
+        self.assertEqual(dataset.profile, {'rows': 1})
+
+    def test_purge_keeps_blob_acquired_again(self):
+        """Ensure a purge only removes blobs whose refcount is still zero under the row lock"""
+        staged_file_path = DatasetStore.get_staging_path()
+        with open(staged_file_path, 'w') as staged_file:
+            staged_file.write('a,b\n1,2\n')
+        sha256 = 'cd' * 32
+        DatasetStore.acquire(sha256, 8)
+        blob_path = DatasetStore.store(staged_file_path, sha256)
+        DatasetStore.release(sha256)
+        db.session.commit()
+
+        DatasetStore.acquire(sha256, 8)
+        db.session.commit()
+        self.assertEqual(DatasetStore.purge([sha256]), [])
+        self.assertTrue(os.path.exists(blob_path))
+
+        DatasetStore.release(sha256)
+        db.session.commit()
+        self.assertEqual(DatasetStore.purge([sha256]), [sha256])
+        self.assertFalse(os.path.exists(blob_path))
+        self.assertIsNone(self.refcount(sha256))
+
+    def test_profile(self):
+        """Ensure the profile computed during the upload is served for the experiment"""
+        with self.client:
+            experiment = self.add('LR_test')
+            response = self.client.get(f'/experiments/{experiment["id"]}/profile')
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 200)
+            train_profile = data['data']['train_data']
+            self.assertEqual(train_profile['sha256'], experiment['train_data_sha256'])
+            self.assertEqual(train_profile['rows'], 3)
+            self.assertEqual(len(train_profile['columns']), 9)
+            self.assertTrue(train_profile['schema']['valid'])
+            self.assertEqual(sum(train_profile['label']['classes'].values()), train_profile['rows'])
+            self.assertEqual(data['data']['test_data']['sha256'], experiment['test_data_sha256'])
+
+            response = self.client.get('/experiments/1000/profile')
+            self.assertEqual(response.status_code, 404)
+        clean_up_folders([experiment['id']])
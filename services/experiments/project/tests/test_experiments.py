@@ -1,15 +1,21 @@
 import os
+import hashlib
 import json
+import time
 import unittest
 from typing import Text
+from unittest import mock
 from datetime import datetime
 from flask import jsonify
 from werkzeug.datastructures import CombinedMultiDict, MultiDict, FileMultiDict
 from project.tests.base import BaseTestCase
 from project.ml.environment import Locator
+from project.ml.dataset_maker import PimaIndiansDatasetMaker
 
 from project import db
+from project.jobs import job_queue
 from project.api.experiments import Experiment
+from project.api.models import Job
 
 
 def add_experiment(name: Text, type: Text, train_data_filename: Text, test_data_filename: Text, train_data, test_data):
@@ -20,6 +26,7 @@ def add_experiment(name: Text, type: Text, train_data_filename: Text, test_data_
     experiment_locator = Locator(experiment.id,
                                  train_data_filename=train_data_filename,
                                  test_data_filename=test_data_filename)
+    experiment_locator.create_experiment_folders()
 
     with open(os.path.join(experiment_locator.get_train_data_dir(), train_data_filename), 'wb') as copied_train_data:
         for line in train_data.readlines():
@@ -63,10 +70,31 @@ def get_svm_test_experiment():
     return svm_test_experiment
 
 
+def get_pima_test_experiment():
+    train_data = open(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data',
+                                   'pima-indians-diabetes_train_dataset_1.csv'), 'rb')
+    test_data = open(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data',
+                                  'pima-indians-diabetes_test_dataset_1.csv'), 'rb')
+
+    pima_test_experiment = add_experiment(name="LR_pima",
+                                          type="classification",
+                                          train_data_filename='pima_train.csv',
+                                          train_data=train_data,
+                                          test_data_filename='pima_test.csv',
+                                          test_data=test_data, )
+
+    return pima_test_experiment
+
+
 def clean_up_folders(ids):
     _ = [Locator.delete_experiment_folders(i) for i in ids]
 
 
+def kill_worker(job_id):
+    # Stands in for a pool worker killed while running a job, e.g. by the OOM killer
+    os._exit(1)
+
+
 class TestUserService(BaseTestCase):
     """Tests for the Experiments Service"""
 
@@ -211,6 +239,124 @@ class TestUserService(BaseTestCase):
             self.assertIn('fail', data['status'])
         clean_up_folders([lr_experiment.id])
 
+    def test_add_experiment_records_data_checksums(self):
+        """Ensure uploaded data files are hashed while they are saved"""
+        train_file = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'train.csv')
+        test_file = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'test.csv')
+
+        with self.client:
+            response = self.client.post(
+                '/experiments',
+                content_type='multipart/form-data',
+                data = {
+                    'name': 'LR_Test',
+                    'type': 'classification',
+                    'train_data': (open(train_file, 'rb'), os.path.basename(train_file)),
+                    'test_data': (open(test_file, 'rb'), os.path.basename(test_file)),
+                })
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 201)
+            experiment_id = data['id']
+
+            response = self.client.get(f'/experiments/{experiment_id}')
+            data = json.loads(response.data.decode())
+            with open(train_file, 'rb') as train_data:
+                self.assertEqual(data['data']['train_data_sha256'], hashlib.sha256(train_data.read()).hexdigest())
+            self.assertEqual(data['data']['test_data_size'], os.path.getsize(test_file))
+        clean_up_folders([experiment_id])
+
+    def test_add_experiment_upload_too_large(self):
+        """Ensure data files above MAX_UPLOAD_BYTES are rejected"""
+        train_file = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'train.csv')
+        test_file = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'test.csv')
+        max_upload_bytes = self.app.config['MAX_UPLOAD_BYTES']
+        self.app.config['MAX_UPLOAD_BYTES'] = 16
+        try:
+            with self.client:
+                response = self.client.post(
+                    '/experiments',
+                    content_type='multipart/form-data',
+                    data = {
+                        'name': 'LR_Test',
+                        'type': 'classification',
+                        'train_data': (open(train_file, 'rb'), os.path.basename(train_file)),
+                        'test_data': (open(test_file, 'rb'), os.path.basename(test_file)),
+                    })
+                data = json.loads(response.data.decode())
+                self.assertEqual(response.status_code, 413)
+                self.assertIn('Upload exceeds the 16 bytes limit', data['message'])
+                self.assertIn('fail', data['status'])
+                self.assertEqual(Experiment.query.count(), 0)
+        finally:
+            self.app.config['MAX_UPLOAD_BYTES'] = max_upload_bytes
+
+    def test_add_experiment_from_chunked_uploads(self):
+        """Ensure experiments can be created from resumable chunked uploads"""
+        upload_ids = {}
+        for data_file in ['train', 'test']:
+            with open(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', f'{data_file}.csv'), 'rb') as f:
+                content = f.read()
+
+            with self.client:
+                response = self.client.post(
+                    '/experiments/uploads',
+                    content_type='application/json',
+                    data=json.dumps({'filename': f'chunked_{data_file}.csv'})
+                )
+                data = json.loads(response.data.decode())
+                self.assertEqual(response.status_code, 201)
+                upload_id = data['data']['upload_id']
+
+                middle = len(content) // 2
+                response = self.client.put(f'/experiments/uploads/{upload_id}?offset=0', data=content[:middle])
+                data = json.loads(response.data.decode())
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(data['offset'], middle)
+
+                response = self.client.put(f'/experiments/uploads/{upload_id}?offset=0', data=content[middle:])
+                data = json.loads(response.data.decode())
+                self.assertEqual(response.status_code, 409)
+                self.assertEqual(data['offset'], middle)
+
+                response = self.client.put(f'/experiments/uploads/{upload_id}?offset={middle}',
+                                           data=content[middle:],
+                                           headers={'X-Chunk-SHA256': hashlib.sha256(content[middle:]).hexdigest()})
+                self.assertEqual(response.status_code, 200)
+
+                response = self.client.post(
+                    f'/experiments/uploads/{upload_id}/complete',
+                    content_type='application/json',
+                    data=json.dumps({'sha256': hashlib.sha256(content).hexdigest()})
+                )
+                data = json.loads(response.data.decode())
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(data['data']['completed'])
+                self.assertEqual(data['data']['size'], len(content))
+                upload_ids[data_file] = upload_id
+
+        with self.client:
+            response = self.client.post(
+                '/experiments',
+                content_type='multipart/form-data',
+                data = {
+                    'name': 'LR_Test',
+                    'type': 'classification',
+                    'train_data_upload_id': upload_ids['train'],
+                    'test_data_upload_id': upload_ids['test'],
+                })
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 201)
+            experiment_id = data['id']
+
+            response = self.client.get(f'/experiments/{experiment_id}')
+            data = json.loads(response.data.decode())
+            self.assertIn('chunked_train.csv', data['data']['train_data'])
+            self.assertIn('chunked_test.csv', data['data']['test_data'])
+
+            response = self.client.get(f'/experiments/uploads/{upload_ids["train"]}')
+            self.assertEqual(response.status_code, 404)
+        clean_up_folders([experiment_id])
+
     def test_get_single_experiment(self):
         """Ensure get single experiement behaves properly"""
         lr_experiment = get_lr_test_experiment()
@@ -266,6 +412,91 @@ class TestUserService(BaseTestCase):
             self.assertIn("No Data found in Experiments Table!", data['message'])
             self.assertIn("fail", data['status'])
 
+    def test_get_all_experiments_paginated(self):
+        """Ensure listing experiments pages with limit and after_id"""
+        lr_experiment = get_lr_test_experiment()
+        svm_experiment = get_svm_test_experiment()
+        with self.client:
+            response = self.client.get('/experiments?limit=1')
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(data['data']['experiments']), 1)
+            self.assertIn('LR_test', data['data']['experiments'][0]['name'])
+            self.assertEqual(data['data']['next_after_id'], lr_experiment.id)
+
+            response = self.client.get(f'/experiments?limit=1&after_id={data["data"]["next_after_id"]}')
+            data = json.loads(response.data.decode())
+            self.assertEqual(len(data['data']['experiments']), 1)
+            self.assertIn('SVM_test', data['data']['experiments'][0]['name'])
+            self.assertEqual(data['data']['next_after_id'], svm_experiment.id)
+
+            response = self.client.get(f'/experiments?limit=1&after_id={svm_experiment.id}')
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(data['data']['experiments'], [])
+            self.assertIsNone(data['data']['next_after_id'])
+        clean_up_folders([lr_experiment.id, svm_experiment.id])
+
+    def test_get_all_experiments_filtered_and_projected(self):
+        """Ensure listing experiments filters and projects fields"""
+        lr_experiment = get_lr_test_experiment()
+        svm_experiment = get_svm_test_experiment()
+        svm_experiment.type = 'svm_classification'
+        db.session.commit()
+        with self.client:
+            response = self.client.get('/experiments?name_prefix=SVM_&fields=name,type')
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(data['data']['experiments'],
+                             [{'id': svm_experiment.id, 'name': 'SVM_test', 'type': 'svm_classification'}])
+
+            response = self.client.get('/experiments?type=classification&fields=name')
+            data = json.loads(response.data.decode())
+            self.assertEqual([e['name'] for e in data['data']['experiments']], ['LR_test'])
+
+            response = self.client.get('/experiments?name_prefix=LR%25')
+            data = json.loads(response.data.decode())
+            self.assertEqual(data['data']['experiments'], [])
+
+            response = self.client.get('/experiments?start_date_from=2999-01-01')
+            data = json.loads(response.data.decode())
+            self.assertEqual(data['data']['experiments'], [])
+
+            response = self.client.get('/experiments?start_date_to=2999-01-01T00:00:00&fields=result')
+            data = json.loads(response.data.decode())
+            self.assertEqual(len(data['data']['experiments']), 2)
+            self.assertEqual(sorted(data['data']['experiments'][0]), ['id', 'result'])
+        clean_up_folders([lr_experiment.id, svm_experiment.id])
+
+    def test_get_all_experiments_invalid_query(self):
+        """Ensure invalid listing parameters are rejected"""
+        with self.client:
+            for query in ['limit=0', 'limit=abc', 'after_id=x', 'fields=name,secret', 'start_date_from=yesterday']:
+                response = self.client.get(f'/experiments?{query}')
+                data = json.loads(response.data.decode())
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('Invalid experiments query!', data['message'])
+                self.assertIn('fail', data['status'])
+
+    def test_get_all_experiments_etag(self):
+        """Ensure an unchanged listing is answered with 304 Not Modified"""
+        lr_experiment = get_lr_test_experiment()
+        with self.client:
+            response = self.client.get('/experiments')
+            etag = response.headers['ETag']
+            self.assertEqual(response.status_code, 200)
+
+            response = self.client.get('/experiments', headers={'If-None-Match': etag})
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.data, b'')
+
+            lr_experiment.name = 'LR_test_v2'
+            db.session.commit()
+            response = self.client.get('/experiments', headers={'If-None-Match': etag})
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response.headers['ETag'], etag)
+        clean_up_folders([lr_experiment.id])
+
     def test_update_single_experiment(self):
         """Ensure Update single experiment details behaves propoerly """
 
@@ -363,12 +594,28 @@ class TestUserService(BaseTestCase):
         with self.client:
             response = self.client.post(f'/experiments/train/{lr_experiment.id}')
             data = json.loads(response.data.decode())
-            train_result = json.loads(data['result'])
+            self.assertEqual(response.status_code, 202)
+            self.assertIn('Experiment id 1 Training Job Submitted!', data['message'])
+            self.assertIn('success', data['status'])
+
+            response = self.client.get(f'/experiments/jobs/{data["job_id"]}')
+            data = json.loads(response.data.decode())
+            train_result = data['data']['result']
             train_accuracy = train_result[0]['train_accuracy']
             self.assertEqual(round(train_accuracy, 3), 1.0)
             self.assertEqual(response.status_code, 200)
-            self.assertIn('Experiment id 1 Trained!', data['message'])
+            self.assertIn('done', data['data']['status'])
             self.assertIn('success', data['status'])
+
+            response = self.client.get(f'/experiments/{lr_experiment.id}')
+            data = json.loads(response.data.decode())['data']
+            model_file_path = Locator(lr_experiment.id, lr_experiment.train_data,
+                                      lr_experiment.test_data).get_model_file_path()
+            self.assertTrue(data['trained'])
+            self.assertIsNotNone(data['trained_at'])
+            self.assertEqual(data['model_sha256'],
+                             hashlib.sha256(open(model_file_path, 'rb').read()).hexdigest())
+            self.assertGreater(data['model_size'], os.path.getsize(model_file_path))
         clean_up_folders([lr_experiment.id])
 
     def test_train_experiment_invalid_id(self):
@@ -383,28 +630,443 @@ class TestUserService(BaseTestCase):
             self.assertIn('fail', data['status'])
         clean_up_folders([lr_experiment.id])
 
+    def test_train_experiment_in_worker_pool(self):
+        """Ensure a queued training job is picked up by the worker pool"""
+        lr_experiment = get_lr_test_experiment()
+        self.app.config['JOB_QUEUE_WORKERS'] = 1
+        try:
+            with self.client:
+                response = self.client.post(f'/experiments/train/{lr_experiment.id}')
+                data = json.loads(response.data.decode())
+                self.assertEqual(response.status_code, 202)
+                job_id = data['job_id']
+
+                for _ in range(300):
+                    response = self.client.get(f'/experiments/jobs/{job_id}')
+                    data = json.loads(response.data.decode())
+                    if data['data']['status'] in ['done', 'failed']:
+                        break
+                    time.sleep(0.1)
+
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('done', data['data']['status'])
+                self.assertEqual(data['data']['result'][0]['train_accuracy'], 1.0)
+                self.assertIsNotNone(data['data']['run_seconds'])
+        finally:
+            self.app.config['JOB_QUEUE_WORKERS'] = 0
+            job_queue.shutdown()
+        clean_up_folders([lr_experiment.id])
+
+    def test_dead_pool_worker_fails_its_job(self):
+        """Ensure a job whose worker dies is marked failed and the next job gets a new pool"""
+        lr_experiment = get_lr_test_experiment()
+        self.app.config['JOB_QUEUE_WORKERS'] = 1
+
+        def wait_for(job_id):
+            for _ in range(300):
+                data = json.loads(self.client.get(f'/experiments/jobs/{job_id}').data.decode())['data']
+                if data['status'] in ['done', 'failed']:
+                    return data
+                time.sleep(0.1)
+            return data
+
+        try:
+            with self.client:
+                with mock.patch('project.jobs._run_job_in_worker', kill_worker):
+                    response = self.client.post(f'/experiments/train/{lr_experiment.id}')
+                    data = wait_for(json.loads(response.data.decode())['job_id'])
+                self.assertEqual(data['status'], 'failed')
+                self.assertIn('Job worker failed', data['error'])
+
+                response = self.client.post(f'/experiments/train/{lr_experiment.id}')
+                self.assertEqual(response.status_code, 202)
+                data = wait_for(json.loads(response.data.decode())['job_id'])
+                self.assertEqual(data['status'], 'done')
+        finally:
+            self.app.config['JOB_QUEUE_WORKERS'] = 0
+            job_queue.shutdown()
+        clean_up_folders([lr_experiment.id])
+
+    def test_train_experiment_streaming(self):
+        """Ensure streaming mode trains chunk by chunk and serves predictions"""
+        lr_experiment = get_lr_test_experiment()
+        lr_experiment.training_mode = 'streaming'
+        db.session.commit()
+        with self.client:
+            response = self.client.post(f'/experiments/train/{lr_experiment.id}')
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 202)
+
+            response = self.client.get(f'/experiments/jobs/{data["job_id"]}')
+            data = json.loads(response.data.decode())
+            self.assertIn('done', data['data']['status'])
+            result = data['data']['result']
+            self.assertTrue(0.0 <= result[0]['train_accuracy'] <= 1.0)
+
+            payload = {'samples': [{
+                                    'pregnancies': 0,
+                                    'glucose': 137,
+                                    'blood_pressure': 40,
+                                    'skin_thickness': 35,
+                                    'insulin': 168,
+                                    'bmi': 43.1,
+                                    'diabetes_pedigree_function': 2.88,
+                                    'age': 33
+                                    }]
+                                }
+            response = self.client.post(
+                f'/experiments/predict/{lr_experiment.id}/batch',
+                content_type='application/json',
+                data = json.dumps(payload)
+            )
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(data['predictions']), 1)
+
+            response = self.client.get(f'/experiments/{lr_experiment.id}')
+            data = json.loads(response.data.decode())
+            self.assertIn('streaming', data['data']['training_mode'])
+        clean_up_folders([lr_experiment.id])
+
+    def test_add_experiment_invalid_training_mode(self):
+        """Ensure unknown training modes are rejected"""
+        train_file = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'train.csv')
+        test_file = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'test.csv')
+        with self.client:
+            response = self.client.post(
+                '/experiments',
+                content_type='multipart/form-data',
+                data = {
+                    'name': 'LR_Test',
+                    'type': 'classification',
+                    'training_mode': 'online',
+                    'train_data': (open(train_file, 'rb'), os.path.basename(train_file)),
+                    'test_data': (open(test_file, 'rb'), os.path.basename(test_file)),
+                })
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('Experiment LR_Test Invalid! \n Invalid training mode online', data['message'])
+            self.assertIn('fail', data['status'])
+
+    def test_get_models(self):
+        """Ensure registered models are listed with their hyperparameters"""
+        with self.client:
+            response = self.client.get('/experiments/models')
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 200)
+            models = {model['model']: model for model in data['data']['models']}
+            for key in ['logistic_regression', 'sgd_logistic_regression', 'random_forest', 'svm']:
+                self.assertIn(key, models)
+            self.assertEqual(models['random_forest']['n_jobs_param'], 'n_jobs')
+            self.assertIn('n_estimators', models['random_forest']['hyperparams'])
+            self.assertIn('success', data['status'])
+
+    def test_train_svm_experiment(self):
+        """Ensure experiments named SVM_ train with the SVM backend"""
+        svm_experiment = get_svm_test_experiment()
+        with self.client:
+            response = self.client.post(f'/experiments/train/{svm_experiment.id}')
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 202)
+
+            response = self.client.get(f'/experiments/jobs/{data["job_id"]}')
+            data = json.loads(response.data.decode())
+            self.assertIn('done', data['data']['status'])
+            self.assertIn('train_accuracy', data['data']['result'][0])
+        clean_up_folders([svm_experiment.id])
+
+    def test_add_and_train_experiment_with_explicit_model(self):
+        """Ensure the model and hyperparams form fields select the backend"""
+        train_file = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data',
+                                  'pima-indians-diabetes_train_dataset_1.csv')
+        test_file = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data',
+                                 'pima-indians-diabetes_test_dataset_1.csv')
+        with self.client:
+            response = self.client.post(
+                '/experiments',
+                content_type='multipart/form-data',
+                data = {
+                    'name': 'forest',
+                    'type': 'classification',
+                    'model': 'random_forest',
+                    'hyperparams': json.dumps({'n_estimators': 10, 'n_jobs': 2}),
+                    'train_data': (open(train_file, 'rb'), os.path.basename(train_file)),
+                    'test_data': (open(test_file, 'rb'), os.path.basename(test_file)),
+                })
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 201)
+            experiment_id = data['id']
+
+            response = self.client.post(f'/experiments/train/{experiment_id}')
+            data = json.loads(response.data.decode())
+            response = self.client.get(f'/experiments/jobs/{data["job_id"]}')
+            data = json.loads(response.data.decode())
+            self.assertIn('done', data['data']['status'])
+
+            response = self.client.get(f'/experiments/{experiment_id}')
+            data = json.loads(response.data.decode())
+            self.assertIn('random_forest', data['data']['model'])
+            self.assertEqual(data['data']['hyperparams']['n_estimators'], 10)
+        clean_up_folders([experiment_id])
+
+    def test_add_experiment_invalid_hyperparams(self):
+        """Ensure undeclared hyperparameters are rejected"""
+        train_file = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'train.csv')
+        test_file = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'test.csv')
+        with self.client:
+            response = self.client.post(
+                '/experiments',
+                content_type='multipart/form-data',
+                data = {
+                    'name': 'LR_Test',
+                    'type': 'classification',
+                    'hyperparams': json.dumps({'n_estimators': 10}),
+                    'train_data': (open(train_file, 'rb'), os.path.basename(train_file)),
+                    'test_data': (open(test_file, 'rb'), os.path.basename(test_file)),
+                })
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('Unknown hyperparameters for Logistic_Regression: n_estimators', data['message'])
+            self.assertIn('fail', data['status'])
+
+            for hyperparams, message in [({'C': 'abc'}, "C must be a number > 0, not 'abc'"),
+                                         ({'max_iter': -1}, 'max_iter must be an integer >= 1, not -1'),
+                                         ({'n_jobs': 0}, 'n_jobs must be null or a non-zero integer')]:
+                response = self.client.post(
+                    '/experiments',
+                    content_type='multipart/form-data',
+                    data = {
+                        'name': 'LR_Test',
+                        'type': 'classification',
+                        'hyperparams': json.dumps(hyperparams),
+                        'train_data': (open(train_file, 'rb'), os.path.basename(train_file)),
+                        'test_data': (open(test_file, 'rb'), os.path.basename(test_file)),
+                    })
+                data = json.loads(response.data.decode())
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(message, data['message'])
+            self.assertEqual(Experiment.query.count(), 0)
+
+    def test_get_micro_batcher_stats(self):
+        """Ensure the predict micro-batcher counters are exposed"""
+        with self.client:
+            response = self.client.get('/experiments/micro_batcher')
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('success', data['status'])
+            for key in ['enabled', 'batches', 'mean_batch_size', 'mean_batch_wait_ms', 'batch_sizes']:
+                self.assertIn(key, data['data'])
+
+    def test_get_job_invalid_id(self):
+        """Ensure getting an unknown job behaves properly"""
+        with self.client:
+            response = self.client.get('/experiments/jobs/1000')
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 404)
+            self.assertIn('Job id 1000 Not Found!', data['message'])
+            self.assertIn('fail', data['status'])
+
+    def test_tune_experiment(self):
+        """Ensure tuning runs every trial and keeps the best hyperparams"""
+        lr_experiment = get_pima_test_experiment()
+        with self.client:
+            response = self.client.post(
+                f'/experiments/tune/{lr_experiment.id}',
+                data=json.dumps({'space': {'C': [0.1, 1.0, 10.0]}, 'folds': 3}),
+                content_type='application/json'
+            )
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 202)
+            self.assertIn('Experiment id 1 Tuning Job Submitted!', data['message'])
+            self.assertEqual(data['n_trials'], 3)
+
+            response = self.client.get(f'/experiments/jobs/{data["job_id"]}')
+            data = json.loads(response.data.decode())
+            self.assertIn('done', data['data']['status'])
+            result = data['data']['result']
+            self.assertIn('train_accuracy', result[0])
+            tune_result = result[1]['tune']
+            self.assertEqual(len(tune_result['trials']), 3)
+            for trial in tune_result['trials']:
+                self.assertEqual(len(trial['fold_scores']), 3)
+            self.assertIn(tune_result['best']['hyperparams']['C'], [0.1, 1.0, 10.0])
+
+            response = self.client.get(f'/experiments/{lr_experiment.id}')
+            data = json.loads(response.data.decode())
+            self.assertEqual(data['data']['hyperparams'], tune_result['best']['hyperparams'])
+            self.assertTrue(os.path.exists(Locator(lr_experiment.id, lr_experiment.train_data,
+                                                   lr_experiment.test_data).get_model_file_path()))
+        clean_up_folders([lr_experiment.id])
+
+    def test_tune_experiment_invalid_search(self):
+        """Ensure an invalid search space is rejected"""
+        lr_experiment = get_lr_test_experiment()
+        with self.client:
+            response = self.client.post(
+                f'/experiments/tune/{lr_experiment.id}',
+                data=json.dumps({'space': {'n_estimators': [10, 20]}}),
+                content_type='application/json'
+            )
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('Unknown hyperparameters for Logistic_Regression: n_estimators', data['message'])
+            self.assertIn('fail', data['status'])
+
+            response = self.client.post(
+                f'/experiments/tune/{lr_experiment.id}',
+                data=json.dumps({'space': {'C': {'low': 0.01, 'high': 10, 'log': True}},
+                                 'search': 'random', 'n_trials': 10000}),
+                content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 400)
+
+            response = self.client.post(
+                f'/experiments/tune/{lr_experiment.id}',
+                data=json.dumps({'space': {'max_iter': {'low': 10, 'high': 100}}, 'search': 'random', 'n_trials': 2}),
+                content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('max_iter must be an integer >= 1', json.loads(response.data.decode())['message'])
+            self.assertEqual(Job.query.count(), 0)
+        clean_up_folders([lr_experiment.id])
+
+    def test_tune_experiment_invalid_id(self):
+        """Ensure tuning an unknown experiment behaves properly"""
+        with self.client:
+            response = self.client.post('/experiments/tune/1000', data=json.dumps({'space': {'C': [1.0]}}),
+                                        content_type='application/json')
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 404)
+            self.assertIn('Experiment id 1000 Not Found!', data['message'])
+
     def test_test_experiment(self):
         """Ensure test an experiment behaves properly"""
         lr_experiment = get_lr_test_experiment()
         with self.client:
             response = self.client.post(f'/experiments/train/{lr_experiment.id}')
             data = json.loads(response.data.decode())
-            result = json.loads(data['result'])
+            self.assertEqual(response.status_code, 202)
+            self.assertIn('Experiment id 1 Training Job Submitted!', data['message'])
+            self.assertIn('success', data['status'])
+
+            response = self.client.get(f'/experiments/jobs/{data["job_id"]}')
+            data = json.loads(response.data.decode())
+            result = data['data']['result']
             train_accuracy = result[0]['train_accuracy']
             self.assertEqual(round(train_accuracy, 3), 1.0)
             self.assertEqual(response.status_code, 200)
-            self.assertIn('Experiment id 1 Trained!', data['message'])
+            self.assertIn('done', data['data']['status'])
             self.assertIn('success', data['status'])
             response = self.client.post(f'/experiments/test/{lr_experiment.id}')
             data = json.loads(response.data.decode())
-            result = json.loads(data['result'])
-            test_accuracy = result[1]['test_accuracy']
+            self.assertEqual(response.status_code, 202)
+            self.assertIn('Experiment id 1 Testing Job Submitted!', data['message'])
+            self.assertIn('success', data['status'])
+
+            response = self.client.get(f'/experiments/jobs/{data["job_id"]}')
+            data = json.loads(response.data.decode())
+            result = data['data']['result']
+            test_accuracy = result[0]['test_accuracy']
             self.assertEqual(round(test_accuracy, 3), 1.0)
             self.assertEqual(response.status_code, 200)
-            self.assertIn('Experiment id 1 Tested!', data['message'])
+            self.assertIn('done', data['data']['status'])
             self.assertIn('success', data['status'])
         clean_up_folders([lr_experiment.id])
 
+    def test_experiment_results(self):
+        """Ensure every run appends one result and the summary aggregates them"""
+        lr_experiment = get_lr_test_experiment()
+        with self.client:
+            self.client.post(f'/experiments/train/{lr_experiment.id}')
+            for _ in range(2):
+                response = self.client.post(f'/experiments/test/{lr_experiment.id}')
+                self.assertEqual(response.status_code, 202)
+            test_job_id = json.loads(response.data.decode())['job_id']
+
+            response = self.client.get(f'/experiments/{lr_experiment.id}/results')
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([result['run_type'] for result in data['data']['results']], ['test', 'test', 'train'])
+            latest = data['data']['results'][0]
+            self.assertEqual(latest['job_id'], test_job_id)
+            self.assertEqual(latest['metrics'], {'test_accuracy': 1.0})
+            self.assertIsNotNone(latest['duration_seconds'])
+            self.assertEqual(latest['model_sha256'], data['data']['results'][2]['model_sha256'])
+            self.assertEqual(data['data']['summary']['test']['test_accuracy']['runs'], 2)
+            self.assertEqual(data['data']['summary']['train']['train_accuracy']['last'], 1.0)
+            self.assertIsNone(data['data']['next_before_id'])
+
+            response = self.client.get(f'/experiments/{lr_experiment.id}/results?run_type=test&limit=1')
+            data = json.loads(response.data.decode())
+            self.assertEqual(len(data['data']['results']), 1)
+            next_before_id = data['data']['next_before_id']
+            response = self.client.get(f'/experiments/{lr_experiment.id}/results?run_type=test&limit=1'
+                                       f'&before_id={next_before_id}')
+            data = json.loads(response.data.decode())
+            self.assertLess(data['data']['results'][0]['id'], next_before_id)
+
+            response = self.client.get(f'/experiments/{lr_experiment.id}')
+            data = json.loads(response.data.decode())
+            self.assertEqual(data['data']['results']['test']['test_accuracy']['mean'], 1.0)
+            self.assertIsNone(data['data']['result'])
+
+            response = self.client.get('/experiments?fields=results')
+            data = json.loads(response.data.decode())
+            self.assertEqual(sorted(data['data']['experiments'][0]), ['id', 'results'])
+            self.assertEqual(data['data']['experiments'][0]['results']['test']['test_accuracy']['runs'], 2)
+
+            response = self.client.get(f'/experiments/{lr_experiment.id}/results?limit=0')
+            self.assertEqual(response.status_code, 400)
+            response = self.client.get('/experiments/1000/results')
+            self.assertEqual(response.status_code, 404)
+        clean_up_folders([lr_experiment.id])
+
+    def test_train_and_test_are_memoized(self):
+        """Ensure unchanged train and test requests return the stored result unless forced"""
+        data_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data')
+        with self.client:
+            response = self.client.post('/experiments', content_type='multipart/form-data', data={
+                'name': 'LR_test',
+                'type': 'classification',
+                'train_data': (open(os.path.join(data_dir, 'train.csv'), 'rb'), 'train.csv'),
+                'test_data': (open(os.path.join(data_dir, 'test.csv'), 'rb'), 'test.csv')
+            })
+            experiment_id = json.loads(response.data.decode())['id']
+
+            response = self.client.post(f'/experiments/train/{experiment_id}')
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(data['cache'], 'miss')
+            train_job_id = data['job_id']
+
+            response = self.client.post(f'/experiments/train/{experiment_id}')
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(data['cache'], 'hit')
+            self.assertEqual(data['job_id'], train_job_id)
+            self.assertEqual(data['result'][0]['train_accuracy'], 1.0)
+
+            response = self.client.post(f'/experiments/test/{experiment_id}')
+            self.assertEqual(json.loads(response.data.decode())['cache'], 'miss')
+            response = self.client.post(f'/experiments/test/{experiment_id}')
+            data = json.loads(response.data.decode())
+            self.assertEqual(data['cache'], 'hit')
+            self.assertEqual(data['result'][0]['test_accuracy'], 1.0)
+
+            response = self.client.post(f'/experiments/train/{experiment_id}?force=true')
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(data['cache'], 'bypass')
+
+            # The refit saved identical weights, so the model version and its test result still hold
+            response = self.client.post(f'/experiments/test/{experiment_id}')
+            self.assertEqual(json.loads(response.data.decode())['cache'], 'hit')
+
+            response = self.client.get(f'/experiments/{experiment_id}/results')
+            run_types = [result['run_type'] for result in json.loads(response.data.decode())['data']['results']]
+            self.assertEqual(run_types, ['train', 'test', 'train'])
+        clean_up_folders([experiment_id])
+
     def test_test_experiment_before_training(self):
         """Ensure test an experiment behaves properly"""
         lr_experiment = get_lr_test_experiment()
@@ -422,11 +1084,17 @@ class TestUserService(BaseTestCase):
         with self.client:
             response = self.client.post(f'/experiments/train/{lr_experiment.id}')
             data = json.loads(response.data.decode())
-            result = json.loads(data['result'])
+            self.assertEqual(response.status_code, 202)
+            self.assertIn('Experiment id 1 Training Job Submitted!', data['message'])
+            self.assertIn('success', data['status'])
+
+            response = self.client.get(f'/experiments/jobs/{data["job_id"]}')
+            data = json.loads(response.data.decode())
+            result = data['data']['result']
             train_accuracy = result[0]['train_accuracy']
             self.assertEqual(round(train_accuracy, 3), 1.0)
             self.assertEqual(response.status_code, 200)
-            self.assertIn('Experiment id 1 Trained!', data['message'])
+            self.assertIn('done', data['data']['status'])
             self.assertIn('success', data['status'])
 
             payload = {'sample': {
@@ -454,17 +1122,170 @@ class TestUserService(BaseTestCase):
             self.assertIn('success', data['status'])
         clean_up_folders([lr_experiment.id])
 
+    def test_predict_experiment_uses_model_cache(self):
+        """Ensure repeated predictions are served from the model cache"""
+        lr_experiment = get_lr_test_experiment()
+        with self.client:
+            response = self.client.post(f'/experiments/train/{lr_experiment.id}')
+            self.assertEqual(response.status_code, 202)
+
+            payload = {'sample': {
+                                    'pregnancies': 0,
+                                    'glucose': 137,
+                                    'blood_pressure': 40,
+                                    'skin_thickness': 35,
+                                    'insulin': 168,
+                                    'bmi': 43.1,
+                                    'diabetes_pedigree_function': 2.88,
+                                    'age': 33
+                                    }
+                                }
+            response = self.client.get('/experiments/model_cache')
+            stats_before = json.loads(response.data.decode())['data']
+
+            for _ in range(2):
+                response = self.client.post(
+                    f'/experiments/predict/{lr_experiment.id}',
+                    content_type='application/json',
+                    data = json.dumps(payload)
+                )
+                self.assertEqual(response.status_code, 200)
+
+            response = self.client.get('/experiments/model_cache')
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(data['data']['misses'] - stats_before['misses'], 1)
+            self.assertEqual(data['data']['hits'] - stats_before['hits'], 1)
+            self.assertIn('success', data['status'])
+        clean_up_folders([lr_experiment.id])
+
+    def test_predict_batch_experiment(self):
+        """Ensure predict a batch of data samples behaves properly"""
+        lr_experiment = get_lr_test_experiment()
+        with self.client:
+            response = self.client.post(f'/experiments/train/{lr_experiment.id}')
+            self.assertEqual(response.status_code, 202)
+
+            sample = {
+                'pregnancies': 0,
+                'glucose': 137,
+                'blood_pressure': 40,
+                'skin_thickness': 35,
+                'insulin': 168,
+                'bmi': 43.1,
+                'diabetes_pedigree_function': 2.88,
+                'age': 33
+            }
+            row_payload = {'samples': [sample, sample, sample]}
+            column_payload = {'samples': {key: [value] * 3 for key, value in sample.items()}}
+
+            for payload in [row_payload, column_payload]:
+                response = self.client.post(
+                    f'/experiments/predict/{lr_experiment.id}/batch',
+                    content_type='application/json',
+                    data = json.dumps(payload)
+                )
+                data = json.loads(response.data.decode())
+
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(data['predictions'], [1, 1, 1])
+                self.assertEqual(len(data['probabilities']), 3)
+                self.assertAlmostEqual(sum(data['probabilities'][0]), 1.0)
+                self.assertIn('Experiment id 1, 3 Data Samples Predicted!', data['message'])
+                self.assertIn('success', data['status'])
+        clean_up_folders([lr_experiment.id])
+
+    def test_predict_batch_experiment_too_large(self):
+        """Ensure batches above MAX_PREDICT_BATCH_SIZE are rejected"""
+        lr_experiment = get_lr_test_experiment()
+        max_batch_size = self.app.config['MAX_PREDICT_BATCH_SIZE']
+        self.app.config['MAX_PREDICT_BATCH_SIZE'] = 2
+        try:
+            with self.client:
+                response = self.client.post(f'/experiments/train/{lr_experiment.id}')
+                self.assertEqual(response.status_code, 202)
+
+                payload = {'samples': {'pregnancies': [0, 1, 2]}}
+                response = self.client.post(
+                    f'/experiments/predict/{lr_experiment.id}/batch',
+                    content_type='application/json',
+                    data = json.dumps(payload)
+                )
+                data = json.loads(response.data.decode())
+                self.assertEqual(response.status_code, 413)
+                self.assertIn('At most 2 samples', data['message'])
+                self.assertIn('fail', data['status'])
+        finally:
+            self.app.config['MAX_PREDICT_BATCH_SIZE'] = max_batch_size
+        clean_up_folders([lr_experiment.id])
+
+    def test_predict_batch_experiment_bare_list(self):
+        """Ensure a bare JSON list of samples is predicted like a samples field"""
+        lr_experiment = get_lr_test_experiment()
+        with self.client:
+            response = self.client.post(f'/experiments/train/{lr_experiment.id}')
+            self.assertEqual(response.status_code, 202)
+
+            samples = [dict.fromkeys(PimaIndiansDatasetMaker.features, value) for value in [1, 100]]
+            responses = [self.client.post(f'/experiments/predict/{lr_experiment.id}/batch',
+                                          content_type='application/json', data=json.dumps(payload))
+                         for payload in [samples, {'samples': samples}]]
+            for response in responses:
+                self.assertEqual(response.status_code, 200)
+            bare, wrapped = [json.loads(response.data.decode()) for response in responses]
+            self.assertEqual(bare['predictions'], wrapped['predictions'])
+            self.assertEqual(len(bare['predictions']), 2)
+        clean_up_folders([lr_experiment.id])
+
+    def test_predict_batch_experiment_invalid_samples(self):
+        """Ensure malformed batches are rejected naming the fields at fault"""
+        lr_experiment = get_lr_test_experiment()
+        with self.client:
+            response = self.client.post(f'/experiments/train/{lr_experiment.id}')
+            self.assertEqual(response.status_code, 202)
+
+            sample = dict.fromkeys(PimaIndiansDatasetMaker.features, 1)
+            payloads = [
+                ({'samples': {'pregnancies': 5}}, 'invalid: pregnancies'),
+                ({'samples': [sample, 5]}, 'invalid: 1'),
+                ({'samples': [{**sample, 'glucose': 'high'}]}, 'Features must be numbers: glucose'),
+                ({'samples': {key: [value] for key, value in sample.items() if key != 'age'}},
+                 'Missing features: age'),
+                ({'samples': [sample, {key: value for key, value in sample.items() if key != 'bmi'}]},
+                 'Missing features: bmi'),
+                ({'samples': {key: [] for key in sample}}, 'The batch holds no samples'),
+                ([], 'Please send a list of samples'),
+                ('samples', 'Please send a list of samples')
+            ]
+            for payload, message in payloads:
+                response = self.client.post(
+                    f'/experiments/predict/{lr_experiment.id}/batch',
+                    content_type='application/json',
+                    data = json.dumps(payload)
+                )
+                data = json.loads(response.data.decode())
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(message, data['message'])
+                self.assertIn('fail', data['status'])
+        clean_up_folders([lr_experiment.id])
+
     def test_predict_experiment_invalid_id(self):
         """Ensure predict a data sample behaves properly"""
         lr_experiment = get_lr_test_experiment()
         with self.client:
             response = self.client.post(f'/experiments/train/{lr_experiment.id}')
             data = json.loads(response.data.decode())
-            result = json.loads(data['result'])
+            self.assertEqual(response.status_code, 202)
+            self.assertIn('Experiment id 1 Training Job Submitted!', data['message'])
+            self.assertIn('success', data['status'])
+
+            response = self.client.get(f'/experiments/jobs/{data["job_id"]}')
+            data = json.loads(response.data.decode())
+            result = data['data']['result']
             train_accuracy = result[0]['train_accuracy']
             self.assertEqual(round(train_accuracy, 3), 1.0)
             self.assertEqual(response.status_code, 200)
-            self.assertIn('Experiment id 1 Trained!', data['message'])
+            self.assertIn('done', data['data']['status'])
             self.assertIn('success', data['status'])
             payload = {'sample': (1, 2, 3)}
             response = self.client.post(
@@ -3,6 +3,7 @@ import unittest
 
 from project.tests.base import BaseTestCase
 
+from project.api.models import Experiment
 from project.ml.environment import Locator
 
 
@@ -11,13 +12,29 @@ class TestLocator(BaseTestCase):
     def test_create_experiment_folders(self):
         """Ensure create experiment folder behaves properly"""
 
-        locator = Locator(id=1, train_data_filename='pima_indians.csv', test_data_filename='pima_indians.csv')
+        locator = Locator(id=1000, train_data_filename='pima_indians.csv', test_data_filename='pima_indians.csv')
+        self.assertFalse(os.path.exists(locator.model_dir))
 
+        locator.create_experiment_folders()
         self.assertTrue(os.path.exists(locator.train_data_dir))
         self.assertTrue(os.path.exists(locator.test_data_dir))
         self.assertTrue(os.path.exists(locator.model_dir))
         self.assertTrue(os.path.exists(locator.train_result_dir))
         self.assertTrue(os.path.exists(locator.test_result_dir))
+        Locator.delete_experiment_folders(1000)
+
+    def test_for_experiment(self):
+        """Ensure for_experiment reuses the locator of an experiment"""
+        experiment = Experiment(name='LR_test', type='classification', train_data='train.csv',
+                                test_data='test.csv')
+        experiment.id = 1
+        locator = Locator.for_experiment(experiment)
+        self.assertIs(Locator.for_experiment(experiment), locator)
+        self.assertEqual(locator.get_train_data_file_path(), f'{Locator.root}/1/data/train/train.csv')
+
+        experiment.train_data = 'other.csv'
+        self.assertEqual(Locator.for_experiment(experiment).get_train_data_file_path(),
+                         f'{Locator.root}/1/data/train/other.csv')
 
     def test_get_train_data_dir(self):
         """Ensure get_train_data_dir behaves properly"""
@@ -0,0 +1,99 @@
+import json
+import time
+import unittest
+
+from project.jobs import job_queue
+from project.metrics import Counter, Histogram, metrics
+from project.tests.base import BaseTestCase
+from project.tests.test_experiments import clean_up_folders, get_lr_test_experiment
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_render_cumulative_buckets(self):
+        """Ensure buckets are rendered cumulatively with sum and count"""
+        histogram = Histogram('latency_seconds', 'Latency', ['route'], buckets=(0.1, 1.0))
+        for value in [0.05, 0.5, 0.7, 3.0]:
+            histogram.observe(value, '/ping')
+
+        lines = histogram.render()
+
+        self.assertIn('# TYPE latency_seconds histogram', lines)
+        self.assertIn('latency_seconds_bucket{route="/ping",le="0.1"} 1', lines)
+        self.assertIn('latency_seconds_bucket{route="/ping",le="1.0"} 3', lines)
+        self.assertIn('latency_seconds_bucket{route="/ping",le="+Inf"} 4', lines)
+        self.assertIn('latency_seconds_sum{route="/ping"} 4.25', lines)
+        self.assertIn('latency_seconds_count{route="/ping"} 4', lines)
+
+    def test_counter_escapes_labels(self):
+        """Ensure label values are escaped"""
+        counter = Counter('requests_total', 'Requests', ['route'])
+        counter.inc('/a"b')
+        counter.inc('/a"b', amount=2)
+
+        self.assertIn('requests_total{route="/a\\"b"} 3', counter.render())
+
+
+class TestMetricsEndpoint(BaseTestCase):
+
+    def test_metrics_endpoint(self):
+        """Ensure /metrics exposes route, stage and service metrics"""
+        lr_experiment = get_lr_test_experiment()
+        with self.client:
+            self.client.get('/experiments/ping')
+            self.client.post(f'/experiments/train/{lr_experiment.id}')
+            self.client.post(f'/experiments/predict/{lr_experiment.id}', data=json.dumps({'sample': {
+                'pregnancies': 0, 'glucose': 137, 'blood_pressure': 40, 'skin_thickness': 35, 'insulin': 168,
+                'bmi': 43.1, 'diabetes_pedigree_function': 2.88, 'age': 33}}), content_type='application/json')
+
+            response = self.client.get('/metrics')
+            body = response.data.decode()
+
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.content_type.startswith('text/plain'))
+            self.assertIn('experiments_http_requests_total{method="GET",route="/experiments/ping",status="200"}',
+                          body)
+            self.assertIn('experiments_http_request_duration_seconds_count{method="POST",'
+                          'route="/experiments/train/<id>"}', body)
+            for stage in ['db_query', 'csv_parse', 'fit', 'model_load', 'predict']:
+                self.assertIn(f'experiments_stage_duration_seconds_count{{stage="{stage}"}}', body)
+            self.assertIn('experiments_model_cache_entries', body)
+            self.assertIn('experiments_jobs{status="queued"} 0', body)
+            self.assertIn('experiments_jobs_finished_total{kind="train",status="done"}', body)
+            self.assertIn('experiments_micro_batcher_batches', body)
+        clean_up_folders([lr_experiment.id])
+
+    def test_job_pool_stages_reach_the_submitting_process(self):
+        """Ensure stages timed in a job pool process are reported by the web process"""
+        lr_experiment = get_lr_test_experiment()
+        self.app.config['JOB_QUEUE_WORKERS'] = 1
+        try:
+            fit_count, parse_count = stage_count('fit'), stage_count('csv_parse')
+            with self.client:
+                response = self.client.post(f'/experiments/train/{lr_experiment.id}')
+                self.assertEqual(response.status_code, 202)
+                job_id = json.loads(response.data.decode())['job_id']
+
+                deadline = time.monotonic() + 60
+                while stage_count('fit') == fit_count and time.monotonic() < deadline:
+                    time.sleep(0.05)
+                self.assertEqual(stage_count('fit'), fit_count + 1)
+                self.assertGreater(stage_count('csv_parse'), parse_count)
+
+                job = json.loads(self.client.get(f'/experiments/jobs/{job_id}').data.decode())['data']
+                self.assertEqual(job['status'], 'done')
+        finally:
+            job_queue.shutdown()
+            self.app.config['JOB_QUEUE_WORKERS'] = 0
+        clean_up_folders([lr_experiment.id])
+
+
+def stage_count(stage):
+    for line in metrics.stage_latency.render():
+        if line.startswith(f'experiments_stage_duration_seconds_count{{stage="{stage}"}}'):
+            return int(line.split()[-1])
+    return 0
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import threading
+import unittest
+
+import numpy as np
+
+from project.ml.micro_batcher import MicroBatcher
+
+
+class RecordingPredict:
+    """Sums each row and remembers the size of every call"""
+
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, X):
+        with self.lock:
+            self.calls.append(len(X))
+        return X.sum(axis=1)
+
+
+class TestMicroBatcher(unittest.TestCase):
+
+    def submit_concurrently(self, micro_batcher, predict, rows, key='model'):
+        results = [None] * len(rows)
+        barrier = threading.Barrier(len(rows))
+
+        def submit(index):
+            barrier.wait()
+            results[index] = micro_batcher.submit(key, rows[index], predict)
+
+        threads = [threading.Thread(target=submit, args=(index,)) for index in range(len(rows))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_requests_share_a_batch(self):
+        """Ensure concurrent rows are predicted together and fanned back out in order"""
+        micro_batcher = MicroBatcher(enabled=True, max_wait=0.5, max_batch_size=8, adaptive=False)
+        predict = RecordingPredict()
+        rows = [np.full(3, index, dtype=float) for index in range(8)]
+
+        results = self.submit_concurrently(micro_batcher, predict, rows)
+
+        self.assertEqual(predict.calls, [8])
+        self.assertEqual([result.tolist() for result in results], [[3.0 * index] for index in range(8)])
+        stats = micro_batcher.stats()
+        self.assertEqual(stats['batches'], 1)
+        self.assertEqual(stats['requests'], 8)
+        self.assertEqual(stats['largest_batch_size'], 8)
+        self.assertEqual(stats['batch_sizes']['5-16'], 1)
+
+    def test_batches_are_bounded_by_max_batch_size(self):
+        """Ensure no batch holds more than max_batch_size rows"""
+        micro_batcher = MicroBatcher(enabled=True, max_wait=0.05, max_batch_size=4, adaptive=False)
+        predict = RecordingPredict()
+        rows = [np.ones(2) for _ in range(10)]
+
+        results = self.submit_concurrently(micro_batcher, predict, rows)
+
+        self.assertEqual(sum(predict.calls), 10)
+        self.assertTrue(all(size <= 4 for size in predict.calls))
+        self.assertTrue(all(result.tolist() == [2.0] for result in results))
+
+    def test_idle_request_does_not_wait(self):
+        """Ensure an adaptive batcher predicts a lone request without waiting for company"""
+        micro_batcher = MicroBatcher(enabled=True, max_wait=5, max_batch_size=8)
+        predict = RecordingPredict()
+
+        result = micro_batcher.submit('model', np.ones(3), predict)
+
+        self.assertEqual(result.tolist(), [3.0])
+        self.assertLess(micro_batcher.stats()['longest_batch_wait_ms'], 1000)
+
+    def test_remembers_only_recent_keys(self):
+        """Ensure the previous batch sizes are kept for the most recently batched keys only"""
+        micro_batcher = MicroBatcher(enabled=True, max_wait=5, max_batch_size=8)
+        micro_batcher.max_keys = 2
+        predict = RecordingPredict()
+
+        for key in ['a', 'b', 'a', 'c']:
+            micro_batcher.submit(key, np.ones(3), predict)
+
+        self.assertEqual(list(micro_batcher._last_size), ['a', 'c'])
+
+    def test_errors_reach_every_request(self):
+        """Ensure a failed batch predict is raised in every waiting request"""
+        micro_batcher = MicroBatcher(enabled=True, max_wait=0.5, max_batch_size=4, adaptive=False)
+        errors = []
+
+        def predict(X):
+            raise ValueError('bad sample')
+
+        def submit():
+            try:
+                micro_batcher.submit('model', np.ones(3), predict)
+            except ValueError as e:
+                errors.append(str(e))
+
+        threads = [threading.Thread(target=submit) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, ['bad sample'] * 4)
+
+    def test_disabled_predicts_directly(self):
+        """Ensure a disabled batcher calls predict once per request"""
+        micro_batcher = MicroBatcher(enabled=False)
+        predict = RecordingPredict()
+
+        result = micro_batcher.submit('model', [1.0, 2.0], predict)
+
+        self.assertEqual(result.tolist(), [3.0])
+        self.assertEqual(predict.calls, [1])
+        self.assertEqual(micro_batcher.stats()['batches'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from project.ml.data_loader import DataLoader
+from project.ml.model_cache import ModelCache
+from project.ml.model_store import ModelStore
+
+
+class TestModelCache(unittest.TestCase):
+
+    def setUp(self):
+        self.model_dir = tempfile.mkdtemp()
+        # The cached models are plain pickles, only the cache is under test
+        ModelStore.allow_pickle = True
+
+    def tearDown(self):
+        ModelStore.allow_pickle = False
+        shutil.rmtree(self.model_dir)
+
+    def save_model(self, name, model):
+        model_file_path = os.path.join(self.model_dir, name)
+        DataLoader.save(file_object=model, file_path=model_file_path)
+        return model_file_path
+
+    def test_get_counts_hits_and_misses(self):
+        """Ensure a cached model is served without reloading it"""
+        model_cache = ModelCache()
+        model_file_path = self.save_model('model.pkl', {'coef': [1, 2, 3]})
+
+        first = model_cache.get(1, model_file_path)
+        second = model_cache.get('1', model_file_path)
+
+        self.assertIs(first, second)
+        self.assertEqual(model_cache.stats()['hits'], 1)
+        self.assertEqual(model_cache.stats()['misses'], 1)
+
+    def test_get_reloads_model_when_file_changes(self):
+        """Ensure a newer model file on disk replaces the cached model"""
+        model_cache = ModelCache()
+        model_file_path = self.save_model('model.pkl', {'version': 1})
+        self.assertEqual(model_cache.get(1, model_file_path)['version'], 1)
+
+        self.save_model('model.pkl', {'version': 2})
+        stat = os.stat(model_file_path)
+        os.utime(model_file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+
+        self.assertEqual(model_cache.get(1, model_file_path)['version'], 2)
+        self.assertEqual(model_cache.stats()['entries'], 1)
+        self.assertEqual(model_cache.stats()['misses'], 2)
+
+    def test_get_with_version_skips_the_file(self):
+        """Ensure a hit on a recorded model version never touches the filesystem"""
+        model_cache = ModelCache()
+        model_file_path = self.save_model('model.pkl', {'version': 1})
+        self.assertEqual(model_cache.get(1, model_file_path, version='a', size=10)['version'], 1)
+        self.assertEqual(model_cache.stats()['bytes'], 10)
+
+        os.remove(model_file_path)
+        self.assertEqual(model_cache.get(1, model_file_path, version='a')['version'], 1)
+
+        self.save_model('model.pkl', {'version': 2})
+        self.assertEqual(model_cache.get(1, model_file_path, version='b')['version'], 2)
+        self.assertEqual(model_cache.stats()['misses'], 2)
+
+    def test_invalidate(self):
+        """Ensure invalidated models are reloaded"""
+        model_cache = ModelCache()
+        model_file_path = self.save_model('model.pkl', {'version': 1})
+        model_cache.get(1, model_file_path)
+        model_cache.invalidate(1)
+
+        self.assertEqual(model_cache.stats()['entries'], 0)
+        self.assertEqual(model_cache.stats()['bytes'], 0)
+
+    def test_evicts_least_recently_used_entry(self):
+        """Ensure the cache never holds more than max_entries models"""
+        model_cache = ModelCache(max_entries=2)
+        paths = [self.save_model(f'model_{i}.pkl', {'id': i}) for i in range(3)]
+
+        model_cache.get(0, paths[0])
+        model_cache.get(1, paths[1])
+        model_cache.get(0, paths[0])
+        model_cache.get(2, paths[2])
+
+        stats = model_cache.stats()
+        self.assertEqual(stats['entries'], 2)
+        self.assertEqual(stats['evictions'], 1)
+        model_cache.get(0, paths[0])
+        self.assertEqual(model_cache.stats()['hits'], 2)
+
+    def test_evicts_when_over_byte_budget(self):
+        """Ensure the cache stays within max_bytes"""
+        model_file_path = self.save_model('model.pkl', {'coef': list(range(100))})
+        size = os.path.getsize(model_file_path)
+        model_cache = ModelCache(max_bytes=size - 1)
+
+        model_cache.get(1, model_file_path)
+
+        self.assertEqual(model_cache.stats()['entries'], 0)
+        self.assertEqual(model_cache.stats()['bytes'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
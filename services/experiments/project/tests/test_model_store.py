@@ -0,0 +1,204 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+
+from project.ml.data_loader import DataLoader
+from project.ml.dataset_maker import PimaIndiansDatasetMaker
+from project.ml.models import Logistic_Regression, Random_Forest, SVM
+from project.ml.model_store import ModelStore, ModelIntegrityError
+
+
+def make_dataset():
+    rng = np.random.RandomState(0)
+    X = rng.normal(size=(200, len(PimaIndiansDatasetMaker.features)))
+    y = (X[:, 0] + X[:, 1] > 0).astype(int)
+    return X, y
+
+
+class TestModelStore(unittest.TestCase):
+
+    def setUp(self):
+        self.model_dir = tempfile.mkdtemp()
+        self.X, self.y = make_dataset()
+
+    def tearDown(self):
+        shutil.rmtree(self.model_dir)
+
+    def test_linear_model_round_trip(self):
+        """Ensure a linear model is saved as npy weights and predicts the same once loaded"""
+        model = Logistic_Regression(hyperparams={'C': 0.5})
+        model.train(self.X, self.y)
+
+        manifest_path = ModelStore.save(model, self.model_dir, features=PimaIndiansDatasetMaker.features)
+        manifest = ModelStore.read_manifest(manifest_path)
+        loaded = ModelStore.load(manifest_path)
+
+        self.assertEqual(manifest['format'], 'npy')
+        self.assertEqual(manifest['model_class'], 'Logistic_Regression')
+        self.assertEqual(manifest['hyperparams']['C'], 0.5)
+        self.assertEqual(manifest['features'], PimaIndiansDatasetMaker.features)
+        self.assertEqual(sorted(manifest['arrays']), ['classes_', 'coef_', 'intercept_'])
+        self.assertIsInstance(loaded.clf.coef_, np.memmap)
+        np.testing.assert_array_equal(loaded.predict(self.X), model.predict(self.X))
+        np.testing.assert_allclose(loaded.predict_proba(self.X), model.predict_proba(self.X))
+
+    def test_save_replaces_previous_weights(self):
+        """Ensure retraining leaves only the weights the manifest references"""
+        model = Logistic_Regression()
+        model.train(self.X, self.y)
+        ModelStore.save(model, self.model_dir)
+        model.train(self.X[:100], 1 - self.y[:100])
+        manifest_path = ModelStore.save(model, self.model_dir)
+
+        referenced = set(entry['file'] for entry in ModelStore.read_manifest(manifest_path)['arrays'].values())
+        on_disk = set(filename for filename in os.listdir(self.model_dir) if filename.endswith('.npy'))
+        self.assertEqual(on_disk, referenced)
+
+    def test_concurrent_saves_keep_the_weights_of_the_manifest(self):
+        """Ensure trainings saving to one model dir never remove the weights the final manifest references"""
+        models = []
+        for seed in range(4):
+            model = Logistic_Regression()
+            model.train(self.X, np.random.RandomState(seed).randint(0, 2, len(self.y)))
+            models.append(model)
+
+        def save(model):
+            for _ in range(5):
+                ModelStore.save(model, self.model_dir)
+
+        threads = [threading.Thread(target=save, args=(model,)) for model in models]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        manifest_path = os.path.join(self.model_dir, ModelStore.manifest_filename)
+        loaded = ModelStore.load(manifest_path)
+        self.assertTrue(any((loaded.predict(self.X) == model.predict(self.X)).all() for model in models))
+        referenced = set(entry['file'] for entry in ModelStore.read_manifest(manifest_path)['arrays'].values())
+        self.assertEqual(set(filename for filename in os.listdir(self.model_dir) if filename.endswith('.npy')),
+                         referenced)
+        self.assertFalse([filename for filename in os.listdir(self.model_dir) if '.part.' in filename])
+
+    def test_random_forest_round_trip(self):
+        """Ensure the trees of a forest are saved as npy arrays and predict the same once loaded"""
+        model = Random_Forest(hyperparams={'n_estimators': 5, 'n_jobs': 1})
+        model.train(self.X, self.y)
+
+        manifest_path = ModelStore.save(model, self.model_dir)
+        loaded = ModelStore.load(manifest_path)
+
+        self.assertEqual(ModelStore.read_manifest(manifest_path)['format'], 'npy')
+        self.assertEqual(len(loaded.clf.estimators_), 5)
+        np.testing.assert_array_equal(loaded.predict(self.X), model.predict(self.X))
+        np.testing.assert_allclose(loaded.predict_proba(self.X), model.predict_proba(self.X))
+
+    def test_svm_round_trip(self):
+        """Ensure the support vectors of an SVM are saved as npy arrays and predict the same once loaded"""
+        model = SVM()
+        model.train(self.X, self.y)
+
+        manifest_path = ModelStore.save(model, self.model_dir)
+        loaded = ModelStore.load(manifest_path)
+
+        self.assertEqual(ModelStore.read_manifest(manifest_path)['format'], 'npy')
+        np.testing.assert_array_equal(loaded.predict(self.X), model.predict(self.X))
+        np.testing.assert_allclose(loaded.predict_proba(self.X), model.predict_proba(self.X))
+
+    def test_pickle_fallback_needs_to_be_allowed(self):
+        """Ensure models that cannot be saved as arrays are pickled, and only unpickled when allowed"""
+        model = Logistic_Regression()
+        model.train(self.X, self.y)
+        model.array_attributes = ()
+
+        manifest_path = ModelStore.save(model, self.model_dir)
+        self.assertEqual(ModelStore.read_manifest(manifest_path)['format'], 'pickle')
+        with self.assertRaises(ModelIntegrityError):
+            ModelStore.load(manifest_path)
+
+        ModelStore.allow_pickle = True
+        try:
+            loaded = ModelStore.load(manifest_path)
+        finally:
+            ModelStore.allow_pickle = False
+        np.testing.assert_array_equal(loaded.predict(self.X), model.predict(self.X))
+
+    def test_legacy_pickle_needs_to_be_allowed(self):
+        """Ensure a legacy model.pkl is only unpickled when allowed"""
+        model = Logistic_Regression()
+        model.train(self.X, self.y)
+        legacy_file_path = os.path.join(self.model_dir, 'model.pkl')
+        DataLoader.save(file_object=model, file_path=legacy_file_path)
+
+        with self.assertRaises(ModelIntegrityError):
+            ModelStore.load(legacy_file_path)
+
+        ModelStore.allow_pickle = True
+        try:
+            loaded = ModelStore.load(legacy_file_path)
+        finally:
+            ModelStore.allow_pickle = False
+        np.testing.assert_array_equal(loaded.predict(self.X), model.predict(self.X))
+
+    def test_load_rejects_tampered_weights(self):
+        """Ensure weights that do not match their checksum are not loaded"""
+        model = Logistic_Regression()
+        model.train(self.X, self.y)
+        manifest_path = ModelStore.save(model, self.model_dir)
+        coef_file = ModelStore.read_manifest(manifest_path)['arrays']['coef_']['file']
+        with open(os.path.join(self.model_dir, coef_file), 'r+b') as array_file:
+            array_file.seek(-1, os.SEEK_END)
+            array_file.write(b'\x00')
+
+        with self.assertRaises(ModelIntegrityError):
+            ModelStore.load(manifest_path)
+
+    def test_load_rejects_internals_of_another_sklearn_version(self):
+        """Ensure weights that are scikit-learn internals only load with the version that saved them"""
+        for model in [Random_Forest(hyperparams={'n_estimators': 3, 'n_jobs': 1}), Logistic_Regression()]:
+            model.train(self.X, self.y)
+            manifest_path = ModelStore.save(model, self.model_dir)
+            manifest = ModelStore.read_manifest(manifest_path)
+            manifest['sklearn_version'] = '0.0.1'
+            with open(manifest_path, 'w') as manifest_file:
+                json.dump(manifest, manifest_file)
+
+            if model.version_sensitive:
+                with self.assertRaises(ModelIntegrityError):
+                    ModelStore.load(manifest_path)
+            else:
+                np.testing.assert_array_equal(ModelStore.load(manifest_path).predict(self.X), model.predict(self.X))
+
+    def test_load_rejects_unregistered_model_class(self):
+        """Ensure a manifest can only rebuild registered model classes"""
+        model = Logistic_Regression()
+        model.train(self.X, self.y)
+        manifest_path = ModelStore.save(model, self.model_dir)
+        manifest = ModelStore.read_manifest(manifest_path)
+        manifest['model_class'] = 'os.system'
+        with open(manifest_path, 'w') as manifest_file:
+            json.dump(manifest, manifest_file)
+
+        with self.assertRaises(ValueError):
+            ModelStore.load(manifest_path)
+
+    def test_convert_legacy_pickle(self):
+        """Ensure a legacy model.pkl is converted and removed"""
+        model = Logistic_Regression()
+        model.train(self.X, self.y)
+        DataLoader.save(file_object=model, file_path=os.path.join(self.model_dir, 'model.pkl'))
+
+        manifest_path = ModelStore.convert(self.model_dir)
+
+        self.assertFalse(os.path.exists(os.path.join(self.model_dir, 'model.pkl')))
+        np.testing.assert_array_equal(ModelStore.load(manifest_path).predict(self.X), model.predict(self.X))
+        self.assertIsNone(ModelStore.convert(self.model_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
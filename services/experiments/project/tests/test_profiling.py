@@ -0,0 +1,109 @@
+import json
+import os
+import time
+
+import pstats
+
+from project.jobs import job_queue
+from project.profiling import request_profiler
+from project.tests.base import BaseTestCase
+from project.tests.test_experiments import clean_up_folders, get_lr_test_experiment
+
+
+class TestRequestProfiler(BaseTestCase):
+    """Tests for on-demand request profiling"""
+
+    def setUp(self):
+        super().setUp()
+        self.view_functions = dict(self.app.view_functions)
+        self.app.config['PROFILING_ENABLED'] = True
+        request_profiler.init_app(self.app)
+
+    def tearDown(self):
+        self.app.view_functions.clear()
+        self.app.view_functions.update(self.view_functions)
+        self.app.config['PROFILING_ENABLED'] = False
+        super().tearDown()
+
+    def test_views_are_wrapped_only_when_enabled(self):
+        """Ensure the app created with profiling off kept the original views"""
+        self.assertTrue(getattr(self.app.view_functions['experiments.ping'], 'profiled', False))
+        self.assertFalse(getattr(self.view_functions['experiments.ping'], 'profiled', False))
+
+    def test_unprofiled_request(self):
+        """Ensure requests without the profile flag are served as usual"""
+        with self.client:
+            response = self.client.get('/experiments/ping')
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('X-Profile-Seconds', response.headers)
+
+    def test_inline_sampled_profile(self):
+        """Ensure a sampled profile is returned inline as collapsed stacks"""
+        with self.client:
+            response = self.client.get('/experiments/ping?profile=sample')
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.content_type.startswith('text/plain'))
+            self.assertEqual(response.headers['X-Profiled-Status'], '200')
+            for line in response.data.decode().splitlines():
+                stack, count = line.rsplit(' ', 1)
+                self.assertTrue(int(count) > 0)
+
+    def test_stored_cprofile_profile(self):
+        """Ensure a cProfile of an experiment request is stored under its result dir"""
+        lr_experiment = get_lr_test_experiment()
+        with self.client:
+            response = self.client.post(f'/experiments/train/{lr_experiment.id}', headers={'X-Profile': 'cprofile'})
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 202)
+            self.assertIn('Training Job Submitted!', data['message'])
+
+            profile_path = response.headers['X-Profile-Path']
+            self.assertTrue(profile_path.startswith(f'/experiments/{lr_experiment.id}/result/profiles/'))
+            self.assertTrue(profile_path.endswith('-train.pstats'))
+            self.assertGreater(pstats.Stats(profile_path).total_calls, 0)
+        clean_up_folders([lr_experiment.id])
+
+    def test_pool_job_is_profiled_by_the_worker(self):
+        """Ensure a profiled request profiles the fit of the job it hands to the pool"""
+        lr_experiment = get_lr_test_experiment()
+        self.app.config['JOB_QUEUE_WORKERS'] = 1
+        try:
+            with self.client:
+                response = self.client.post(f'/experiments/train/{lr_experiment.id}',
+                                            headers={'X-Profile': 'cprofile'})
+                self.assertEqual(response.status_code, 202)
+                job_id = json.loads(response.data.decode())['job_id']
+
+                deadline = time.monotonic() + 60
+                job = None
+                while time.monotonic() < deadline:
+                    job = json.loads(self.client.get(f'/experiments/jobs/{job_id}').data.decode())['data']
+                    if job['status'] in ('done', 'failed'):
+                        break
+                    time.sleep(0.05)
+                self.assertEqual(job['status'], 'done')
+                self.assertTrue(job['profile_path'].endswith(f'-job-{job_id}-train.pstats'))
+                functions = [function for _, _, function in pstats.Stats(job['profile_path']).stats]
+                self.assertIn('fit', functions)
+        finally:
+            job_queue.shutdown()
+            self.app.config['JOB_QUEUE_WORKERS'] = 0
+        clean_up_folders([lr_experiment.id])
+
+    def test_inline_job_is_not_profiled_twice(self):
+        """Ensure inline jobs are left to the request profile"""
+        lr_experiment = get_lr_test_experiment()
+        with self.client:
+            response = self.client.post(f'/experiments/train/{lr_experiment.id}', headers={'X-Profile': 'sample'})
+            job_id = json.loads(response.data.decode())['job_id']
+            job = json.loads(self.client.get(f'/experiments/jobs/{job_id}').data.decode())['data']
+            self.assertEqual(job['status'], 'done')
+            self.assertIsNone(job['profile_path'])
+        clean_up_folders([lr_experiment.id])
+
+    def test_unknown_experiment_is_profiled_inline(self):
+        """Ensure profiling a request for an unknown experiment creates no folders"""
+        with self.client:
+            response = self.client.get('/experiments/1000', headers={'X-Profile': 'sample'})
+            self.assertEqual(response.headers['X-Profiled-Status'], '404')
+            self.assertFalse(os.path.exists('/experiments/1000'))
@@ -0,0 +1,118 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from project import db
+from project.api.models import Tombstone
+from project.ml.environment import Locator
+from project.reaper import find_orphans, reaper, remove_tree
+from project.tests.base import BaseTestCase
+from project.tests.test_experiments import add_experiment, clean_up_folders
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data')
+
+
+class TestReaper(BaseTestCase):
+    """Tests for tombstoned deletes and the reaper"""
+
+    def tearDown(self):
+        super().tearDown()
+        shutil.rmtree(Locator.get_trash_dir(), ignore_errors=True)
+
+    def add(self, name):
+        response = self.client.post('/experiments', content_type='multipart/form-data', data={
+            'name': name,
+            'type': 'classification',
+            'train_data': (open(os.path.join(DATA_DIR, 'train.csv'), 'rb'), 'train.csv'),
+            'test_data': (open(os.path.join(DATA_DIR, 'test.csv'), 'rb'), 'test.csv')
+        })
+        self.assertEqual(response.status_code, 201)
+        return json.loads(response.data.decode())['id']
+
+    def test_delete_moves_folder_to_trash(self):
+        """Ensure a delete tombstones the experiment and the reaper removes its folder"""
+        with self.client:
+            experiment_id = self.add('LR_test')
+            response = self.client.delete(f'/experiments/{experiment_id}')
+            self.assertEqual(response.status_code, 200)
+
+            tombstone = Tombstone.query.one()
+            self.assertEqual(tombstone.experiment_id, experiment_id)
+            trash_path = os.path.join(Locator.get_trash_dir(), tombstone.trash_name)
+            self.assertFalse(os.path.exists(f'{Locator.root}/{experiment_id}'))
+            self.assertTrue(os.path.isdir(trash_path))
+
+            self.assertEqual(reaper.reap(), [experiment_id])
+            self.assertFalse(os.path.exists(trash_path))
+            self.assertEqual(Tombstone.query.count(), 0)
+
+    def test_reap_moves_folder_left_behind(self):
+        """Ensure the reaper finishes a delete that stopped before moving the folder"""
+        os.makedirs(f'{Locator.root}/7/data')
+        tombstone = Tombstone(7)
+        db.session.add(tombstone)
+        db.session.commit()
+
+        self.assertEqual(reaper.reap(), [7])
+        self.assertFalse(os.path.exists(f'{Locator.root}/7'))
+
+    def test_reap_keeps_folder_of_new_experiment_with_same_id(self):
+        """Ensure a tombstone never removes the folder of a live experiment"""
+        experiment = add_experiment('LR_test', 'classification', 'train.csv', 'test.csv',
+                                    open(os.path.join(DATA_DIR, 'train.csv'), 'rb'),
+                                    open(os.path.join(DATA_DIR, 'test.csv'), 'rb'))
+        db.session.add(Tombstone(experiment.id))
+        db.session.commit()
+
+        reaper.reap()
+        self.assertTrue(os.path.isdir(f'{Locator.root}/{experiment.id}'))
+        clean_up_folders([experiment.id])
+
+    def test_find_orphans(self):
+        """Ensure folders without a database row are found once they are old enough"""
+        experiment = add_experiment('LR_test', 'classification', 'train.csv', 'test.csv',
+                                    open(os.path.join(DATA_DIR, 'train.csv'), 'rb'),
+                                    open(os.path.join(DATA_DIR, 'test.csv'), 'rb'))
+        os.makedirs(f'{Locator.root}/99/data')
+        os.makedirs(os.path.join(Locator.get_trash_dir(), '5'))
+
+        self.assertEqual(find_orphans(3600), [])
+        orphans = find_orphans(-1)
+        self.assertIn(f'{Locator.root}/99', orphans)
+        self.assertIn(os.path.join(Locator.get_trash_dir(), '5'), orphans)
+        self.assertNotIn(f'{Locator.root}/{experiment.id}', orphans)
+
+        for path in orphans:
+            remove_tree(path)
+        self.assertEqual(find_orphans(-1), [])
+        clean_up_folders([experiment.id])
+
+
+class TestRemoveTree(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_remove_tree_does_not_follow_symlinks(self):
+        """Ensure symlinked data files are unlinked and their targets kept"""
+        target = os.path.join(self.dir, 'blob')
+        with open(target, 'w') as blob:
+            blob.write('a,b\n')
+        tree = os.path.join(self.dir, 'tree')
+        os.makedirs(os.path.join(tree, 'data', 'train'))
+        os.symlink(target, os.path.join(tree, 'data', 'train', 'train.csv'))
+        os.symlink(self.dir, os.path.join(tree, 'link_to_dir'))
+
+        self.assertEqual(remove_tree(tree, max_deletes_per_second=1000), 5)
+        self.assertFalse(os.path.exists(tree))
+        self.assertTrue(os.path.exists(target))
+
+
+if __name__ == '__main__':
+    unittest.main()
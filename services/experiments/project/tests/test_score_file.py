@@ -0,0 +1,120 @@
+import io
+import json
+import os
+
+import pandas as pd
+
+from project.ml.dataset_maker import PimaIndiansDatasetMaker
+from project.tests.base import BaseTestCase
+from project.tests.test_experiments import clean_up_folders
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data')
+TEST_FILE = os.path.join(DATA_DIR, 'pima-indians-diabetes_test_dataset_1.csv')
+
+
+class TestScoreFile(BaseTestCase):
+    """Tests for scoring a file with streamed predictions"""
+
+    def add_trained(self):
+        response = self.client.post('/experiments', content_type='multipart/form-data', data={
+            'name': 'LR_pima',
+            'type': 'classification',
+            'train_data': (open(os.path.join(DATA_DIR, 'pima-indians-diabetes_train_dataset_1.csv'), 'rb'),
+                           'pima_train.csv'),
+            'test_data': (open(TEST_FILE, 'rb'), 'pima_test.csv')
+        })
+        experiment_id = json.loads(response.data.decode())['id']
+        self.assertEqual(self.client.post(f'/experiments/train/{experiment_id}').status_code, 202)
+        return json.loads(self.client.get(f'/experiments/{experiment_id}').data.decode())['data']
+
+    def batch_predictions(self, experiment_id, data):
+        samples = [dict(zip(PimaIndiansDatasetMaker.features, row)) for row in data.iloc[:, :8].values.tolist()]
+        response = self.client.post(f'/experiments/predict/{experiment_id}/batch', content_type='application/json',
+                                    data=json.dumps({'samples': samples}))
+        return json.loads(response.data.decode())
+
+    def test_score_upload_as_ndjson(self):
+        """Ensure an uploaded file is scored chunk by chunk like a batch predict"""
+        with self.client:
+            experiment = self.add_trained()
+            response = self.client.post(f'/experiments/score/{experiment["id"]}?chunk_size=10',
+                                        content_type='multipart/form-data',
+                                        data={'data': (open(TEST_FILE, 'rb'), 'score.csv')})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.mimetype, 'application/x-ndjson')
+            self.assertTrue(response.is_streamed)
+            rows = [json.loads(line) for line in response.data.decode().splitlines()]
+
+            data = pd.read_csv(TEST_FILE)
+            expected = self.batch_predictions(experiment['id'], data)
+            self.assertEqual([row['row'] for row in rows], list(range(len(data))))
+            self.assertEqual([row['prediction'] for row in rows], expected['predictions'])
+            for row, probabilities in zip(rows, expected['probabilities']):
+                self.assertEqual(len(row['probabilities']), 2)
+                self.assertAlmostEqual(row['probabilities'][1], probabilities[1], places=12)
+        clean_up_folders([experiment['id']])
+
+    def test_score_stored_dataset_as_csv(self):
+        """Ensure a stored dataset is scored by its sha256 and returned as csv"""
+        with self.client:
+            experiment = self.add_trained()
+            response = self.client.post(f'/experiments/score/{experiment["id"]}', headers={'Accept': 'text/csv'},
+                                        content_type='application/json',
+                                        data=json.dumps({'sha256': experiment['test_data_sha256']}))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.mimetype, 'text/csv')
+            scores = pd.read_csv(io.StringIO(response.data.decode()))
+            self.assertEqual(list(scores.columns), ['row', 'prediction', 'probability_0', 'probability_1'])
+            self.assertEqual(len(scores), len(pd.read_csv(TEST_FILE)))
+            self.assertTrue(((scores['probability_0'] + scores['probability_1']) - 1).abs().max() < 1e-9)
+        clean_up_folders([experiment['id']])
+
+    def test_score_chunked_upload(self):
+        """Ensure a completed chunked upload is scored in place"""
+        with self.client:
+            experiment = self.add_trained()
+            upload = json.loads(self.client.post('/experiments/uploads', content_type='application/json',
+                                                 data=json.dumps({'filename': 'score.csv'})).data.decode())
+            upload_id = upload['data']['upload_id']
+            with open(TEST_FILE, 'rb') as test_file:
+                self.client.put(f'/experiments/uploads/{upload_id}?offset=0', data=test_file.read())
+            self.client.post(f'/experiments/uploads/{upload_id}/complete')
+
+            response = self.client.post(f'/experiments/score/{experiment["id"]}?format=csv',
+                                        data={'upload_id': upload_id})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data.decode().splitlines()), len(pd.read_csv(TEST_FILE)) + 1)
+        clean_up_folders([experiment['id']])
+
+    def test_score_invalid_requests(self):
+        """Ensure requests that cannot be scored fail before streaming"""
+        with self.client:
+            experiment = self.add_trained()
+            url = f'/experiments/score/{experiment["id"]}'
+
+            response = self.client.post(url)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('Invalid payload', json.loads(response.data.decode())['message'])
+
+            response = self.client.post(f'{url}?format=xml', data={'data': (open(TEST_FILE, 'rb'), 'score.csv')})
+            self.assertEqual(response.status_code, 400)
+
+            response = self.client.post(f'{url}?chunk_size=0', data={'data': (open(TEST_FILE, 'rb'), 'score.csv')})
+            self.assertEqual(response.status_code, 400)
+
+            response = self.client.post(url, data={'data': (io.BytesIO(b'a,b\n1,2\n'), 'score.csv')})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('Expected 8 feature columns', json.loads(response.data.decode())['error'])
+
+            response = self.client.post(url, content_type='application/json', data=json.dumps({'sha256': 'ab' * 32}))
+            self.assertEqual(response.status_code, 404)
+
+            for body in (['sha256'], {'sha256': 42}, {'sha256': 'ab' * 31}, {'sha256': '../' * 22}):
+                response = self.client.post(url, content_type='application/json', data=json.dumps(body))
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('Invalid payload', json.loads(response.data.decode())['message'])
+
+            response = self.client.post('/experiments/score/99', data={'data': (open(TEST_FILE, 'rb'), 'score.csv')})
+            self.assertEqual(response.status_code, 404)
+        clean_up_folders([experiment['id']])
@@ -0,0 +1,62 @@
+import unittest
+
+import numpy as np
+
+from project.ml.models import Logistic_Regression, SGD_Logistic_Regression
+from project.ml.scoring import LinearScorer
+
+
+def make_dataset(n_classes):
+    rng = np.random.RandomState(0)
+    X = rng.normal(size=(300, 8))
+    y = np.digitize(X[:, 0] + 0.5 * X[:, 1], np.linspace(-1, 1, n_classes - 1))
+    return X, y
+
+
+class TestLinearScorer(unittest.TestCase):
+
+    def assert_parity(self, model, X):
+        np.testing.assert_array_equal(model.predict(X), model.clf.predict(X))
+        np.testing.assert_allclose(model.predict_proba(X), model.clf.predict_proba(X), rtol=1e-10, atol=1e-12)
+        labels, probabilities = model.predict_with_proba(X)
+        np.testing.assert_array_equal(labels, model.clf.predict(X))
+        np.testing.assert_allclose(probabilities, model.clf.predict_proba(X), rtol=1e-10, atol=1e-12)
+
+    def test_logistic_regression_parity(self):
+        """Ensure the scorer matches scikit-learn for binary and multiclass logistic regression"""
+        for n_classes in [2, 3]:
+            X, y = make_dataset(n_classes)
+            model = Logistic_Regression()
+            model.train(X, y)
+            self.assertIsInstance(model.scorer, LinearScorer)
+            self.assert_parity(model, X)
+
+    def test_sgd_logistic_regression_parity(self):
+        """Ensure the scorer matches scikit-learn for one-vs-rest SGD models"""
+        for n_classes in [2, 4]:
+            X, y = make_dataset(n_classes)
+            model = SGD_Logistic_Regression()
+            model.train(X, y)
+            self.assert_parity(model, X)
+
+    def test_single_sample(self):
+        """Ensure one sample, as a row or a flat vector, scores like a batch of one"""
+        X, y = make_dataset(2)
+        model = Logistic_Regression()
+        model.train(X, y)
+
+        self.assert_parity(model, X[:1])
+        np.testing.assert_allclose(model.scorer.predict_proba(X[0]), model.clf.predict_proba(X[:1]))
+
+    def test_rejects_wrong_number_of_features(self):
+        """Ensure samples with the wrong number of features are rejected"""
+        X, y = make_dataset(2)
+        model = Logistic_Regression()
+        model.train(X, y)
+
+        with self.assertRaises(ValueError):
+            model.predict(X[:, :5])
+
+
+if __name__ == '__main__':
+    unittest.main()
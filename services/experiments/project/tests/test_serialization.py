@@ -0,0 +1,75 @@
+import json
+import unittest
+from datetime import datetime
+
+import numpy as np
+
+from project import db
+from project.api.models import Experiment, Job
+from project.serialization import JSONEncoder, json_serializer, orjson
+from project.tests.base import BaseTestCase
+
+
+class TestJSONEncoder(BaseTestCase):
+    """Tests for the app's JSON encoder"""
+
+    def encode(self, value, backend):
+        previous = json_serializer.backend
+        json_serializer.backend = backend
+        try:
+            return json.loads(JSONEncoder().encode(value))
+        finally:
+            json_serializer.backend = previous
+
+    def check_backend(self, backend):
+        value = {
+            'predictions': np.array([0, 1, 1]),
+            'probabilities': np.array([[0.25, 0.75]]),
+            'score': np.float64(0.5),
+            'count': np.int64(3),
+            'date': datetime(2019, 1, 2, 3, 4, 5)
+        }
+        self.assertEqual(self.encode(value, backend), {
+            'predictions': [0, 1, 1],
+            'probabilities': [[0.25, 0.75]],
+            'score': 0.5,
+            'count': 3,
+            'date': 'Wed, 02 Jan 2019 03:04:05 GMT'
+        })
+        # Out of orjson's range, left to the json module
+        self.assertEqual(self.encode({'big': 2 ** 70}, backend), {'big': 2 ** 70})
+
+    def test_json_backend(self):
+        """Ensure NumPy values and dates are encoded by the json module"""
+        self.check_backend('json')
+
+    @unittest.skipUnless(orjson, 'orjson is not installed')
+    def test_orjson_backend(self):
+        """Ensure orjson encodes like the json module"""
+        self.check_backend('orjson')
+
+    def test_predict_batch_response(self):
+        """Ensure prediction arrays reach the response as lists"""
+        response = self.app.response_class(JSONEncoder().encode({'predictions': np.arange(3)}),
+                                           mimetype='application/json')
+        self.assertEqual(json.loads(response.data.decode()), {'predictions': [0, 1, 2]})
+
+    def test_job_result_response(self):
+        """Ensure a job result reaches the response as an object, also when stored as a JSON string"""
+        experiment = Experiment(name='LR_test', type='classification')
+        db.session.add(experiment)
+        db.session.commit()
+        output = [{'train_accuracy': 1.0}]
+        jobs = [Job(experiment_id=experiment.id, kind='train', status='done') for _ in range(2)]
+        jobs[0].result = output
+        jobs[1].result = json.dumps(output)
+        db.session.add_all(jobs)
+        db.session.commit()
+
+        for job in jobs:
+            response = self.client.get(f'/experiments/jobs/{job.id}')
+            self.assertEqual(json.loads(response.data.decode())['data']['result'], output)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import json
+
+from project.ml.model_cache import model_cache
+from project.serving import make_server_options, recently_trained_experiments, warm_up
+from project.tests.base import BaseTestCase
+from project.tests.test_experiments import clean_up_folders, get_lr_test_experiment, get_svm_test_experiment
+
+
+class TestServing(BaseTestCase):
+    """Tests for the production serving mode"""
+
+    def train(self, experiment_id):
+        response = self.client.post(f'/experiments/train/{experiment_id}')
+        job_id = json.loads(response.data.decode())['job_id']
+        response = self.client.get(f'/experiments/jobs/{job_id}')
+        self.assertIn('done', json.loads(response.data.decode())['data']['status'])
+
+    def test_recently_trained_experiments(self):
+        """Ensure experiments are ordered by their last finished training, untrained ones skipped"""
+        lr_experiment = get_lr_test_experiment()
+        svm_experiment = get_svm_test_experiment()
+        with self.client:
+            self.train(svm_experiment.id)
+            self.train(lr_experiment.id)
+            self.assertEqual([experiment.id for experiment in recently_trained_experiments(5)],
+                             [lr_experiment.id, svm_experiment.id])
+            self.assertEqual([experiment.id for experiment in recently_trained_experiments(1)],
+                             [lr_experiment.id])
+        clean_up_folders([lr_experiment.id, svm_experiment.id])
+
+    def test_warm_up_loads_models(self):
+        """Ensure warm up fills the model cache so the first predict is a hit"""
+        lr_experiment = get_lr_test_experiment()
+        lr_experiment_id = lr_experiment.id
+        with self.client:
+            self.train(lr_experiment_id)
+            model_cache.clear()
+
+            self.assertEqual(warm_up(self.app, 3), [lr_experiment_id])
+            self.assertEqual(model_cache.stats()['entries'], 1)
+            self.assertEqual(warm_up(self.app, 0), [])
+        clean_up_folders([lr_experiment_id])
+
+    def test_make_server_options(self):
+        """Ensure workers and threads come from the config unless overridden"""
+        config = dict(self.app.config, WSGI_WORKERS=4, WSGI_THREADS=1)
+        options = make_server_options(config)
+        self.assertEqual(options['workers'], 4)
+        self.assertEqual(options['worker_class'], 'sync')
+        self.assertTrue(options['preload_app'])
+
+        options = make_server_options(config, workers=2, threads=8)
+        self.assertEqual(options['workers'], 2)
+        self.assertEqual(options['threads'], 8)
+        self.assertEqual(options['worker_class'], 'gthread')
@@ -0,0 +1,48 @@
+import os
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from project.ml.models import Logistic_Regression
+from project.ml.tuning import HyperparameterSearch
+
+
+class TestHyperparameterSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        rng = np.random.RandomState(0)
+        self.X = rng.normal(size=(120, 4))
+        self.y = (self.X[:, 0] > 0).astype(int)
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def test_concurrent_searches_share_a_work_dir(self):
+        """Ensure searches in one work dir keep their folds apart and remove them when done"""
+        searches = [HyperparameterSearch(Logistic_Regression, {'C': [0.1, 1.0]}, folds=3, workers=1, seed=seed)
+                    for seed in range(3)]
+        with ThreadPoolExecutor(max_workers=len(searches)) as executor:
+            results = list(executor.map(lambda search: search.run(self.X, self.y, self.work_dir), searches))
+
+        for result in results:
+            self.assertEqual([trial['status'] for trial in result['trials']], ['done', 'done'])
+            self.assertEqual([len(trial['fold_scores']) for trial in result['trials']], [3, 3])
+        self.assertEqual(os.listdir(self.work_dir), [])
+
+    def test_trials_fit_on_one_core(self):
+        """Ensure trials pin the backend's n_jobs to one core unless it is searched"""
+        search = HyperparameterSearch(Logistic_Regression, {'C': [0.1, 1.0]}, folds=3, workers=2)
+        hyperparams = search._single_core(search.make_trials()[0])
+        self.assertEqual(hyperparams['n_jobs'], 1)
+
+        model = Logistic_Regression(hyperparams)
+        model.train(self.X, self.y)
+        self.assertEqual(model.clf.n_jobs, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from project.ml.environment import Locator
+from project.uploads import ChunkedUploads, UploadError
+
+
+class SlowStream:
+    """Stream whose first read blocks until released, so an append holds its lock meanwhile"""
+
+    def __init__(self, data):
+        self.stream = io.BytesIO(data)
+        self.reading = threading.Event()
+        self.release = threading.Event()
+
+    def read(self, size):
+        self.reading.set()
+        self.release.wait(5)
+        return self.stream.read(size)
+
+
+class TestChunkedUploads(unittest.TestCase):
+
+    def setUp(self):
+        self.staging_dir = tempfile.mkdtemp()
+        self.uploads = ChunkedUploads(self.staging_dir, chunk_size=4, max_bytes=1024)
+        self.upload_id = self.uploads.initiate('data.csv')['upload_id']
+
+    def tearDown(self):
+        shutil.rmtree(self.staging_dir)
+
+    def test_complete_waits_for_append_in_flight(self):
+        """Ensure the size and sha256 sealed by complete are those of the data an append was writing"""
+        data = b'a,b\n1,2\n'
+        stream = SlowStream(data)
+        appending = threading.Thread(target=self.uploads.append, args=(self.upload_id, stream, 0))
+        appending.start()
+        stream.reading.wait(5)
+
+        completing = threading.Thread(target=self.uploads.complete, args=(self.upload_id,))
+        completing.start()
+        completing.join(0.2)
+        self.assertTrue(completing.is_alive())
+        stream.release.set()
+        appending.join()
+        completing.join()
+
+        status = self.uploads.status(self.upload_id)
+        self.assertEqual(status['size'], len(data))
+        self.assertEqual(status['sha256'], hashlib.sha256(data).hexdigest())
+
+    def test_append_after_complete_fails(self):
+        """Ensure a sealed upload takes no more chunks"""
+        self.uploads.append(self.upload_id, io.BytesIO(b'a,b\n'), 0)
+        self.uploads.complete(self.upload_id)
+
+        with self.assertRaises(UploadError):
+            self.uploads.append(self.upload_id, io.BytesIO(b'1,2\n'), 4)
+        self.assertEqual(self.uploads.status(self.upload_id)['offset'], 4)
+
+    def test_staged_under_experiments_root(self):
+        """Ensure uploads are staged under Locator.root unless UPLOAD_STAGING_DIR is set"""
+        config = {'UPLOAD_STAGING_DIR': None, 'UPLOAD_CHUNK_SIZE': 4, 'MAX_UPLOAD_BYTES': 1024}
+        root = Locator.root
+        Locator.root = self.staging_dir
+        try:
+            self.assertEqual(ChunkedUploads.from_config(config).staging_dir, os.path.join(self.staging_dir, 'uploads'))
+        finally:
+            Locator.root = root
+        config['UPLOAD_STAGING_DIR'] = '/staging'
+        self.assertEqual(ChunkedUploads.from_config(config).staging_dir, '/staging')
+
+
+if __name__ == '__main__':
+    unittest.main()
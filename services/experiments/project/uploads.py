@@ -0,0 +1,209 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+import shutil
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+from project.ml.environment import Locator
+
+
+class UploadError(Exception):
+    pass
+
+
+class UploadNotFound(UploadError):
+    pass
+
+
+class UploadTooLarge(UploadError):
+    pass
+
+
+class UploadChecksumMismatch(UploadError):
+    pass
+
+
+class UploadOffsetMismatch(UploadError):
+    def __init__(self, offset):
+        super().__init__(f"Upload is at offset {offset}")
+        self.offset = offset
+
+
+def copy_stream(stream, file_obj, chunk_size, max_bytes, checksum=None, offset=0, profiler=None):
+    """Copy a stream into an open file in fixed-size chunks, returning the bytes written"""
+    size = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        size += len(chunk)
+        if offset + size > max_bytes:
+            raise UploadTooLarge(f"Upload exceeds the {max_bytes} bytes limit")
+        if checksum is not None:
+            checksum.update(chunk)
+        if profiler is not None:
+            profiler.update(chunk)
+        file_obj.write(chunk)
+    return size
+
+
+def save_stream(stream, file_path, chunk_size, max_bytes, profiler=None):
+    """Stream an upload to file_path, hashing it on the fly.
+
+    The data is written to a ``.part`` file next to the destination and renamed
+    into place once complete, so readers never see a half written dataset.
+    Returns the size and sha256 hex digest of the saved file.
+    """
+    part_file_path = file_path + '.part'
+    checksum = hashlib.sha256()
+    try:
+        with open(part_file_path, 'wb') as part_file:
+            size = copy_stream(stream, part_file, chunk_size, max_bytes, checksum, profiler=profiler)
+        os.replace(part_file_path, file_path)
+    except BaseException:
+        if os.path.exists(part_file_path):
+            os.remove(part_file_path)
+        raise
+    return size, checksum.hexdigest()
+
+
+def file_checksum(file_path, chunk_size):
+    checksum = hashlib.sha256()
+    with open(file_path, 'rb') as data_file:
+        for chunk in iter(lambda: data_file.read(chunk_size), b''):
+            checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+class ChunkedUploads:
+    """Resumable uploads staged on disk.
+
+    Each upload lives in ``<staging_dir>/<upload_id>/`` as a ``data`` file and a
+    small ``manifest.json``. The current offset is simply the size of the data
+    file, so an interrupted client can ask for it and continue from there.
+    """
+
+    upload_id_pattern = re.compile(r'[0-9a-f]{32}')
+
+    def __init__(self, staging_dir, chunk_size, max_bytes):
+        self.staging_dir = staging_dir
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(staging_dir=config.get('UPLOAD_STAGING_DIR') or Locator.get_upload_dir(),
+                   chunk_size=config['UPLOAD_CHUNK_SIZE'],
+                   max_bytes=config['MAX_UPLOAD_BYTES'])
+
+    def initiate(self, filename):
+        upload_id = uuid.uuid4().hex
+        os.makedirs(self._upload_dir(upload_id))
+        open(self._data_file_path(upload_id), 'wb').close()
+        manifest = {
+            'upload_id': upload_id,
+            'filename': filename,
+            'created': str(datetime.utcnow()),
+            'completed': False,
+            'size': None,
+            'sha256': None
+        }
+        self._write_manifest(upload_id, manifest)
+        return self.status(upload_id)
+
+    def status(self, upload_id):
+        manifest = self._read_manifest(upload_id)
+        manifest['offset'] = os.path.getsize(self._data_file_path(upload_id))
+        return manifest
+
+    def append(self, upload_id, stream, offset, sha256=None):
+        """Append one chunk at offset, optionally verifying the chunk's sha256"""
+        with self._lock_data_file(upload_id, 'r+b') as data_file:
+            # Checked under the lock, complete seals the upload while holding it
+            if self._read_manifest(upload_id)['completed']:
+                raise UploadError(f"Upload {upload_id} is already completed")
+            current_offset = data_file.seek(0, os.SEEK_END)
+            if offset != current_offset:
+                raise UploadOffsetMismatch(current_offset)
+
+            checksum = hashlib.sha256()
+            try:
+                copy_stream(stream, data_file, self.chunk_size, self.max_bytes, checksum, offset)
+                if sha256 and checksum.hexdigest() != sha256.lower():
+                    raise UploadChecksumMismatch(f"Chunk checksum mismatch at offset {offset}")
+            except BaseException:
+                data_file.truncate(offset)
+                raise
+            return data_file.tell()
+
+    def complete(self, upload_id, sha256=None):
+        """Seal the upload, verifying the whole file checksum if one is given"""
+        # Under the appenders' lock, the size and sha256 recorded are those of the same bytes
+        with self._lock_data_file(upload_id, 'rb') as data_file:
+            manifest = self._read_manifest(upload_id)
+            if not manifest['completed']:
+                checksum = hashlib.sha256()
+                for chunk in iter(lambda: data_file.read(self.chunk_size), b''):
+                    checksum.update(chunk)
+                digest = checksum.hexdigest()
+                if sha256 and digest != sha256.lower():
+                    raise UploadChecksumMismatch(f"Upload checksum mismatch, received data has sha256 {digest}")
+                manifest['completed'] = True
+                manifest['size'] = data_file.tell()
+                manifest['sha256'] = digest
+                self._write_manifest(upload_id, manifest)
+        return self.status(upload_id)
+
+    def get_data_file_path(self, upload_id):
+        """Path of a completed upload's data, to read it in place"""
+        manifest = self._read_manifest(upload_id)
+        if not manifest['completed']:
+            raise UploadError(f"Upload {upload_id} is not completed")
+        return self._data_file_path(upload_id)
+
+    def consume(self, upload_id, file_path):
+        """Move a completed upload to file_path and drop its staging directory"""
+        manifest = self._read_manifest(upload_id)
+        if not manifest['completed']:
+            raise UploadError(f"Upload {upload_id} is not completed")
+        os.replace(self._data_file_path(upload_id), file_path)
+        self.abort(upload_id)
+        return manifest['size'], manifest['sha256']
+
+    def abort(self, upload_id):
+        shutil.rmtree(self._upload_dir(upload_id), ignore_errors=True)
+
+    def _upload_dir(self, upload_id):
+        if not self.upload_id_pattern.fullmatch(str(upload_id)):
+            raise UploadNotFound(f"Upload {upload_id} Not Found!")
+        return os.path.join(self.staging_dir, upload_id)
+
+    def _data_file_path(self, upload_id):
+        return os.path.join(self._upload_dir(upload_id), 'data')
+
+    @contextmanager
+    def _lock_data_file(self, upload_id, mode):
+        try:
+            data_file = open(self._data_file_path(upload_id), mode)
+        except FileNotFoundError:
+            raise UploadNotFound(f"Upload {upload_id} Not Found!")
+        with data_file:
+            fcntl.flock(data_file, fcntl.LOCK_EX)
+            yield data_file
+
+    def _read_manifest(self, upload_id):
+        try:
+            with open(os.path.join(self._upload_dir(upload_id), 'manifest.json')) as manifest_file:
+                return json.load(manifest_file)
+        except FileNotFoundError:
+            raise UploadNotFound(f"Upload {upload_id} Not Found!")
+
+    def _write_manifest(self, upload_id, manifest):
+        manifest_file_path = os.path.join(self._upload_dir(upload_id), 'manifest.json')
+        with open(manifest_file_path + '.part', 'w') as manifest_file:
+            json.dump(manifest, manifest_file)
+        os.replace(manifest_file_path + '.part', manifest_file_path)